@@ -0,0 +1,166 @@
+// A stand-in URL parser for benchmarking the fuzzer itself.
+// It splits its input into URL components with a few string searches, and prints them as ParseTree JSON.
+// Build it with any C compiler; build it with afl-clang-fast to get a traced, persistent mode target.
+//
+// Environment variables:
+//   STUB_LATENCY_US           microseconds to sleep per input, to stand in for a slower parser
+//   STUB_REJECT_BYTE          a byte value; inputs containing it are rejected with exit status 1
+//   DIFF_FUZZ_BINARY_OUTPUT   if set, print the parse tree in the binary output format instead of as JSON
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+#define MAX_URL_LEN (32768)
+
+// Without afl-clang-fast, read one input from stdin, all the way to EOF, and run it once.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+static size_t fuzz_len;
+static unsigned char fuzz_buf[MAX_URL_LEN];
+static int fuzz_input_read;
+static int read_fuzz_input(void) {
+    if (fuzz_input_read) {
+        return 0;
+    }
+    fuzz_input_read = 1;
+    // A pipe can hand over its input in pieces.
+    ssize_t n;
+    while (fuzz_len < sizeof(fuzz_buf) && (n = read(0, fuzz_buf + fuzz_len, sizeof(fuzz_buf) - fuzz_len)) > 0) {
+        fuzz_len += (size_t)n;
+    }
+    return 1;
+}
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_INIT() void sync(void);
+#define __AFL_LOOP(x) ((void)(x), read_fuzz_input())
+#endif
+
+__AFL_FUZZ_INIT();
+
+static char const B64_ALPHABET[] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+
+// The number of inputs to run in one process before restarting it.
+// The fuzzer sets this when it runs us in persistent mode.
+static unsigned int persistent_iterations(void) {
+    char const *const iterations_str = getenv("DIFF_FUZZ_PERSISTENT_ITERATIONS");
+    unsigned long const iterations = iterations_str != NULL ? strtoul(iterations_str, NULL, 10) : 1;
+    return iterations > 0 ? iterations : 1;
+}
+
+static long env_long(char const *const name, long const fallback) {
+    char const *const value = getenv(name);
+    return value != NULL ? strtol(value, NULL, 10) : fallback;
+}
+
+static void print_b64(unsigned char const *const buf, size_t const len) {
+    for (size_t i = 0; i < len; i += 3) {
+        unsigned long const n = ((unsigned long)buf[i] << 16) | (i + 1 < len ? (unsigned long)buf[i + 1] << 8 : 0) |
+                                (i + 2 < len ? buf[i + 2] : 0);
+        putchar(B64_ALPHABET[(n >> 18) & 63]);
+        putchar(B64_ALPHABET[(n >> 12) & 63]);
+        putchar(i + 1 < len ? B64_ALPHABET[(n >> 6) & 63] : '=');
+        putchar(i + 2 < len ? B64_ALPHABET[n & 63] : '=');
+    }
+}
+
+static int binary_output;
+
+static void print_field(char const *const name, unsigned char const *const buf, size_t const len, int const last) {
+    if (binary_output) {
+        // A 4-byte little-endian length, then the bytes
+        unsigned char const len_bytes[4] = {len & 0xff, (len >> 8) & 0xff, (len >> 16) & 0xff, (len >> 24) & 0xff};
+        fwrite(len_bytes, 1, sizeof(len_bytes), stdout);
+        fwrite(buf, 1, len, stdout);
+        return;
+    }
+    printf("\"%s\":\"", name);
+    print_b64(buf, len);
+    printf(last ? "\"" : "\",");
+}
+
+// Returns the index of the first of the bytes in stops in buf[start:end], or end if there isn't one.
+static size_t find_any(unsigned char const *const buf, size_t const start, size_t const end, char const *const stops) {
+    for (size_t i = start; i < end; i++) {
+        // (Not strchr, which would also find the NUL terminator, and so stop at any NUL in buf)
+        if (memchr(stops, buf[i], strlen(stops)) != NULL) {
+            return i;
+        }
+    }
+    return end;
+}
+
+static int parse_url(unsigned char const *const buf, size_t const len, long const reject_byte) {
+    if (reject_byte >= 0 && memchr(buf, (int)reject_byte, len) != NULL) {
+        return 1;
+    }
+
+    // scheme ":" ["//" [userinfo "@"] host [":" port]] path ["?" query] ["#" fragment]
+    size_t const colon = find_any(buf, 0, len, ":/?#");
+    size_t const scheme_len = colon < len && buf[colon] == ':' ? colon : 0;
+    size_t pos = scheme_len != 0 ? scheme_len + 1 : 0;
+
+    size_t userinfo_start = pos, userinfo_end = pos, host_start = pos, host_end = pos, port_start = pos, port_end = pos;
+    if (pos + 1 < len && buf[pos] == '/' && buf[pos + 1] == '/') {
+        size_t const authority_start = pos + 2;
+        size_t const authority_end = find_any(buf, authority_start, len, "/?#");
+        unsigned char const *const at = memchr(buf + authority_start, '@', authority_end - authority_start);
+        host_start = authority_start;
+        if (at != NULL) {
+            userinfo_start = authority_start;
+            userinfo_end = at - buf;
+            host_start = userinfo_end + 1;
+        }
+        host_end = authority_end;
+        for (size_t i = authority_end; i > host_start; i--) {
+            if (buf[i - 1] == ':') {
+                host_end = i - 1;
+                port_start = i;
+                port_end = authority_end;
+                break;
+            }
+        }
+        pos = authority_end;
+    }
+
+    size_t const path_end = find_any(buf, pos, len, "?#");
+    size_t const query_end = find_any(buf, path_end, len, "#");
+
+    if (!binary_output) {
+        putchar('{');
+    }
+    print_field("scheme", buf, scheme_len, 0);
+    print_field("userinfo", buf + userinfo_start, userinfo_end - userinfo_start, 0);
+    print_field("host", buf + host_start, host_end - host_start, 0);
+    print_field("port", buf + port_start, port_end - port_start, 0);
+    print_field("path", buf + pos, path_end - pos, 0);
+    print_field("query", buf + path_end + (path_end < query_end), query_end - path_end - (path_end < query_end), 0);
+    print_field("fragment", buf + query_end + (query_end < len), len - query_end - (query_end < len), 1);
+    if (!binary_output) {
+        puts("}");
+    }
+    return 0;
+}
+
+int main(void) {
+    long const latency_us = env_long("STUB_LATENCY_US", 0);
+    long const reject_byte = env_long("STUB_REJECT_BYTE", -1);
+    binary_output = getenv("DIFF_FUZZ_BINARY_OUTPUT") != NULL;
+    unsigned char const *const testcase_buf = __AFL_FUZZ_TESTCASE_BUF;
+    unsigned int const iterations = persistent_iterations();
+    while (__AFL_LOOP(iterations)) {
+        size_t const len = __AFL_FUZZ_TESTCASE_LEN;
+        if (latency_us > 0) {
+            struct timespec const delay = {latency_us / 1000000, (latency_us % 1000000) * 1000};
+            nanosleep(&delay, NULL);
+        }
+        int const rc = parse_url(testcase_buf, len, reject_byte);
+        fflush(stdout);
+        // Failures end the process, so that the fuzzer sees their exit status.
+        if (rc != 0) {
+            return rc;
+        }
+    }
+}
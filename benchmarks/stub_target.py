@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# A stand-in URL parser for benchmarking the fuzzer itself. (The Python twin of stub_target.c)
+# It splits its input into URL components with a regex, and prints them as ParseTree JSON.
+# It runs under python-afl if that's installed, and reads one input from stdin otherwise.
+#
+# Environment variables:
+#   STUB_LATENCY_US           microseconds to sleep per input, to stand in for a slower parser
+#   STUB_REJECT_BYTE          a byte value; inputs containing it are rejected with exit status 1
+#   DIFF_FUZZ_BINARY_OUTPUT   if set, print the parse tree in the binary output format instead of as JSON
+from sys import stdin, stdout
+from base64 import b64encode
+from os import _exit, getenv
+import re
+import time
+
+try:
+    import afl
+
+    loop = afl.loop
+except ImportError:
+    _ran: list[bool] = []
+
+    def loop(_: int) -> bool:
+        _ran.append(True)
+        return len(_ran) == 1
+
+
+# The number of inputs to run in one process before restarting it.
+# The fuzzer sets this when it runs us in persistent mode.
+PERSISTENT_ITERATIONS = int(getenv("DIFF_FUZZ_PERSISTENT_ITERATIONS", "1"))
+LATENCY_US = int(getenv("STUB_LATENCY_US", "0"))
+REJECT_BYTE = int(getenv("STUB_REJECT_BYTE", "-1"))
+BINARY_OUTPUT = getenv("DIFF_FUZZ_BINARY_OUTPUT") is not None
+
+URL_RE = re.compile(
+    rb"(?:(?P<scheme>[^:/?#]+):)?"
+    rb"(?://(?:(?P<userinfo>[^/?#@]*)@)?(?P<host>[^/?#]*?)(?::(?P<port>[^:/?#]*))?(?=[/?#]|\Z))?"
+    rb"(?P<path>[^?#]*)(?:\?(?P<query>[^#]*))?(?:#(?P<fragment>.*))?",
+    re.DOTALL,
+)
+
+while loop(PERSISTENT_ITERATIONS):
+    if stdin.buffer.seekable():
+        stdin.buffer.seek(0)
+    url_bytes = stdin.buffer.read()
+    if LATENCY_US > 0:
+        time.sleep(LATENCY_US / 1_000_000)
+    if 0 <= REJECT_BYTE < 256 and bytes([REJECT_BYTE]) in url_bytes:
+        _exit(1)
+
+    m = URL_RE.fullmatch(url_bytes)
+    assert m is not None
+    result = {k: v if v is not None else b"" for k, v in m.groupdict().items()}
+    if BINARY_OUTPUT:
+        # Each field as a 4-byte little-endian length, then the bytes
+        stdout.buffer.write(b"".join(len(v).to_bytes(4, "little") + v for v in result.values()))
+        stdout.buffer.flush()
+    else:
+        print(
+            "{" + ",".join(f'"{k}":"{b64encode(v).decode("ascii")}"' for k, v in result.items()) + "}",
+            flush=True,
+        )
+_exit(0)
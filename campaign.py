@@ -0,0 +1,705 @@
+#############################################################################################
+# campaign.py
+# One fuzzing run's main loop, and the state it keeps: inputs and candidate reductions stream to the
+# workers, and their results stream back to be checked for novelty, bucketed, and minimized.
+# The corpus is mutated into the next generation once the current one is almost done running,
+# and everything found is written to the run's directory and journal as it's found.
+#############################################################################################
+
+import ast
+import collections
+import itertools
+import json
+import multiprocessing.pool
+import os
+import queue
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing.sharedctypes import Synchronized
+from pathlib import PosixPath
+from typing import Callable, Any, Generator, Iterator
+
+from config import (
+    TARGET_CONFIGS,
+    ROUGH_DESIRED_QUEUE_LEN,
+    CORPUS_DIR,
+    MAX_MINIMIZATIONS_PER_BUCKET,
+    EXECUTION_BATCH_SIZE,
+    USE_VIRGIN_BITMAP_NOVELTY,
+    USE_OUTPUT_FEEDBACK,
+    RANDOM_SEED,
+    STATS_INTERVAL,
+)
+
+from forkserver import TIMEOUT_STATUS
+from fingerprint import fingerprint_digest, DigestSet, VirginBitmaps
+from feedback import output_pattern_digest
+from execution import ExecutionResult, run_batch, run_candidates
+from differentials import (
+    differential_bucket_t,
+    differential_bucket,
+    describe_bucket,
+    is_differential,
+    minimization_steps,
+)
+from distributed import RemotePool
+from mutation import Havoc
+from corpus import Corpus, save_input, load_inputs
+from stats import FuzzerStats, Progress, FindingCounts, StatsServer
+from journal import Journal, JournalState, SEEN_DIGEST, MINIMIZED_DIGEST, DIFFERENTIAL
+
+
+def behavior_pattern(result: ExecutionResult) -> tuple[tuple[int, ...], tuple[bool, ...]]:
+    """
+    Summarizes how the targets behaved on an input: their exit statuses, and which of them gave a parse tree.
+    """
+    return result.statuses, tuple(parse_tree is not None for parse_tree in result.parse_trees)
+
+
+# A differential that the campaign is in the middle of minimizing.
+@dataclass
+class Minimization:
+    # The differential being minimized
+    differential: bytes
+    steps: Generator[tuple[list[bytes], tuple[int, ...]], list[ExecutionResult], bytes]
+    # The current batch of candidate reductions, and the results that have come back for it so far
+    candidates: list[bytes]
+    results: list[ExecutionResult | None]
+    # The number of tasks running the current batch that haven't come back yet
+    outstanding_tasks: int
+
+
+# A group of differentials that are probably the same bug. (See differential_bucket)
+@dataclass
+class DifferentialBucket:
+    # Buckets are numbered in the order they're found
+    number: int
+    # The number of differentials that landed in this bucket
+    count: int = 0
+    # The number of those that were sent to be minimized
+    minimizations: int = 0
+    # The shortest of the rest
+    sample: bytes | None = None
+
+
+ALL_TARGETS: tuple[int, ...] = tuple(range(len(TARGET_CONFIGS)))
+
+# The kinds of tasks that minimizations run: batches of candidate reductions, and minimized inputs,
+# which are run on every target for their fingerprints. Every other kind of task runs inputs to explore them.
+MINIMIZATION_TASK_KINDS: tuple[str, ...] = ("reduce", "fingerprint")
+
+
+class TaskRunner:
+    """
+    Hands tasks to the workers, and collects them as they finish.
+    Execution, novelty checks, minimization, and mutation all run at the same time,
+    and neither runs nor minimizations are allowed more than a couple of tasks per worker at once,
+    so that one can't starve the other.
+    """
+
+    def __init__(self, pool: RemotePool | multiprocessing.pool.Pool, num_workers: int) -> None:
+        self.pool: RemotePool | multiprocessing.pool.Pool = pool
+        self.num_workers: int = num_workers
+        # Finished tasks come back through here, as (task kind, task context, task result) triples.
+        self.completions: queue.SimpleQueue[tuple[str, Any, Any]] = queue.SimpleQueue()
+        self.runs_in_flight: int = 0
+        self.minimizations_in_flight: int = 0
+
+    def fit_to_workers(self) -> None:
+        if isinstance(self.pool, RemotePool):
+            # Workers come and go, so size everything to the workers we have right now.
+            self.num_workers = max(self.pool.num_slots(), 1)
+
+    def has_room_for_runs(self) -> bool:
+        return self.runs_in_flight < 2 * self.num_workers
+
+    def has_room_for_minimizations(self, pending_tasks: int = 0) -> bool:
+        return pending_tasks + self.minimizations_in_flight < self.num_workers
+
+    def idle(self) -> bool:
+        return self.runs_in_flight == 0 and self.minimizations_in_flight == 0
+
+    def submit(self, kind: str, context: Any, func: Callable, *args: Any) -> None:
+        if kind in MINIMIZATION_TASK_KINDS:
+            self.minimizations_in_flight += 1
+        else:
+            self.runs_in_flight += 1
+        self.pool.apply_async(
+            func,
+            args,
+            callback=lambda result: self.completions.put((kind, context, result)),
+            error_callback=lambda exc: self.completions.put(("error", context, exc)),
+        )
+
+    def next_completion(self, timeout: float) -> tuple[str, Any, Any] | None:
+        """
+        Waits up to timeout seconds for a task to finish, and returns its (kind, context, result),
+        or raises its exception.
+        """
+        try:
+            kind, context, result = self.completions.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if kind == "error":
+            raise result
+        if kind in MINIMIZATION_TASK_KINDS:
+            self.minimizations_in_flight -= 1
+        else:
+            self.runs_in_flight -= 1
+        return kind, context, result
+
+
+class Minimizer:
+    """
+    The differentials being minimized, keyed by ID.
+    Each batch of candidate reductions is split into tasks, so that it runs on several workers at once,
+    and the tasks wait in pending_tasks until a worker is free to run them.
+    """
+
+    def __init__(self, runner: TaskRunner) -> None:
+        self.runner: TaskRunner = runner
+        self.minimizations: dict[int, Minimization] = {}
+        self.ids: Iterator[int] = itertools.count()
+        # These are (task kind, task context, function, arguments) tuples.
+        self.pending_tasks: collections.deque[tuple[str, Any, Callable, tuple]] = collections.deque()
+
+    def has_room(self) -> bool:
+        return self.runner.has_room_for_minimizations(len(self.pending_tasks))
+
+    def start(self, differential: bytes, result: ExecutionResult) -> None:
+        minimization_id: int = next(self.ids)
+        self.minimizations[minimization_id] = Minimization(
+            differential, minimization_steps(differential, result), [], [], 0
+        )
+        self.advance(minimization_id, None)
+
+    def advance(self, minimization_id: int, results: list[ExecutionResult] | None) -> None:
+        """
+        Sends a minimization the results for its current batch, and schedules its next batch.
+        Once it's done, schedules a run of the minimized input, for its fingerprint.
+        """
+        minimization: Minimization = self.minimizations[minimization_id]
+        try:
+            candidates, target_indices = (
+                next(minimization.steps) if results is None else minimization.steps.send(results)
+            )
+        except StopIteration as e:
+            del self.minimizations[minimization_id]
+            self.pending_tasks.append(("fingerprint", e.value, run_batch, ([e.value],)))
+            return
+        minimization.candidates = candidates
+        minimization.results = [None] * len(candidates)
+        # Spread the batch as thinly as the workers allow, up to EXECUTION_BATCH_SIZE runs per task.
+        chunk_size: int = min(EXECUTION_BATCH_SIZE, -(-len(candidates) // self.runner.num_workers))
+        minimization.outstanding_tasks = 0
+        for offset in range(0, len(candidates), chunk_size):
+            self.pending_tasks.append(
+                (
+                    "reduce",
+                    (minimization_id, offset, target_indices),
+                    run_candidates,
+                    (candidates[offset : offset + chunk_size], target_indices),
+                )
+            )
+            minimization.outstanding_tasks += 1
+
+    def record_reduction(
+        self, context: tuple[int, int, tuple[int, ...]], results: list[ExecutionResult]
+    ) -> None:
+        """
+        Takes in the results of one task from a minimization's current batch,
+        and advances the minimization once they've all come back.
+        """
+        minimization_id, offset, _ = context
+        minimization: Minimization = self.minimizations[minimization_id]
+        minimization.results[offset : offset + len(results)] = results
+        minimization.outstanding_tasks -= 1
+        if minimization.outstanding_tasks == 0:
+            self.advance(minimization_id, [result for result in minimization.results if result is not None])
+
+    def submit_pending(self) -> None:
+        while len(self.pending_tasks) != 0 and self.runner.has_room_for_minimizations():
+            task_kind, task_context, task_func, task_args = self.pending_tasks.popleft()
+            self.runner.submit(task_kind, task_context, task_func, *task_args)
+
+    def differentials(self) -> list[bytes]:
+        return [minimization.differential for minimization in self.minimizations.values()]
+
+
+class Findings:
+    """
+    What the run has found: minimized differentials, buckets of differentials, and hangs.
+    Each is written to the run's directory (and the journal) as soon as it's found.
+    """
+
+    def __init__(self, run_dir: PosixPath, journal: Journal) -> None:
+        self.run_dir: PosixPath = run_dir
+        self.journal: Journal = journal
+        self.differentials: list[bytes] = []
+        # This is the set of fingerprint digests that correspond with minimized differentials.
+        # Whenever we minimize a differential into an input with a fingerprint not in this set,
+        # we report it and add it to this set.
+        self.minimized_fingerprints: DigestSet = DigestSet()
+        # Differentials are bucketed before they're minimized, and only the first few in each bucket are minimized.
+        self.buckets: dict[differential_bucket_t, DifferentialBucket] = {}
+        os.makedirs(run_dir.joinpath("samples"), exist_ok=True)
+        # Differentials wait here, along with their results, until there's room to start minimizing them.
+        self.unminimized: collections.deque[tuple[bytes, ExecutionResult]] = collections.deque()
+        # Novel inputs on which any target timed out are quarantined in hangs/.
+        # They never join the corpus, because their children would be slow too.
+        os.makedirs(run_dir.joinpath("hangs"), exist_ok=True)
+        self.num_hangs: int = len(os.listdir(run_dir.joinpath("hangs")))
+
+    def resume(self, resume_state: JournalState) -> None:
+        self.minimized_fingerprints.update(resume_state.minimized_digests)
+        self.differentials.extend(resume_state.differentials)
+        for number, payload in sorted(resume_state.buckets.items()):
+            saved: dict[str, Any] = json.loads(payload)
+            bucket: DifferentialBucket = DifferentialBucket(number, saved["count"], saved["minimizations"])
+            if saved["sample"] is not None and self.run_dir.joinpath(saved["sample"]).is_file():
+                with open(self.run_dir.joinpath(saved["sample"]), "rb") as f:
+                    bucket.sample = f.read()
+            self.buckets[ast.literal_eval(saved["key"])] = bucket
+
+    def journal_bucket(self, bucket_key: differential_bucket_t, bucket: DifferentialBucket) -> None:
+        """
+        Records a bucket's current state in the journal, so that a resumed run carries on with the same numbering,
+        counts, and samples. (Bucket keys are tuples of plain values, so they're stored as their repr)
+        """
+        self.journal.record_bucket(
+            bucket.number,
+            json.dumps(
+                {
+                    "key": repr(bucket_key),
+                    "count": bucket.count,
+                    "minimizations": bucket.minimizations,
+                    "sample": f"samples/bucket_{bucket.number}" if bucket.sample is not None else None,
+                }
+            ).encode("utf-8"),
+        )
+
+    def bucket(self, differential: bytes, result: ExecutionResult) -> None:
+        """
+        Queues a differential for minimization, unless its bucket has had its share,
+        in which case it's only counted (and kept as the bucket's sample, if it's the shortest yet).
+        """
+        bucket_key: differential_bucket_t = differential_bucket(result)
+        if bucket_key not in self.buckets:
+            self.buckets[bucket_key] = DifferentialBucket(len(self.buckets))
+        bucket: DifferentialBucket = self.buckets[bucket_key]
+        bucket.count += 1
+        if bucket.minimizations < MAX_MINIMIZATIONS_PER_BUCKET:
+            bucket.minimizations += 1
+            self.unminimized.append((differential, result))
+        elif bucket.sample is None or len(differential) < len(bucket.sample):
+            bucket.sample = differential
+            with open(self.run_dir.joinpath("samples", f"bucket_{bucket.number}"), "wb") as f:
+                f.write(differential)
+        self.journal_bucket(bucket_key, bucket)
+
+    def requeue(self, differential: bytes, result: ExecutionResult) -> None:
+        """
+        Queues a differential for minimization that was bucketed before the run was resumed.
+        """
+        self.unminimized.append((differential, result))
+
+    def quarantine_hang(self, hang: bytes) -> None:
+        with open(self.run_dir.joinpath("hangs", f"hang_{self.num_hangs}"), "wb") as f:
+            f.write(hang)
+        self.num_hangs += 1
+
+    def report(self, minimized_input: bytes, result: ExecutionResult) -> None:
+        """
+        Reports a minimized differential, given its result on every target, unless its fingerprint was reported already.
+        """
+        if not is_differential(result):
+            # The reduction didn't hold up when run on every target, so there's nothing to report.
+            return
+        minimized_digest: bytes = fingerprint_digest(result.fingerprint)
+        if minimized_digest in self.minimized_fingerprints:
+            return
+        with open(self.run_dir.joinpath(f"differential_{len(self.differentials)}"), "wb") as f:
+            f.write(minimized_input)
+        self.differentials.append(minimized_input)
+        self.minimized_fingerprints.add(minimized_digest)
+        self.journal.record(MINIMIZED_DIGEST, minimized_digest)
+        self.journal.record(DIFFERENTIAL, minimized_input)
+        self.journal.flush()
+
+    def num_bucketed(self) -> int:
+        return sum(bucket.count for bucket in self.buckets.values())
+
+    def write_buckets(self) -> None:
+        """
+        Lists the buckets, biggest first.
+        """
+        with open(self.run_dir.joinpath("buckets"), "w", encoding="utf-8") as f:
+            for bucket_key, bucket in sorted(self.buckets.items(), key=lambda item: -item[1].count):
+                f.write(
+                    f"bucket_{bucket.number}\t{bucket.count} differentials"
+                    + f"\t{bucket.minimizations} minimized\t{describe_bucket(bucket_key)}\n"
+                )
+
+
+class Novelty:
+    """
+    Decides which inputs are worth mutating.
+    """
+
+    def __init__(self, journal: Journal) -> None:
+        self.journal: Journal = journal
+        # One input `I` produces one trace per program being fuzzed.
+        # Convert each trace to a frozenset of edges by deduplication.
+        # Pack those sets together in a tuple.
+        # This is a fingerprint of the programs' execution on the input `I`.
+        # Keep digests of these fingerprints in a set.
+        # An input is worth mutation if its fingerprint is new.
+        self.seen_fingerprints: DigestSet = DigestSet()
+        # When USE_VIRGIN_BITMAP_NOVELTY is set, an input is instead worth mutation
+        # if it hits an edge that no earlier input hit.
+        self.virgin_bitmaps: VirginBitmaps = VirginBitmaps(len(TARGET_CONFIGS))
+
+    def resume(self, resume_state: JournalState) -> None:
+        self.seen_fingerprints.update(resume_state.seen_digests)
+        if resume_state.checkpoint.virgin_bits is not None:
+            self.virgin_bitmaps.load_bytes(resume_state.checkpoint.virgin_bits)
+
+    def check(self, results: list[ExecutionResult]) -> list[bool]:
+        """
+        Returns whether each result is novel, and remembers the novel ones.
+        """
+        novel: list[bool] = []
+        if USE_VIRGIN_BITMAP_NOVELTY:
+            novel = self.virgin_bitmaps.update([result.fingerprint for result in results]).tolist()
+        else:
+            for result in results:
+                digest: bytes = fingerprint_digest(result.fingerprint)
+                novel.append(digest not in self.seen_fingerprints)
+                if novel[-1]:
+                    self.seen_fingerprints.add(digest)
+                    self.journal.record(SEEN_DIGEST, digest)
+        if USE_OUTPUT_FEEDBACK:
+            # New ways for the targets to (nearly) disagree are novel too.
+            # (These digests share seen_fingerprints, so that they get journaled and resumed with it)
+            for n, result in enumerate(results):
+                pattern_digest: bytes = output_pattern_digest(result.statuses, result.parse_trees)
+                if pattern_digest not in self.seen_fingerprints:
+                    self.seen_fingerprints.add(pattern_digest)
+                    self.journal.record(SEEN_DIGEST, pattern_digest)
+                    novel[n] = True
+        return novel
+
+
+class Explorer:
+    """
+    The corpus, and the inputs made from it that are waiting to run.
+    """
+
+    def __init__(
+        self, journal: Journal, resume_state: JournalState | None, havoc: Havoc, seed_inputs: list[PosixPath]
+    ) -> None:
+        self.journal: Journal = journal
+        self.novelty: Novelty = Novelty(journal)
+        # The inputs worth mutating, from which each generation is made. (See corpus.py)
+        self.corpus: Corpus = Corpus(len(TARGET_CONFIGS), RANDOM_SEED)
+        # The corpus index of the parent of each mutant that hasn't finished running
+        self.parent_indices: dict[bytes, int] = {}
+        # The number of entries that joined the corpus since the last generation was made
+        self.new_entries: int = 0
+        # Makes the next generation out of the corpus.
+        self.havoc: Havoc = havoc
+
+        # Inputs wait here until a worker is free to run them.
+        self.pending_inputs: collections.deque[bytes] = collections.deque()
+        if resume_state is not None and len(resume_state.checkpoint.queued_inputs) != 0:
+            self.pending_inputs.extend(resume_state.checkpoint.queued_inputs)
+        else:
+            for seed_input in seed_inputs:
+                with open(seed_input, "rb") as f:
+                    self.pending_inputs.append(f.read())
+            if CORPUS_DIR is not None and CORPUS_DIR.is_dir():
+                seeds: set[bytes] = set(self.pending_inputs)
+                self.pending_inputs.extend(
+                    the_input for the_input in load_inputs(CORPUS_DIR) if the_input not in seeds
+                )
+        if CORPUS_DIR is not None:
+            os.makedirs(CORPUS_DIR, exist_ok=True)
+
+    def take_batch(self) -> list[bytes]:
+        return [
+            self.pending_inputs.popleft() for _ in range(min(EXECUTION_BATCH_SIZE, len(self.pending_inputs)))
+        ]
+
+    def add(self, the_input: bytes, result: ExecutionResult, depth: int) -> None:
+        self.corpus.add(the_input, result.fingerprint, behavior_pattern(result), result.exec_time, depth)
+
+    def record_runs(self, batch: list[bytes], results: list[ExecutionResult], findings: Findings) -> None:
+        """
+        Takes in the results of a batch of inputs: the novel ones join the corpus,
+        unless they're differentials or hangs, which go to findings instead.
+        """
+        novel: list[bool] = self.novelty.check(results)
+        for current_input, result, is_novel in zip(batch, results, novel):
+            parent_index: int | None = self.parent_indices.pop(current_input, None)
+            if parent_index is not None:
+                self.corpus.record_child(parent_index, is_novel)
+            if not is_novel:
+                continue
+            if TIMEOUT_STATUS in result.statuses:
+                findings.quarantine_hang(current_input)
+            if is_differential(result):
+                findings.bucket(current_input, result)
+            elif TIMEOUT_STATUS not in result.statuses:
+                depth: int = self.corpus.entries[parent_index].depth + 1 if parent_index is not None else 0
+                self.add(current_input, result, depth)
+                self.journal.record_corpus_entry(depth, current_input)
+                if CORPUS_DIR is not None:
+                    save_input(CORPUS_DIR, current_input)
+                self.new_entries += 1
+
+    def make_generation(self) -> int:
+        """
+        Queues the next generation, and returns the number of children queued.
+        The power schedule decides how many children each entry gets.
+        (Duplicate children are only run once, and credited to their first parent,
+        so children that are still running from the last generation aren't queued again)
+        """
+        schedule: list[int] = self.corpus.schedule(ROUGH_DESIRED_QUEUE_LEN)
+        children: list[bytes] = self.havoc.mutate_batch(
+            [self.corpus.entries[i].input for i in schedule], len(schedule)
+        )
+        num_queued: int = 0
+        for child, scheduled_parent_index in zip(children, schedule):
+            if child not in self.parent_indices:
+                self.parent_indices[child] = scheduled_parent_index
+                self.pending_inputs.append(child)
+                num_queued += 1
+        return num_queued
+
+    def checkpoint(self, generation: int, unminimized_differentials: list[bytes]) -> None:
+        self.journal.checkpoint(
+            generation,
+            self.pending_inputs,
+            unminimized_differentials,
+            self.novelty.virgin_bitmaps.to_bytes() if USE_VIRGIN_BITMAP_NOVELTY else None,
+        )
+
+
+class Reporter:
+    """
+    Keeps fuzzer_stats up to date, and prints a summary at the end of each generation.
+    """
+
+    def __init__(
+        self,
+        run_dir: PosixPath,
+        server: StatsServer | None,
+        cache_counters: tuple[Synchronized, Synchronized],
+    ) -> None:
+        self.run_dir: PosixPath = run_dir
+        # Throughput, where the time goes, and how the run is doing, for fuzzer_stats. (See stats.py)
+        self.stats: FuzzerStats = FuzzerStats([tc.name for tc in TARGET_CONFIGS])
+        self.server: StatsServer | None = server
+        # The result cache's hit and miss counts, which the local workers share with us.
+        # (Remote workers keep their own caches, and their own counts)
+        self.cache_counters: tuple[Synchronized, Synchronized] = cache_counters
+        self.start_time: float = time.monotonic()
+        # When the last summary was printed, and the execution count then
+        self.last_report: tuple[float, int] = (self.start_time, 0)
+        self.last_write_time: float = self.start_time
+
+    def record_batch(self, results: list[ExecutionResult]) -> None:
+        self.stats.record_runs([result.run_times for result in results], ALL_TARGETS)
+        self.stats.record_stage_time("trace", sum(result.trace_time for result in results))
+        self.stats.record_stage_time("run", sum(result.exec_time - result.trace_time for result in results))
+
+    def record_minimization(self, results: list[ExecutionResult], target_indices: tuple[int, ...]) -> None:
+        self.stats.record_runs([result.run_times for result in results], target_indices)
+        self.stats.record_stage_time("minimize", sum(result.exec_time for result in results))
+
+    def cache_counts(self) -> tuple[int, int]:
+        """
+        Returns the result cache's (hits, lookups).
+        """
+        cache_hits, cache_misses = self.cache_counters
+        return cache_hits.value, cache_hits.value + cache_misses.value
+
+    def time_until_write(self) -> float:
+        return max(self.last_write_time + STATS_INTERVAL - time.monotonic(), 0)
+
+    def write(self, explorer: Explorer, findings: Findings, minimizer: Minimizer) -> None:
+        progress: Progress = self.stats.progress
+        progress.corpus_size = len(explorer.corpus)
+        progress.pending_inputs = len(explorer.pending_inputs)
+        progress.cache_hits, progress.cache_lookups = self.cache_counts()
+        self.stats.record_edges_found(explorer.corpus.edges_found())
+        counts: FindingCounts = self.stats.findings
+        counts.differentials = len(findings.differentials)
+        counts.unminimized_differentials = len(findings.unminimized) + len(minimizer.minimizations)
+        counts.hangs = findings.num_hangs
+        counts.differential_buckets = len(findings.buckets)
+        counts.bucketed_differentials = findings.num_bucketed()
+        self.stats.write(self.run_dir.joinpath("fuzzer_stats"), self.server)
+        self.last_write_time = time.monotonic()
+
+    def report_generation(self, generation: int, explorer: Explorer, findings: Findings) -> None:
+        now: float = time.monotonic()
+        total_execs: int = self.stats.execs
+        last_report_time, last_report_execs = self.last_report
+        cache_hits, cache_lookups = self.cache_counts()
+        print(
+            f"End of generation {generation}.\n"
+            + f"Differentials:\t\t{len(findings.differentials)}"
+            + f" ({findings.num_bucketed()} in {len(findings.buckets)} buckets)\n"
+            + f"Corpus size:\t\t{len(explorer.corpus)} ({explorer.new_entries} new)\n"
+            + f"Hangs:\t\t\t{findings.num_hangs}\n"
+            + f"Execs/sec:\t\t{(total_execs - last_report_execs) / (now - last_report_time):.1f}"
+            + f" ({total_execs / (now - self.start_time):.1f} overall)"
+            + (
+                f"\nCache hit rate:\t\t{100 * cache_hits / cache_lookups:.1f}%"
+                + f" ({cache_lookups} lookups)"
+                if cache_lookups != 0
+                else ""
+            ),
+            file=sys.stderr,
+        )
+        self.last_report = (now, total_execs)
+
+
+class Campaign:
+    """
+    One fuzzing run: it streams inputs and candidate reductions to the workers,
+    and takes in their results as they come back.
+    """
+
+    def __init__(
+        self,
+        runner: TaskRunner,
+        findings: Findings,
+        explorer: Explorer,
+        reporter: Reporter,
+        resume_state: JournalState | None,
+    ) -> None:
+        self.runner: TaskRunner = runner
+        self.findings: Findings = findings
+        self.explorer: Explorer = explorer
+        self.reporter: Reporter = reporter
+        self.minimizer: Minimizer = Minimizer(runner)
+        self.generation: int = 0
+        if resume_state is None:
+            return
+
+        self.explorer.novelty.resume(resume_state)
+        self.findings.resume(resume_state)
+        self.generation = resume_state.checkpoint.generation
+        self.reporter.stats.progress.generation = self.generation
+        # Differentials that were waiting to be minimized when the run we're resuming died.
+        # They're run again, because minimization needs their results.
+        resumed_differentials: list[bytes] = resume_state.checkpoint.unminimized_differentials
+        if len(resumed_differentials) != 0:
+            runner.submit("recheck", resumed_differentials, run_batch, resumed_differentials)
+        # Likewise, the corpus of the run we're resuming is run again, for its edges.
+        for offset in range(0, len(resume_state.corpus_entries), EXECUTION_BATCH_SIZE):
+            resumed_batch: list[tuple[int, bytes]] = resume_state.corpus_entries[
+                offset : offset + EXECUTION_BATCH_SIZE
+            ]
+            runner.submit("reload", resumed_batch, run_batch, [the_input for _, the_input in resumed_batch])
+
+    def feed(self) -> None:
+        """
+        Keeps the workers fed.
+        """
+        while len(self.explorer.pending_inputs) != 0 and self.runner.has_room_for_runs():
+            batch: list[bytes] = self.explorer.take_batch()
+            self.runner.submit("run", batch, run_batch, batch)
+        while len(self.findings.unminimized) != 0 and self.minimizer.has_room():
+            self.minimizer.start(*self.findings.unminimized.popleft())
+        self.minimizer.submit_pending()
+
+    def start_generation(self) -> bool:
+        """
+        Starts the next generation, unless every child it makes is already running.
+        Returns whether it started.
+        """
+        mutate_start_time: float = time.perf_counter()
+        num_children: int = self.explorer.make_generation()
+        self.reporter.stats.record_stage_time("mutate", time.perf_counter() - mutate_start_time)
+        if num_children == 0:
+            return False
+        self.reporter.report_generation(self.generation, self.explorer, self.findings)
+        self.explorer.new_entries = 0
+        self.generation += 1
+        self.reporter.stats.progress.generation = self.generation
+        self.explorer.checkpoint(
+            self.generation,
+            [differential for differential, _ in self.findings.unminimized] + self.minimizer.differentials(),
+        )
+        print(f"Starting generation {self.generation}.", file=sys.stderr)
+        return True
+
+    def write_stats(self) -> None:
+        self.reporter.write(self.explorer, self.findings, self.minimizer)
+        self.findings.write_buckets()
+
+    def handle(self, kind: str, context: Any, task_result: Any) -> None:
+        """
+        Takes in the result of a finished task.
+        """
+        if kind == "run":
+            self.reporter.record_batch(task_result)
+            self.explorer.record_runs(context, task_result, self.findings)
+        elif kind == "reload":
+            self.reporter.record_batch(task_result)
+            for (depth, current_input), result in zip(context, task_result):
+                self.explorer.add(current_input, result, depth)
+        elif kind == "recheck":
+            self.reporter.record_batch(task_result)
+            for current_input, result in zip(context, task_result):
+                if is_differential(result):
+                    self.findings.requeue(current_input, result)
+        elif kind == "reduce":
+            self.reporter.record_minimization(task_result, context[2])
+            self.minimizer.record_reduction(context, task_result)
+        elif kind == "fingerprint":
+            self.reporter.record_minimization(task_result, ALL_TARGETS)
+            self.findings.report(context, task_result[0])
+
+    def run(self, max_generations: int | None) -> int:
+        """
+        Fuzzes until interrupted, or until max_generations generations have run.
+        Returns the number of target executions.
+        """
+        print(f"Starting generation {self.generation}.", file=sys.stderr)
+        # Set when a generation had nothing new to run, until another task finishes
+        waiting_for_runs: bool = False
+        while True:
+            self.runner.fit_to_workers()
+            self.feed()
+
+            # Once the current generation is almost done running, make the next one,
+            # so that the workers never run out of inputs while we wait for stragglers.
+            if (
+                len(self.explorer.pending_inputs) == 0
+                and self.runner.runs_in_flight < self.runner.num_workers
+                and len(self.explorer.corpus) != 0
+                and (max_generations is None or self.generation + 1 < max_generations)
+            ):
+                if not waiting_for_runs and self.start_generation():
+                    continue
+                # The next generation only had children that are still running, so wait for one to finish.
+                waiting_for_runs = True
+
+            if self.runner.idle():
+                # Nothing is running, and nothing is left to run.
+                self.write_stats()
+                return self.reporter.stats.execs
+
+            if self.reporter.time_until_write() == 0:
+                self.write_stats()
+            completion: tuple[str, Any, Any] | None = self.runner.next_completion(
+                self.reporter.time_until_write()
+            )
+            if completion is not None:
+                self.handle(*completion)
+                waiting_for_runs = False
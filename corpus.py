@@ -0,0 +1,307 @@
+#############################################################################################
+# corpus.py
+# The inputs worth mutating, and how much mutation each one gets.
+# Entries stay in the corpus for the whole run. Each generation, the mutation budget is split
+# between them by an AFL-style power schedule, which favors entries that hit rare edges
+# (or behave in a rare way), run fast, are deep in the mutation tree, and have had productive children.
+# Entries that aren't the smallest to hit any edge are culled down to a small share of the budget.
+# Entries can also be saved to a directory as they're found, and a directory of inputs can be distilled
+# down to the few that keep all of its coverage, so that later runs can start where earlier ones left off.
+#############################################################################################
+
+import collections
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import PosixPath
+from typing import Hashable, Iterable, Sequence
+
+import numpy as np
+
+from forkserver import MAP_SIZE
+from fingerprint import fingerprint_t, map_size_for
+
+# An entry's energy is scaled by how fast it runs compared to the average entry, within these bounds.
+MIN_SPEED_FACTOR: float = 0.1
+MAX_SPEED_FACTOR: float = 3.0
+
+# An entry's energy is scaled by how productive its children have been compared to the average entry's,
+# within these bounds.
+MIN_PRODUCTIVITY_FACTOR: float = 0.1
+MAX_PRODUCTIVITY_FACTOR: float = 10.0
+
+# The energy multiplier for entries at least as deep as each of these depths, as in afl-fuzz.
+DEPTH_FACTORS: list[tuple[int, float]] = [(26, 5.0), (14, 4.0), (8, 3.0), (4, 2.0), (0, 1.0)]
+
+# An entry's energy is scaled by this if it isn't favored, the way afl-fuzz mostly skips entries that aren't.
+UNFAVORED_FACTOR: float = 0.05
+
+# The number of each entry's rarest edges that are kept for judging its rarity later.
+# (Edge counts only grow, so an entry's rarest edges when it was added are very likely to stay its rarest)
+RARE_EDGES_KEPT: int = 8
+
+
+# What the power schedule keeps for each entry: its rarest edges when it was added,
+# how the targets behaved on it (see Corpus.add), seconds per run of the targets, the energy multiplier
+# for its depth, the number of children made from it, and the number of those that turned out to be novel
+ENTRY_DTYPE: np.dtype = np.dtype(
+    [
+        ("rare_edges", np.uint32, (RARE_EDGES_KEPT,)),
+        ("pattern", np.int64),
+        ("exec_time", np.float64),
+        ("depth_factor", np.float64),
+        ("children", np.int64),
+        ("productive_children", np.int64),
+    ]
+)
+
+# What the corpus keeps for each edge: the number of entries that hit it,
+# and the smallest entry that hits it (or -1, for edges that none do), and that entry's length
+EDGE_DTYPE: np.dtype = np.dtype([("count", np.uint32), ("top_rated", np.int64), ("top_rated_len", np.int64)])
+
+# What the corpus keeps for each behavior pattern: the number of entries with it, and the smallest of them
+PATTERN_DTYPE: np.dtype = np.dtype([("count", np.int64), ("top_rated", np.int64)])
+
+
+@dataclass
+class CorpusEntry:
+    input: bytes
+    # The number of mutations between this entry and a seed
+    depth: int
+
+
+def depth_factor(depth: int) -> float:
+    return next(factor for min_depth, factor in DEPTH_FACTORS if depth >= min_depth)
+
+
+def grow(array: np.ndarray, min_len: int) -> np.ndarray:
+    """
+    Returns array, or a copy with at least twice the room if it's shorter than min_len.
+    """
+    if len(array) >= min_len:
+        return array
+    grown: np.ndarray = np.zeros((max(min_len, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def unhit_edges(num_edges: int) -> np.ndarray:
+    """
+    Returns the EDGE_DTYPE rows for edges that no entry hits yet.
+    """
+    edges: np.ndarray = np.zeros(num_edges, dtype=EDGE_DTYPE)
+    edges["top_rated"] = -1
+    edges["top_rated_len"] = np.iinfo(np.int64).max
+    return edges
+
+
+class Corpus:
+    """
+    The corpus, with the per-entry metadata that the power schedule needs.
+    The metadata is kept in arrays, one row per entry, so that the schedule is computed all at once.
+    Like afl-fuzz, the corpus keeps a favored subset: the smallest entry that hits each edge
+    (and that has each behavior pattern). The other entries are culled down to a small share of the energy.
+    """
+
+    def __init__(self, num_targets: int, seed: int | None = None) -> None:
+        self.entries: list[CorpusEntry] = []
+        # The size of each target's coverage map, which grows if the target turns out to have a bigger one.
+        # Edges are numbered across the targets, by where they fall in the maps laid end to end.
+        self.map_sizes: list[int] = [MAP_SIZE for _ in range(num_targets)]
+        # One EDGE_DTYPE row per edge.
+        # The last row is a stand-in for the edges of entries with fewer than RARE_EDGES_KEPT edges,
+        # and its count is as high as it goes, so that it's never the rarest.
+        self.edges: np.ndarray = unhit_edges(num_targets * MAP_SIZE + 1)
+        self.edges["count"][-1] = np.iinfo(np.uint32).max
+        # Behavior patterns are numbered in the order they're first seen, and get one PATTERN_DTYPE row each.
+        self.pattern_ids: dict[Hashable, int] = {}
+        self.patterns: np.ndarray = np.zeros(0, dtype=PATTERN_DTYPE)
+        # One ENTRY_DTYPE row per entry (with room for more at the end)
+        self.entry_stats: np.ndarray = np.zeros(0, dtype=ENTRY_DTYPE)
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(
+        self, the_input: bytes, fingerprint: fingerprint_t, pattern: Hashable, exec_time: float, depth: int
+    ) -> int:
+        """
+        Adds an entry, and returns its index.
+        pattern is anything hashable that summarizes how the targets behaved on the input
+        (entries whose pattern is rare get more energy, like entries that hit rare edges).
+        """
+        index: int = len(self.entries)
+        for target_index, target_edges in enumerate(fingerprint):
+            if len(target_edges) != 0 and max(target_edges) >= self.map_sizes[target_index]:
+                self.grow_map(target_index, map_size_for(max(target_edges)))
+        edges: np.ndarray = np.concatenate(
+            [
+                np.fromiter(target_edges, dtype=np.uint32, count=len(target_edges))
+                for target_edges in fingerprint
+            ]
+            + [np.zeros(0, dtype=np.uint32)]
+        )
+        edges += np.repeat(self.map_offsets(), [len(target_edges) for target_edges in fingerprint])
+        edge_counts: np.ndarray = self.edges["count"]
+        edge_counts[edges] += 1
+        # Take over the edges that this entry is the smallest to hit
+        won: np.ndarray = edges[self.edges["top_rated_len"][edges] > len(the_input)]
+        self.edges["top_rated"][won] = index
+        self.edges["top_rated_len"][won] = len(the_input)
+
+        pattern_id: int = self.pattern_ids.setdefault(pattern, len(self.pattern_ids))
+        self.patterns = grow(self.patterns, pattern_id + 1)
+        pattern_row: np.ndarray = self.patterns[pattern_id : pattern_id + 1]
+        if pattern_row["count"][0] == 0 or len(self.entries[pattern_row["top_rated"][0]].input) > len(
+            the_input
+        ):
+            pattern_row["top_rated"] = index
+        pattern_row["count"] += 1
+
+        self.entry_stats = grow(self.entry_stats, index + 1)
+        entry: np.ndarray = self.entry_stats[index : index + 1]
+        rarest: np.ndarray = edges[np.argsort(edge_counts[edges], kind="stable")[:RARE_EDGES_KEPT]]
+        entry["rare_edges"] = len(self.edges) - 1
+        entry["rare_edges"][0, : len(rarest)] = rarest
+        entry["pattern"] = pattern_id
+        entry["exec_time"] = exec_time
+        entry["depth_factor"] = depth_factor(depth)
+
+        self.entries.append(CorpusEntry(the_input, depth))
+        return index
+
+    def map_offsets(self) -> np.ndarray:
+        """
+        Returns where each target's edges start in the numbering across the targets.
+        """
+        sizes: np.ndarray = np.array(self.map_sizes, dtype=np.uint32)
+        return np.cumsum(sizes, dtype=np.uint32) - sizes
+
+    def grow_map(self, target_index: int, map_size: int) -> None:
+        """
+        Makes room for a target's edges up to map_size, renumbering the edges of the targets after it.
+        """
+        end: int = int(self.map_offsets()[target_index]) + self.map_sizes[target_index]
+        growth: int = map_size - self.map_sizes[target_index]
+        self.edges = np.insert(self.edges, end, unhit_edges(growth))
+        rare_edges: np.ndarray = self.entry_stats["rare_edges"]
+        rare_edges[rare_edges >= end] += growth
+        self.map_sizes[target_index] = map_size
+
+    def edges_found(self) -> list[int]:
+        """
+        Returns the number of edges that the corpus hits in each target.
+        """
+        return [
+            int(np.count_nonzero(target_edge_counts))
+            for target_edge_counts in np.split(self.edges["count"][:-1], np.cumsum(self.map_sizes)[:-1])
+        ]
+
+    def favored(self) -> np.ndarray:
+        """
+        Returns whether each entry is favored: the smallest entry to hit one of the edges, or to have a pattern.
+        """
+        favored: np.ndarray = np.zeros(len(self.entries), dtype=bool)
+        top_rated: np.ndarray = self.edges["top_rated"]
+        favored[top_rated[top_rated >= 0]] = True
+        favored[self.patterns["top_rated"][: len(self.pattern_ids)]] = True
+        return favored
+
+    def record_child(self, parent_index: int, productive: bool) -> None:
+        """
+        Records whether a child of an entry turned out to be novel.
+        """
+        if productive:
+            self.entry_stats["productive_children"][parent_index] += 1
+
+    def energies(self) -> np.ndarray:
+        """
+        Returns each entry's share of the mutation budget.
+        """
+        entry_stats: np.ndarray = self.entry_stats[: len(self.entries)]
+        # Rarity: one over the number of entries that share the entry's rarest edge or its pattern
+        min_counts: np.ndarray = np.minimum(
+            self.edges["count"][entry_stats["rare_edges"]].min(axis=1),
+            self.patterns["count"][entry_stats["pattern"]],
+        )
+        rarity: np.ndarray = 1 / min_counts.astype(np.float64)
+
+        exec_times: np.ndarray = entry_stats["exec_time"]
+        speed: np.ndarray = np.clip(
+            exec_times.mean() / np.maximum(exec_times, 1e-9), MIN_SPEED_FACTOR, MAX_SPEED_FACTOR
+        )
+
+        # Each entry's rate of productive children, estimated as if it had started out with
+        # one productive child per 1/rate children, where rate is the whole corpus's rate.
+        # That way, new entries get the average energy until they've had enough children to judge them by.
+        children: np.ndarray = entry_stats["children"]
+        productive_children: np.ndarray = entry_stats["productive_children"]
+        rate: float = (int(productive_children.sum()) + 1) / (int(children.sum()) + 1)
+        productivity: np.ndarray = np.clip(
+            (productive_children + 1) / (children + 1 / rate) / rate,
+            MIN_PRODUCTIVITY_FACTOR,
+            MAX_PRODUCTIVITY_FACTOR,
+        )
+
+        culling: np.ndarray = np.where(self.favored(), 1.0, UNFAVORED_FACTOR)
+
+        energy: np.ndarray = rarity * speed * entry_stats["depth_factor"] * productivity * culling
+        return energy / energy.sum()
+
+    def schedule(self, num_children: int) -> list[int]:
+        """
+        Splits num_children children between the entries by energy,
+        and returns the index of each child's parent.
+        """
+        assert len(self.entries) != 0
+        counts: np.ndarray = self.rng.multinomial(num_children, self.energies())
+        self.entry_stats["children"][: len(self.entries)] += counts
+        return np.repeat(np.arange(len(self.entries)), counts).tolist()
+
+
+def save_input(directory: PosixPath, the_input: bytes) -> None:
+    """
+    Saves an input in directory, named by its hash, so that saving it again does nothing.
+    """
+    path: PosixPath = directory.joinpath(hashlib.blake2b(the_input, digest_size=16).hexdigest())
+    if not path.exists():
+        with open(path, "wb") as f:
+            f.write(the_input)
+
+
+def load_inputs(directory: PosixPath) -> list[bytes]:
+    """
+    Returns the distinct inputs in directory, in name order.
+    """
+    inputs: dict[bytes, None] = {}
+    for name in sorted(os.listdir(directory)):
+        with open(directory.joinpath(name), "rb") as f:
+            inputs[f.read()] = None
+    return list(inputs)
+
+
+def distill(features: Sequence[Iterable[Hashable]], costs: Sequence[float]) -> list[int]:
+    """
+    Picks a small subset of the inputs that together have every feature that the inputs have, as afl-cmin does:
+    for each feature, rarest first, unless an input that's already been picked has it,
+    the cheapest input that has it is picked.
+    features[i] holds input i's features (such as the edges it hits), and costs[i] is how costly it is to keep.
+    Returns the indices of the picked inputs, in order.
+    """
+    feature_sets: list[frozenset[Hashable]] = [frozenset(input_features) for input_features in features]
+    # The number of inputs with each feature, and the cheapest of them
+    counts: collections.Counter[Hashable] = collections.Counter()
+    cheapest: dict[Hashable, int] = {}
+    for i in sorted(range(len(feature_sets)), key=costs.__getitem__):
+        counts.update(feature_sets[i])
+        for feature in feature_sets[i]:
+            cheapest.setdefault(feature, i)
+
+    picked: set[int] = set()
+    covered: set[Hashable] = set()
+    for feature in sorted(cheapest, key=counts.__getitem__):
+        if feature not in covered:
+            picked.add(cheapest[feature])
+            covered.update(feature_sets[cheapest[feature]])
+    return sorted(picked)
@@ -7,37 +7,51 @@
 #############################################################################################
 
 import sys
-import subprocess
+import argparse
 import multiprocessing
+import multiprocessing.pool
+import collections
 import random
 import itertools
 import os
 import re
-import json
-import functools
 import uuid
 import shutil
-import base64
+import hashlib
+import contextlib
+from multiprocessing.sharedctypes import Synchronized
 from pathlib import PosixPath
-from typing import Callable
-
-
-from tqdm import tqdm  # type: ignore
+from typing import Hashable
 
 from config import (
     ParseTree,
-    compare_parse_trees,
-    TargetConfig,
-    TIMEOUT_TIME,
     TARGET_CONFIGS,
-    ROUGH_DESIRED_QUEUE_LEN,
     SEED_DIR,
-    DETECT_OUTPUT_DIFFERENTIALS,
-    DIFFERENTIATE_NONZERO_EXIT_STATUSES,
-    DELETION_LENGTHS,
     RESULTS_DIR,
     USE_GRAMMAR_MUTATIONS,
+    GRAMMAR_SPAN_CACHE_SIZE,
+    EXECUTION_BATCH_SIZE,
+    HAVOC_STACK_POW2,
+    MUTATION_TOKENS,
+    RANDOM_SEED,
+    STATS_PORT,
+)
+
+from forkserver import TIMEOUT_STATUS
+from execution import (
+    ExecutionResult,
+    init_worker,
+    make_worker_initargs,
+    target_cache_digest,
+    run_batch,
+    run_candidates,
 )
+from distributed import Codec, RemotePool, WorkerPool, run_worker, parse_address
+from mutation import Havoc
+from corpus import save_input, load_inputs, distill
+from stats import StatsServer
+from journal import Journal, JournalState, read_journal
+from campaign import behavior_pattern, TaskRunner, Findings, Explorer, Reporter, Campaign
 
 if USE_GRAMMAR_MUTATIONS:
     try:
@@ -55,250 +69,132 @@ assert RESULTS_DIR.is_dir()
 
 assert all(map(lambda tc: tc.executable.exists(), TARGET_CONFIGS))
 
-fingerprint_t = tuple[frozenset[int], ...]
-
-
-def grammar_regenerate(b: bytes) -> bytes:
-    # Assumes that b matches the grammar_re.
-    # Returns a mutated b with a portion regenerated.
-    m: re.Match[bytes] | None = re.match(grammar_re, b)
-    assert m is not None
-    rule_name: str = random.choice(
-        [rule_name for rule_name, rule_match in m.groupdict().items() if rule_match is not None]
-    )
-    new_rule_match: bytes = generate_random_matching_input(grammar_dict[rule_name])
-    start, end = m.span(rule_name)
-    return m.string[:start] + new_rule_match + m.string[end:]
-
-
-def byte_change(b: bytes) -> bytes:
-    index: int = random.randint(0, len(b) - 1)
-    return b[:index] + bytes([random.randint(0, 255)]) + b[index + 1 :]
-
-
-def byte_insert(b: bytes) -> bytes:
-    index: int = random.randint(0, len(b))
-    return b[:index] + bytes([random.randint(0, 255)]) + b[index:]
 
+# Where each of the grammar's rules matched in an input, as (rule name, start, end), in group order.
+rule_spans_t = tuple[tuple[str, int, int], ...]
 
-def byte_delete(b: bytes) -> bytes:
-    index: int = random.randint(0, len(b) - 1)
-    return b[:index] + b[index + 1 :]
 
-
-def mutate(b: bytes) -> bytes:
-    mutators: list[Callable[[bytes], bytes]] = [byte_insert]
-    if len(b) > 0:
-        mutators.append(byte_change)
-    if len(b) > 1:
-        mutators.append(byte_delete)
-    if USE_GRAMMAR_MUTATIONS:
-        if re.match(grammar_re, b) is not None:
-            mutators.append(grammar_regenerate)
-
-    return random.choice(mutators)(b)
-
-
-def parse_tracer_output(tracer_output: bytes) -> frozenset[int]:
-    result: set[int] = set()
-    for line in tracer_output.split(b"\n"):
-        try:
-            edge, _ = map(int, line.strip().split(b":"))
-            result.add(edge)
-        except ValueError:
-            pass
-    return frozenset(result)
-
-
-def make_command_line(
-    tc: TargetConfig, input_dir: PosixPath | None, output_dir: PosixPath | None
-) -> list[str]:
+class GrammarRegenerator:
     """
-    Make the afl-showmap command line for this target config.
-    If input_dir and output_dir are None, then read from stdin and write to stdout.
+    Regenerates the part of an input that matched one of the grammar's rules,
+    and leaves inputs that don't match the grammar alone.
+    Matching the grammar is expensive, so the rule spans of recent inputs are cached by content digest,
+    along with which inputs didn't match at all.
+    A regenerated input gets its parent's spans, moved to account for the new rule match. That's still
+    a valid match of the grammar, though it might not be the one that re.match would have found.
     """
-    command_line: list[str] = []
-    if tc.needs_tracing:
-        if tc.needs_python_afl:
-            command_line.append("py-afl-showmap")
-        else:
-            command_line.append("afl-showmap")
-            if tc.needs_qemu:  # Enable QEMU mode, if necessary
-                command_line.append("-Q")
-        command_line.append("-q")  # Don't care about traced program stdout
-        command_line.append("-e")  # Only care about edge coverage; ignore hit counts
-        if input_dir is not None and output_dir is not None:
-            command_line += ["-i", str(input_dir.resolve()), "-o", str(output_dir.resolve())]
-        elif input_dir is None and output_dir is None:
-            command_line += ["-o", "/dev/stdout"]
-        else:
-            print("Either both or neither of input_dir, output_dir can be None.", file=sys.stderr)
-            sys.exit(1)
-
-        command_line += ["-t", str(TIMEOUT_TIME)]
-        command_line.append("--")
 
-    command_line.append(str(tc.executable.resolve()))
-    command_line += tc.cli_args
-
-    return command_line
-
-
-def minimize_differential(bug_inducing_input: bytes) -> bytes:
-    orig_statuses, orig_parse_trees = run_targets(bug_inducing_input)
-
-    needs_parse_tree_comparison: bool = len(set(orig_statuses)) == 1
-
-    orig_parse_tree_comparisons: list[tuple[bool, ...]] = (
-        list(itertools.starmap(compare_parse_trees, itertools.combinations(orig_parse_trees, 2)))
-        if needs_parse_tree_comparison
-        else [(True,)]
-    )
-
-    result: bytes = bug_inducing_input
-
-    for deletion_length in DELETION_LENGTHS:
-        i: int = len(result) - deletion_length
-        while i >= 0:
-            reduced_form: bytes = result[:i] + result[i + deletion_length :]
-            if reduced_form == b"":
-                i -= 1
-                continue
-            new_statuses, new_parse_trees = run_targets(reduced_form)
-            if (
-                new_statuses == orig_statuses
-                and (
-                    list(itertools.starmap(compare_parse_trees, itertools.combinations(new_parse_trees, 2)))
-                    if needs_parse_tree_comparison
-                    else [(True,)]
-                )
-                == orig_parse_tree_comparisons
-            ):
-                result = reduced_form
-                i -= deletion_length
+    def __init__(self, cache_size: int) -> None:
+        self.cache_size: int = cache_size
+        # Rule spans by input digest, or None for inputs that don't match the grammar. Oldest use first.
+        self.span_cache: collections.OrderedDict[bytes, rule_spans_t | None] = collections.OrderedDict()
+        self.group_numbers: dict[str, int] = dict(grammar_re.groupindex)
+        # The rules that appear inside of each rule, which get regenerated along with it
+        self.nested_rules: dict[str, set[str]] = {
+            rule_name: set(re.compile(grammar_dict[rule_name]).groupindex) - {rule_name}
+            for rule_name in grammar_re.groupindex
+        }
+
+    def remember(self, digest: bytes, spans: rule_spans_t | None) -> None:
+        self.span_cache[digest] = spans
+        self.span_cache.move_to_end(digest)
+        if len(self.span_cache) > self.cache_size:
+            self.span_cache.popitem(last=False)
+
+    def rule_spans(self, b: bytes, digest: bytes) -> rule_spans_t | None:
+        if digest in self.span_cache:
+            self.span_cache.move_to_end(digest)
+            return self.span_cache[digest]
+        m: re.Match[bytes] | None = re.match(grammar_re, b)
+        spans: rule_spans_t | None = None
+        if m is not None:
+            spans = tuple(
+                (rule_name, *m.span(rule_name))
+                for rule_name, rule_match in m.groupdict().items()
+                if rule_match is not None
+            )
+        self.remember(digest, spans)
+        return spans
+
+    def moved_spans(self, spans: rule_spans_t, rule_name: str, new_len: int) -> rule_spans_t:
+        """
+        Returns where the spans end up once the span of rule_name is replaced by new_len bytes.
+        """
+        start, end = next((s, e) for name, s, e in spans if name == rule_name)
+        delta: int = new_len - (end - start)
+        result: list[tuple[str, int, int]] = []
+        for name, s, e in spans:
+            if name == rule_name:
+                result.append((name, start, start + new_len))
+            elif name in self.nested_rules[rule_name]:
+                continue  # Its old match is gone, and we don't know where it is in the new one
+            elif rule_name in self.nested_rules[name]:
+                result.append((name, s, e + delta))
+            elif e <= start and s >= end:
+                # An empty match next to an empty rule_name match; it's before it iff it's earlier in the grammar.
+                before: bool = self.group_numbers[name] < self.group_numbers[rule_name]
+                result.append((name, s, e) if before else (name, s + delta, e + delta))
+            elif e <= start:
+                result.append((name, s, e))
             else:
-                i -= 1
+                result.append((name, s + delta, e + delta))
+        return tuple(result)
+
+    def __call__(self, b: bytes) -> bytes:
+        spans: rule_spans_t | None = self.rule_spans(b, hashlib.blake2b(b, digest_size=16).digest())
+        if spans is None:
+            return b
+        rule_name, start, end = random.choice(spans)
+        new_rule_match: bytes = generate_random_matching_input(grammar_dict[rule_name])
+        result: bytes = b[:start] + new_rule_match + b[end:]
+        self.remember(
+            hashlib.blake2b(result, digest_size=16).digest(),
+            self.moved_spans(spans, rule_name, len(new_rule_match)),
+        )
+        return result
 
-    return result
 
+# Task arguments and results cross the network in distributed mode, so they need to be encoded.
+CODEC: Codec = Codec([ExecutionResult, ParseTree])
 
-@functools.cache
-def run_targets(the_input: bytes) -> tuple[tuple[int, ...], tuple[ParseTree | None, ...]]:
+
+def targets_hello() -> list[list[str]]:
     """
-    This function needs a better name.
-    This runs the targets on an input, and returns a (exit_statuses, parse_trees) pair.
-    (A call to this function makes one process for each configured target)
+    Identifies our targets to a coordinator (or to workers), so that we can't mix up results from different
+    targets, or from different builds of one target. (Edge IDs are only comparable within one build.)
     """
-    procs: list[subprocess.Popen] = []
+    return [[tc.name, target_cache_digest(i).hex()] for i, tc in enumerate(TARGET_CONFIGS)]
 
-    for tc in TARGET_CONFIGS:
-        command_line: list[str] = [str(tc.executable.resolve())] + tc.cli_args
 
-        proc: subprocess.Popen = subprocess.Popen(
-            command_line,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE if DETECT_OUTPUT_DIFFERENTIALS else subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            env=tc.env,
-        )
-        assert proc.stdin is not None
-        proc.stdin.write(the_input)
-        proc.stdin.close()
-        procs.append(proc)
-
-    # Wait for the processes to exit
-    for proc in procs:
-        if proc is not None:
-            proc.wait()
-
-    # Extract the exit statuses
-    statuses: tuple[int, ...] = tuple(proc.returncode for proc in procs)
-    if not DIFFERENTIATE_NONZERO_EXIT_STATUSES:
-        statuses = tuple(map(lambda i: int(bool(i)), statuses))
-
-    # Extract the parse trees
-    parse_trees: tuple[ParseTree | None, ...] = tuple(
-        ParseTree(**{k: base64.b64decode(v) for k, v in json.loads(proc.stdout.read()).items()})
-        if proc.stdout is not None and status == 0
-        else None
-        for proc, status in zip(procs, statuses)
+def worker_main(coordinator_address: tuple[str, int], work_dir: PosixPath) -> None:
+    """
+    Runs tasks for a coordinator until it goes away.
+    """
+    num_cpus = os.cpu_count()
+    assert num_cpus is not None
+    print(f"Working for {coordinator_address[0]}:{coordinator_address[1]}.", file=sys.stderr)
+    run_worker(
+        coordinator_address,
+        [run_batch, run_candidates],
+        CODEC,
+        targets_hello(),
+        WorkerPool(num_cpus, init_worker, make_worker_initargs(work_dir)),
     )
 
-    return statuses, parse_trees
-
 
-def trace_batch(work_dir: PosixPath, batch: list[bytes]) -> list[fingerprint_t]:
+def main(
+    work_dir: PosixPath,
+    run_dir: PosixPath,
+    resume_state: JournalState | None,
+    coordinator_address: tuple[str, int] | None,
+    max_generations: int | None = None,
+) -> int:
     """
-    Runs the configured targets on the inputs in batch, and collects trace fingerprints.
-    (A call to this function makes one process for each configured target)
+    Fuzzes until interrupted, or until max_generations generations have run.
+    Differentials are written to run_dir, and to its journal, as they're found.
+    Returns the number of target executions.
     """
-
-    # Contains the data for this batch
-    batch_dir: PosixPath = work_dir.joinpath(f"batch-{str(uuid.uuid4())}")
-    os.mkdir(batch_dir)
-    # Contains the inputs in this batch
-    input_dir: PosixPath = batch_dir.joinpath("inputs")
-    os.mkdir(input_dir)
-
-    # Write each input in the batch to a file in tmpfs
-    for b in batch:
-        with open(input_dir.joinpath(str(hash(b))), "wb") as f:
-            f.write(b)
-
-    procs: list[subprocess.Popen | None] = []
-
-    # Run the batch through each configured target.
-    for tc in TARGET_CONFIGS:
-        if tc.needs_tracing:
-            # Contains the traces for this target on this batch
-            trace_dir: PosixPath = batch_dir.joinpath(f"traces-{tc.name}")
-            command_line: list[str] = make_command_line(tc, input_dir, trace_dir)
-            proc: subprocess.Popen = subprocess.Popen(
-                command_line,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                env=tc.env,
-                cwd=str(work_dir.resolve()),  # because afl makes temp files
-            )
-            procs.append(proc)
-        else:
-            procs.append(None)
-
-    # Wait for the showmap processes to exit
-    for p in procs:
-        if p is not None:
-            p.wait()
-
-    # Extract the traces
-    fingerprints: list[fingerprint_t] = []
-    for b in batch:
-        fingerprint: list[frozenset[int]] = []
-        for tc in TARGET_CONFIGS:
-            if tc.needs_tracing:
-                trace_file: PosixPath = batch_dir.joinpath(f"traces-{tc.name}").joinpath(str(hash(b)))
-                with open(trace_file, "rb") as f:
-                    fingerprint.append(parse_tracer_output(f.read()))
-            else:
-                fingerprint.append(frozenset())
-        fingerprints.append(tuple(fingerprint))
-
-    shutil.rmtree(batch_dir)
-    return fingerprints
-
-
-def split_input_queue(l: list[bytes], num_chunks: int) -> list[list[bytes]]:
-    chunk_size, remainder = divmod(len(l), num_chunks)
-    return [
-        l[i * chunk_size + min(i, remainder) : (i + 1) * chunk_size + min(i + 1, remainder)]
-        for i in range(min(num_chunks, len(l)))
-    ]
-
-
-def main(minimized_differentials: list[bytes], work_dir: PosixPath) -> None:
-    # We take minimized_differentials as an argument because we want
-    # it to persist even if this function has an uncaught exception.
-    assert len(minimized_differentials) == 0
+    random.seed(RANDOM_SEED)
     num_cpus = os.cpu_count()
     assert num_cpus is not None
 
@@ -307,135 +203,167 @@ def main(minimized_differentials: list[bytes], work_dir: PosixPath) -> None:
     # That said, experiments show that num_cpus is still better for some reason.
     num_workers: int = num_cpus
 
-    input_queue: list[bytes] = []
-    for seed_input in SEED_INPUTS:
-        with open(seed_input, "rb") as f:
-            input_queue.append(f.read())
-
-    # One input `I` produces one trace per program being fuzzed.
-    # Convert each trace to a frozenset of edges by deduplication.
-    # Pack those sets together in a tuple.
-    # This is a fingerprint of the programs' execution on the input `I`.
-    # Keep these fingerprints in a set.
-    # An input is worth mutation if its fingerprint is new.
-    seen_fingerprints: set[fingerprint_t] = set()
-
-    # This is the set of fingerprints that correspond with minimized differentials.
-    # Whenever we minimize a differential into an input with a fingerprint not in this set,
-    # we report it and add it to this set.
-    minimized_fingerprints: set[fingerprint_t] = set()
-
-    generation: int = 0
-
-    while len(input_queue) != 0:  # While there are still inputs to check,
-        print(f"Starting generation {generation}.", file=sys.stderr)
-        mutation_candidates: list[bytes] = []
-        differentials: list[bytes] = []
-
-        # Split the input queue into batches, with one batch for each worker.
-        batches: list[list[bytes]] = split_input_queue(input_queue, num_workers)
-
-        # Trace all the parser runs
-        print("Tracing targets...", end="", file=sys.stderr)
-        with multiprocessing.Pool(processes=num_workers) as pool:
-            new_fingerprints: list[fingerprint_t] = sum(
-                pool.imap(functools.partial(trace_batch, work_dir), batches),
-                start=[],
-            )
-        print("Done!", file=sys.stderr)
-
-        # Re-run all the targets, this time collecting stdouts and statuses
-        with multiprocessing.Pool(processes=num_workers) as pool:
-            statuses_and_parse_trees: list[tuple[tuple[int, ...], tuple[ParseTree | None, ...]]] = list(
-                tqdm(
-                    pool.imap(run_targets, input_queue),
-                    desc="Running targets...",
-                    total=len(input_queue),
-                )
-            )
+    # Makes the next generation out of the corpus.
+    havoc: Havoc = Havoc(
+        MUTATION_TOKENS,
+        [GrammarRegenerator(GRAMMAR_SPAN_CACHE_SIZE)] if USE_GRAMMAR_MUTATIONS else [],
+        HAVOC_STACK_POW2,
+        RANDOM_SEED,
+    )
+
+    # Everything we find goes in the journal as we find it, and the queue is checkpointed every generation,
+    # so that the run can be resumed if it dies. (See journal.py)
+    journal: Journal = Journal(run_dir.joinpath("journal"))
 
-        # Check for differentials and new coverage
-        for current_input, fingerprint, (statuses, parse_trees) in zip(
-            input_queue, new_fingerprints, statuses_and_parse_trees
-        ):
-            if fingerprint not in seen_fingerprints:
-                seen_fingerprints.add(fingerprint)
-                status_set: set[int] = set(statuses)
-                if (len(status_set) != 1) or (
-                    DETECT_OUTPUT_DIFFERENTIALS
-                    and status_set == {0}
-                    and any(
-                        False in cmp_vector
-                        for cmp_vector in itertools.starmap(
-                            compare_parse_trees, itertools.combinations(parse_trees, 2)
-                        )
-                    )
-                ):
-                    differentials.append(current_input)
-                else:
-                    mutation_candidates.append(current_input)
-
-        # Minimize differentials
-        with multiprocessing.Pool(processes=num_workers) as pool:
-            minimized_inputs: list[bytes] = list(
-                tqdm(
-                    pool.imap(minimize_differential, differentials),
-                    desc="Minimizing differentials...",
-                    total=len(differentials),
+    stats_server: StatsServer | None = StatsServer(STATS_PORT) if STATS_PORT is not None else None
+
+    # Runs are looked up in (and added to) a cache that all of the workers share.
+    # The hit and miss counts are shared too, so that we can report them here.
+    initargs: tuple[PosixPath, PosixPath | None, Synchronized, Synchronized] = make_worker_initargs(work_dir)
+    _, _, cache_hits, cache_misses = initargs
+
+    # In coordinator mode, tasks go to whichever remote workers connect, instead of to a local pool.
+    pool_context: RemotePool | multiprocessing.pool.Pool
+    if coordinator_address is not None:
+        pool_context = RemotePool(coordinator_address, CODEC, targets_hello())
+        print(f"Waiting for workers on {coordinator_address[0]}:{coordinator_address[1]}.", file=sys.stderr)
+    else:
+        pool_context = multiprocessing.Pool(processes=num_workers, initializer=init_worker, initargs=initargs)
+
+    with journal, stats_server or contextlib.nullcontext(), pool_context as pool:
+        campaign: Campaign = Campaign(
+            TaskRunner(pool, num_workers),
+            Findings(run_dir, journal),
+            Explorer(journal, resume_state, havoc, SEED_INPUTS),
+            Reporter(run_dir, stats_server, (cache_hits, cache_misses)),
+            resume_state,
+        )
+        return campaign.run(max_generations)
+
+
+def distill_main(input_dir: PosixPath, output_dir: PosixPath, work_dir: PosixPath) -> None:
+    """
+    Runs the targets on every input in input_dir, and saves to output_dir the fewest of them
+    (preferring small, fast ones) that still hit every edge, and show every behavior pattern, that they all do.
+    Inputs on which a target times out are left out.
+    The result cache is bypassed, so that every input's speed is measured, rather than looked up as ~0.
+    """
+    inputs: list[bytes] = load_inputs(input_dir)
+    num_cpus = os.cpu_count()
+    assert num_cpus is not None
+    with multiprocessing.Pool(
+        processes=num_cpus,
+        initializer=init_worker,
+        initargs=make_worker_initargs(work_dir, use_result_cache=False),
+    ) as pool:
+        results: list[ExecutionResult] = list(
+            itertools.chain.from_iterable(
+                pool.map(
+                    run_batch,
+                    [
+                        inputs[offset : offset + EXECUTION_BATCH_SIZE]
+                        for offset in range(0, len(inputs), EXECUTION_BATCH_SIZE)
+                    ],
                 )
             )
-            print("Tracing minimized differentials...", file=sys.stderr)
-            new_minimized_fingerprints: list[fingerprint_t] = sum(
-                pool.imap(
-                    functools.partial(trace_batch, work_dir), split_input_queue(minimized_inputs, num_workers)
-                ),
-                [],
-            )
-            print("Done!", file=sys.stderr)
-            for new_minimized_fingerprint, minimized_input in zip(
-                new_minimized_fingerprints, minimized_inputs
-            ):
-                if new_minimized_fingerprint not in minimized_fingerprints:
-                    minimized_differentials.append(minimized_input)
-                    minimized_fingerprints.add(new_minimized_fingerprint)
-
-        input_queue.clear()
-        while len(mutation_candidates) != 0 and len(input_queue) < ROUGH_DESIRED_QUEUE_LEN:
-            input_queue += list(map(mutate, mutation_candidates))
-
-        print(
-            f"End of generation {generation}.\n"
-            + f"Differentials:\t\t{len(minimized_differentials)}\n"
-            + f"Mutation candidates:\t{len(mutation_candidates)}",
-            file=sys.stderr,
         )
-        generation += 1
+
+    candidates: list[int] = [i for i, result in enumerate(results) if TIMEOUT_STATUS not in result.statuses]
+    features: list[list[Hashable]] = [
+        [(target_index, edge) for target_index, edges in enumerate(results[i].fingerprint) for edge in edges]
+        + [behavior_pattern(results[i])]
+        for i in candidates
+    ]
+    # Like afl-fuzz, we weigh an input's size and speed equally.
+    costs: list[float] = [max(len(inputs[i]), 1) * results[i].exec_time for i in candidates]
+    picked: list[int] = [candidates[n] for n in distill(features, costs)]
+
+    os.makedirs(output_dir, exist_ok=True)
+    for i in picked:
+        save_input(output_dir, inputs[i])
+    print(
+        f"Kept {len(picked)} of {len(inputs)} inputs ({len(inputs) - len(candidates)} timed out),"
+        + f" which hit {len(set(itertools.chain.from_iterable(features)))} edges and behavior patterns.",
+        file=sys.stderr,
+    )
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 2:
-        print(f"Usage: python3 {sys.argv[0]}", file=sys.stderr)
-        sys.exit(1)
+    _parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Differential fuzzer")
+    _parser.add_argument(
+        "--resume", metavar="RUN_ID", help="pick up the run with this ID from where it left off"
+    )
+    _mode = _parser.add_mutually_exclusive_group()
+    _mode.add_argument(
+        "--coordinator",
+        metavar="[HOST:]PORT",
+        help="listen here for workers, and hand all of the execution off to them (by default, on localhost)",
+    )
+    _mode.add_argument(
+        "--worker", metavar="HOST:PORT", help="run executions for the coordinator at this address"
+    )
+    _mode.add_argument(
+        "--distill",
+        nargs=2,
+        metavar=("INPUT_DIR", "OUTPUT_DIR"),
+        help="copy the smallest set of inputs in INPUT_DIR that keeps all of their coverage to OUTPUT_DIR",
+    )
+    _args: argparse.Namespace = _parser.parse_args()
+
+    if _args.worker is not None:
+        _worker_dir: PosixPath = PosixPath("/tmp").joinpath(f"diff_fuzz-{str(uuid.uuid4())}")
+        os.mkdir(_worker_dir)
+        try:
+            worker_main(parse_address(_args.worker), _worker_dir)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shutil.rmtree(_worker_dir)
+        sys.exit(0)
+
+    if _args.distill is not None:
+        _distill_dir: PosixPath = PosixPath("/tmp").joinpath(f"diff_fuzz-{str(uuid.uuid4())}")
+        os.mkdir(_distill_dir)
+        try:
+            distill_main(PosixPath(_args.distill[0]), PosixPath(_args.distill[1]), _distill_dir)
+        finally:
+            shutil.rmtree(_distill_dir)
+        sys.exit(0)
+
+    _resume_state: JournalState | None = None
+    if _args.resume is not None:
+        _run_id: str = _args.resume
+        _run_dir: PosixPath = RESULTS_DIR.joinpath(_run_id)
+        if not _run_dir.joinpath("journal").is_file():
+            print(f"There's no journal for a run with ID {_run_id} in {RESULTS_DIR}.", file=sys.stderr)
+            sys.exit(1)
+        _resume_state = read_journal(_run_dir.joinpath("journal"))
+        # Chop off any partly written record, so that new records don't get appended to it
+        os.truncate(_run_dir.joinpath("journal"), _resume_state.length)
+    else:
+        _run_id = str(uuid.uuid4())
+        _run_dir = RESULTS_DIR.joinpath(_run_id)
+        os.mkdir(_run_dir)
 
-    _run_id: str = str(uuid.uuid4())
-    _work_dir: PosixPath = PosixPath("/tmp").joinpath(f"diff_fuzz-{_run_id}")
+    _work_dir: PosixPath = PosixPath("/tmp").joinpath(f"diff_fuzz-{str(uuid.uuid4())}")
     os.mkdir(_work_dir)
 
-    _final_results: list[bytes] = []
     try:
-        main(_final_results, _work_dir)
+        main(
+            _work_dir,
+            _run_dir,
+            _resume_state,
+            parse_address(_args.coordinator) if _args.coordinator is not None else None,
+        )
     except KeyboardInterrupt:
         pass
 
+    _final_results: list[bytes] = read_journal(_run_dir.joinpath("journal")).differentials
     if len(_final_results) != 0:
         print("Differentials:", file=sys.stderr)
         print("\n".join(repr(b) for b in _final_results))
     else:
         print("No differentials found! Try increasing ROUGH_DESIRED_QUEUE_LEN.", file=sys.stderr)
-
-    os.mkdir(RESULTS_DIR.joinpath(_run_id))
-    for ctr, final_result in enumerate(_final_results):
-        with open(RESULTS_DIR.joinpath(_run_id).joinpath(f"differential_{ctr}"), "wb") as result_file:
-            result_file.write(final_result)
+    print(f"To pick up where this run left off, pass --resume {_run_id}", file=sys.stderr)
 
     shutil.rmtree(_work_dir)
@@ -0,0 +1,262 @@
+#############################################################################################
+# differentials.py
+# Deciding whether the targets disagree on an input, and how: differentials are bucketed by
+# which targets disagree and on what, so that each likely bug only gets minimized a few times,
+# and minimized delta debugging style, in batches of candidate reductions that can run in parallel.
+#############################################################################################
+
+import itertools
+from dataclasses import fields
+from typing import Any, Generator, Hashable
+
+from config import (
+    ParseTree,
+    compare_parse_trees,
+    canonicalize_parse_tree,
+    TARGET_CONFIGS,
+    DETECT_OUTPUT_DIFFERENTIALS,
+    USE_CANONICAL_PARSE_TREES,
+    DELETION_LENGTHS,
+    DELETION_WINDOW,
+)
+
+from execution import ExecutionResult, run_targets, run_candidates
+
+
+def parse_tree_comparisons(result: ExecutionResult) -> list[tuple[bool, ...]]:
+    return list(itertools.starmap(compare_parse_trees, itertools.combinations(result.parse_trees, 2)))
+
+
+# The fields that disagreement signatures cover: whether there's a parse tree at all, and then ParseTree's fields
+SIGNATURE_FIELDS: tuple[str, ...] = ("parse_tree",) + tuple(f.name for f in fields(ParseTree))
+
+# Which targets' parse trees disagree, as (field name, agreement class of each target) for each field
+# on which they don't all agree. The classes are numbered in order of first appearance, so two results
+# have the same signature exactly when every pair of targets compares the same way in both.
+disagreement_signature_t = tuple[tuple[str, tuple[int, ...]], ...]
+
+# Stands in for every field of a missing parse tree, so that it can't be equal to any canonical key
+_NO_PARSE_TREE: object = object()
+
+
+def canonical_keys(parse_tree: ParseTree | None) -> tuple[Hashable, ...]:
+    """
+    Returns one key per field in SIGNATURE_FIELDS.
+    """
+    if parse_tree is None:
+        return (False,) + (_NO_PARSE_TREE,) * (len(SIGNATURE_FIELDS) - 1)
+    return (True,) + canonicalize_parse_tree(parse_tree)
+
+
+def disagreement_signature(parse_trees: tuple[ParseTree | None, ...]) -> disagreement_signature_t:
+    """
+    Sorts the targets into agreement classes on each field, in one pass over their canonical keys.
+    """
+    signature: list[tuple[str, tuple[int, ...]]] = []
+    for field_name, field_keys in zip(SIGNATURE_FIELDS, zip(*map(canonical_keys, parse_trees))):
+        class_numbers: dict[Hashable, int] = {}
+        classes: tuple[int, ...] = tuple(
+            class_numbers.setdefault(key, len(class_numbers)) for key in field_keys
+        )
+        if len(class_numbers) != 1:
+            signature.append((field_name, classes))
+    return tuple(signature)
+
+
+def parse_tree_signature(result: ExecutionResult) -> Hashable:
+    """
+    Summarizes how the targets' parse trees compare, such that two results have equal summaries
+    exactly when every pair of targets compares the same way in both.
+    """
+    if USE_CANONICAL_PARSE_TREES:
+        return disagreement_signature(result.parse_trees)
+    return tuple(parse_tree_comparisons(result))
+
+
+def parse_trees_disagree(result: ExecutionResult) -> bool:
+    if USE_CANONICAL_PARSE_TREES:
+        return len(set(map(canonical_keys, result.parse_trees))) > 1
+    return any(False in cmp_vector for cmp_vector in parse_tree_comparisons(result))
+
+
+def preserves_differential(orig_result: ExecutionResult, new_result: ExecutionResult) -> bool:
+    """
+    Whether new_result has the same statuses and parse tree comparisons as orig_result.
+    (Parse trees are only compared when the statuses all match)
+    """
+    needs_parse_tree_comparison: bool = len(set(orig_result.statuses)) == 1
+    return new_result.statuses == orig_result.statuses and (
+        not needs_parse_tree_comparison
+        or parse_tree_signature(new_result) == parse_tree_signature(orig_result)
+    )
+
+
+def restrict_result(result: ExecutionResult, target_indices: tuple[int, ...]) -> ExecutionResult:
+    """
+    Returns the part of result that came from the targets at target_indices.
+    """
+    return ExecutionResult(
+        tuple(result.fingerprint[i] for i in target_indices),
+        tuple(result.statuses[i] for i in target_indices),
+        tuple(result.parse_trees[i] for i in target_indices),
+    )
+
+
+def disagreeing_targets(result: ExecutionResult) -> tuple[int, ...]:
+    """
+    Returns the indices of the targets that take part in a differential:
+    every target that disagrees with the largest group of agreeing targets, plus one from that group.
+    Targets agree when they have the same status and, if the statuses all match, equivalent parse trees.
+    """
+    needs_parse_tree_comparison: bool = len(set(result.statuses)) == 1
+    groups: list[list[int]] = []
+    if USE_CANONICAL_PARSE_TREES:
+        # Targets agree exactly when their statuses and canonical keys match, so they can be grouped by those.
+        groups_by_key: dict[Hashable, list[int]] = {}
+        for i, (status, parse_tree) in enumerate(zip(result.statuses, result.parse_trees)):
+            key: Hashable = (status, canonical_keys(parse_tree)) if needs_parse_tree_comparison else status
+            groups_by_key.setdefault(key, []).append(i)
+        groups = list(groups_by_key.values())
+    else:
+        for i, (status, parse_tree) in enumerate(zip(result.statuses, result.parse_trees)):
+            for group in groups:
+                if result.statuses[group[0]] == status and (
+                    not needs_parse_tree_comparison
+                    or all(compare_parse_trees(result.parse_trees[group[0]], parse_tree))
+                ):
+                    group.append(i)
+                    break
+            else:
+                groups.append([i])
+    reference_group: list[int] = max(groups, key=len)
+    return tuple(
+        sorted([reference_group[0]] + [i for group in groups if group is not reference_group for i in group])
+    )
+
+
+def reduction_steps(
+    bug_inducing_input: bytes, orig_result: ExecutionResult, target_indices: tuple[int, ...]
+) -> Generator[tuple[list[bytes], tuple[int, ...]], list[ExecutionResult], bytes]:
+    """
+    Reduces a differential as far as the targets at target_indices can tell.
+    orig_result is the result of bug_inducing_input on those targets.
+    (See minimization_steps)
+    """
+    result: bytes = bug_inducing_input
+
+    # First, try removing big chunks of the input, halving the chunk size whenever none can be removed.
+    # Every chunk is tried at once, and the largest reduction that works is accepted.
+    num_chunks: int = 2
+    while num_chunks <= len(result):
+        bounds: list[int] = [len(result) * k // num_chunks for k in range(num_chunks + 1)]
+        candidates: list[bytes] = [result[:start] + result[end:] for start, end in zip(bounds, bounds[1:])]
+        new_results: list[ExecutionResult] = yield candidates, target_indices
+        reductions: list[bytes] = [
+            candidate
+            for candidate, new_result in zip(candidates, new_results)
+            if preserves_differential(orig_result, new_result)
+        ]
+        if len(reductions) != 0:
+            result = min(reductions, key=len)
+            num_chunks = max(num_chunks - 1, 2)
+        elif num_chunks == len(result):
+            break
+        else:
+            num_chunks = min(2 * num_chunks, len(result))
+
+    # Then, try the deletions that aren't aligned to a chunk, back to front.
+    # Each round tries the next DELETION_WINDOW positions at once, and accepts the first deletion that works,
+    # so that the window slides down from just below it, like one deletion at a time would.
+    for deletion_length in DELETION_LENGTHS:
+        i: int = len(result) - deletion_length
+        # (Deleting everything doesn't count)
+        while i >= 0 and len(result) > deletion_length:
+            positions: list[int] = list(range(i, max(i - DELETION_WINDOW, -1), -1))
+            candidates = [result[:j] + result[j + deletion_length :] for j in positions]
+            new_results = yield candidates, target_indices
+            i = positions[-1] - 1
+            for j, candidate, new_result in zip(positions, candidates, new_results):
+                if preserves_differential(orig_result, new_result):
+                    result = candidate
+                    i = j - deletion_length
+                    break
+
+    return result
+
+
+def minimization_steps(
+    bug_inducing_input: bytes, orig_result: ExecutionResult
+) -> Generator[tuple[list[bytes], tuple[int, ...]], list[ExecutionResult], bytes]:
+    """
+    Minimizes a differential, delta debugging style.
+    This yields batches of candidate reductions along with the indices of the targets to run them on,
+    and expects to be sent their results in the same order,
+    so that whoever is driving it can run each batch in parallel. Returns the minimized input.
+    The candidates are only run on the targets that take part in the differential,
+    so the minimized input is checked on all of the targets at the end.
+    If that check fails, minimization starts over with all of the targets.
+    """
+    all_targets: tuple[int, ...] = tuple(range(len(TARGET_CONFIGS)))
+    participants: tuple[int, ...] = disagreeing_targets(orig_result)
+    result: bytes = yield from reduction_steps(
+        bug_inducing_input, restrict_result(orig_result, participants), participants
+    )
+    if participants == all_targets or result == bug_inducing_input:
+        return result
+
+    final_results: list[ExecutionResult] = yield [result], all_targets
+    if preserves_differential(orig_result, final_results[0]):
+        return result
+    return (yield from reduction_steps(bug_inducing_input, orig_result, all_targets))
+
+
+def minimize_differential(bug_inducing_input: bytes) -> bytes:
+    """
+    Minimizes a differential in this process, one candidate at a time.
+    (main() instead spreads each batch of candidates across its workers)
+    """
+    steps: Generator[tuple[list[bytes], tuple[int, ...]], list[ExecutionResult], bytes] = minimization_steps(
+        bug_inducing_input, run_targets(bug_inducing_input)
+    )
+    try:
+        candidates, target_indices = next(steps)
+        while True:
+            candidates, target_indices = steps.send(run_candidates(candidates, target_indices))
+    except StopIteration as e:
+        return e.value
+
+
+def is_differential(result: ExecutionResult) -> bool:
+    status_set: set[int] = set(result.statuses)
+    return (len(status_set) != 1) or (
+        DETECT_OUTPUT_DIFFERENTIALS and status_set == {0} and parse_trees_disagree(result)
+    )
+
+
+# A differential's statuses, and its parse_tree_signature (or () if its statuses differ)
+differential_bucket_t = tuple[tuple[int, ...], Any]
+
+
+def differential_bucket(result: ExecutionResult) -> differential_bucket_t:
+    """
+    Summarizes a differential without minimizing it: its statuses and, if they all match,
+    how its parse trees disagree. Differentials with the same summary are usually the same bug.
+    """
+    return result.statuses, parse_tree_signature(result) if len(set(result.statuses)) == 1 else ()
+
+
+def describe_bucket(bucket: differential_bucket_t) -> str:
+    """
+    Spells out a differential_bucket, with target names.
+    """
+    statuses, signature = bucket
+    description: str = " ".join(f"{tc.name}={status}" for tc, status in zip(TARGET_CONFIGS, statuses))
+    if USE_CANONICAL_PARSE_TREES:
+        for field_name, classes in signature:
+            groups: dict[int, list[str]] = {}
+            for tc, class_number in zip(TARGET_CONFIGS, classes):
+                groups.setdefault(class_number, []).append(tc.name)
+            description += f"; {field_name}: " + " | ".join(",".join(group) for group in groups.values())
+    elif len(signature) != 0:
+        description += "; parse trees differ"
+    return description
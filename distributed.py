@@ -0,0 +1,319 @@
+#############################################################################################
+# distributed.py
+# Lets one fuzzing campaign span several machines.
+# The coordinator runs diff_fuzz.main as usual, and so owns the novelty state, the queue,
+# and the differentials, but it hands its tasks to remote workers instead of a local pool.
+# Each worker pulls as many tasks as it has processes, runs them on its own copies of the targets,
+# and sends back the results.
+# Messages are JSON objects, each preceded by its length as a 4-byte big-endian integer.
+#############################################################################################
+
+import array
+import base64
+import collections
+import dataclasses
+import functools
+import itertools
+import json
+import multiprocessing
+import socket
+import struct
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterator
+
+_LENGTH: struct.Struct = struct.Struct(">I")
+
+# A task that fails this many times, on whichever workers ran it, is given up on.
+MAX_TASK_ATTEMPTS: int = 3
+
+
+class RemoteError(Exception):
+    """
+    A task failed on a remote worker.
+    """
+
+
+class Codec:
+    """
+    Converts task arguments and results to and from JSON-friendly values.
+    Handles None, bools, ints, floats, strings, bytes, lists, tuples, frozensets of edges
+    (non-negative ints below 2**32), and instances of the dataclasses it's given.
+    Nothing else can be decoded, so a message can't make us construct arbitrary objects.
+    """
+
+    def __init__(self, dataclass_types: list[type]) -> None:
+        self.dataclass_types: dict[str, type] = {t.__name__: t for t in dataclass_types}
+
+    def encode(self, value: Any) -> Any:
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, bytes):
+            return {"b": base64.b64encode(value).decode("ascii")}
+        if isinstance(value, frozenset):
+            return {"f": base64.b64encode(array.array("I", sorted(value)).tobytes()).decode("ascii")}
+        if isinstance(value, tuple):
+            return {"t": [self.encode(v) for v in value]}
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        if dataclasses.is_dataclass(value) and type(value).__name__ in self.dataclass_types:
+            return {
+                "d": type(value).__name__,
+                "v": {f.name: self.encode(getattr(value, f.name)) for f in dataclasses.fields(value)},
+            }
+        raise TypeError(f"Can't encode a {type(value).__name__}")
+
+    def decode(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        if "b" in value:
+            return base64.b64decode(value["b"])
+        if "f" in value:
+            return frozenset(array.array("I", base64.b64decode(value["f"])))
+        if "t" in value:
+            return tuple(self.decode(v) for v in value["t"])
+        if "d" in value:
+            return self.dataclass_types[value["d"]](**{k: self.decode(v) for k, v in value["v"].items()})
+        raise ValueError(f"Can't decode {value!r}")
+
+
+def send_message(sock: socket.socket, message: dict[str, Any]) -> None:
+    payload: bytes = json.dumps(message).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(reader: BinaryIO) -> dict[str, Any] | None:
+    """
+    Returns the next message, or None if the connection has closed.
+    """
+    header: bytes = reader.read(_LENGTH.size)
+    if len(header) != _LENGTH.size:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    payload: bytes = reader.read(length)
+    if len(payload) != length:
+        return None
+    return json.loads(payload)
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """
+    Parses a HOST:PORT (or just PORT) address.
+    The host defaults to localhost, since the protocol has no authentication. Listening on every interface
+    takes asking for it, with 0.0.0.0:PORT.
+    """
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+@dataclass
+class _Task:
+    task_id: int
+    func_name: str
+    args: tuple
+    callback: Callable[[Any], None]
+    error_callback: Callable[[BaseException], None]
+    # The number of times this task has failed so far
+    failures: int = 0
+
+
+@dataclass
+class _RemoteWorker:
+    name: str
+    sock: socket.socket
+    slots: int
+    # The tasks sent to this worker that haven't come back yet, by task ID
+    outstanding: dict[int, _Task] = dataclasses.field(default_factory=dict)
+
+
+class RemotePool:
+    """
+    A stand-in for multiprocessing.Pool that runs tasks on the workers that connect to it.
+    Only apply_async is supported, and only for the functions the workers were given.
+    Workers have to say the same hello as the pool, so that they don't run different targets.
+    If a worker disconnects, its unfinished tasks go to the other workers.
+    A task that fails on a worker is retried, and only fails for good after MAX_TASK_ATTEMPTS tries.
+    """
+
+    def __init__(self, address: tuple[str, int], codec: Codec, hello: Any) -> None:
+        self.codec: Codec = codec
+        self.hello: Any = hello
+        self.lock: threading.Lock = threading.Lock()
+        self.pending: collections.deque[_Task] = collections.deque()
+        self.workers: list[_RemoteWorker] = []
+        self.task_ids: Iterator[int] = itertools.count()
+        self.listener: socket.socket = socket.create_server(address)
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+
+    def num_slots(self) -> int:
+        """
+        Returns the number of tasks the connected workers can run at once.
+        """
+        with self.lock:
+            return sum(worker.slots for worker in self.workers)
+
+    def apply_async(
+        self,
+        func: Callable,
+        args: tuple,
+        callback: Callable[[Any], None],
+        error_callback: Callable[[BaseException], None],
+    ) -> None:
+        with self.lock:
+            self.pending.append(_Task(next(self.task_ids), func.__name__, args, callback, error_callback))
+            self.dispatch()
+
+    def dispatch(self) -> None:
+        """
+        Hands out pending tasks to workers with free slots. (Must hold self.lock)
+        """
+        for worker in self.workers:
+            while len(self.pending) != 0 and len(worker.outstanding) < worker.slots:
+                task: _Task = self.pending.popleft()
+                worker.outstanding[task.task_id] = task
+                try:
+                    send_message(
+                        worker.sock,
+                        {"id": task.task_id, "func": task.func_name, "args": self.codec.encode(task.args)},
+                    )
+                except OSError:
+                    # The worker's thread will notice, and give its tasks to someone else.
+                    break
+
+    def accept_workers(self) -> None:
+        while True:
+            try:
+                sock, (host, port, *_) = self.listener.accept()
+            except OSError:
+                return  # We've been closed
+            threading.Thread(target=self.serve_worker, args=(sock, f"{host}:{port}"), daemon=True).start()
+
+    def serve_worker(self, sock: socket.socket, name: str) -> None:
+        reader: BinaryIO = sock.makefile("rb")
+        hello: dict[str, Any] | None = recv_message(reader)
+        if hello is None or hello.get("hello") != self.hello:
+            print(f"Turning away worker {name}, whose targets don't match ours.", file=sys.stderr)
+            try:
+                send_message(sock, {"error": "This worker's targets don't match the coordinator's."})
+            except OSError:
+                pass
+            sock.close()
+            return
+
+        worker: _RemoteWorker = _RemoteWorker(name, sock, int(hello["slots"]))
+        print(f"Worker {name} joined, with {worker.slots} processes.", file=sys.stderr)
+        with self.lock:
+            self.workers.append(worker)
+            self.dispatch()
+
+        try:
+            while (message := recv_message(reader)) is not None:
+                with self.lock:
+                    task: _Task = worker.outstanding.pop(message["id"])
+                    self.dispatch()
+                if "error" in message:
+                    self.retry(task, RemoteError(f"{name}: {message['error']}"))
+                    continue
+                try:
+                    result: Any = self.codec.decode(message["result"])
+                except (KeyError, TypeError, ValueError) as e:
+                    self.retry(task, RemoteError(f"{name} sent a result that can't be decoded: {e!r}"))
+                    continue
+                task.callback(result)
+        except OSError:
+            pass
+        finally:
+            print(f"Worker {name} left.", file=sys.stderr)
+            with self.lock:
+                self.workers.remove(worker)
+                self.pending.extendleft(reversed(worker.outstanding.values()))
+                self.dispatch()
+            sock.close()
+
+    def retry(self, task: _Task, exc: RemoteError) -> None:
+        """
+        Requeues a task that failed, unless it's failed too many times already, in which case it gets exc.
+        """
+        task.failures += 1
+        if task.failures >= MAX_TASK_ATTEMPTS:
+            task.error_callback(exc)
+            return
+        print(f"Retrying a task that failed: {exc}", file=sys.stderr)
+        with self.lock:
+            self.pending.appendleft(task)
+            self.dispatch()
+
+    def __enter__(self) -> "RemotePool":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.listener.close()
+        with self.lock:
+            for worker in self.workers:
+                # Closing alone wouldn't disconnect the worker while serve_worker is reading from the socket.
+                try:
+                    worker.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                worker.sock.close()
+
+
+@dataclass
+class WorkerPool:
+    """
+    How a worker sets up its local pool: the arguments to multiprocessing.Pool.
+    """
+
+    processes: int
+    initializer: Callable[..., None]
+    initargs: tuple
+
+
+def run_worker(
+    address: tuple[str, int], functions: list[Callable], codec: Codec, hello: Any, pool_config: WorkerPool
+) -> None:
+    """
+    Connects to a coordinator, and runs the tasks it hands out in a local pool until it goes away.
+    """
+    functions_by_name: dict[str, Callable] = {func.__name__: func for func in functions}
+    sock: socket.socket = socket.create_connection(address)
+    send_lock: threading.Lock = threading.Lock()
+
+    def reply(message: dict[str, Any]) -> None:
+        with send_lock:
+            send_message(sock, message)
+
+    def on_result(task_id: int, result: Any) -> None:
+        try:
+            reply({"id": task_id, "result": codec.encode(result)})
+        except TypeError as e:
+            on_error(task_id, e)
+
+    def on_error(task_id: int, exc: BaseException) -> None:
+        reply({"id": task_id, "error": repr(exc)})
+
+    reply({"hello": hello, "slots": pool_config.processes})
+    reader: BinaryIO = sock.makefile("rb")
+    with multiprocessing.Pool(
+        processes=pool_config.processes, initializer=pool_config.initializer, initargs=pool_config.initargs
+    ) as pool:
+        while True:
+            try:
+                message: dict[str, Any] | None = recv_message(reader)
+            except ConnectionError:
+                break  # The coordinator went away without saying goodbye
+            if message is None:
+                break
+            if "error" in message:
+                raise RemoteError(message["error"])
+            task_id: int = message["id"]
+            pool.apply_async(
+                functions_by_name[message["func"]],
+                codec.decode(message["args"]),
+                callback=functools.partial(on_result, task_id),
+                error_callback=functools.partial(on_error, task_id),
+            )
+    sock.close()
@@ -0,0 +1,611 @@
+#############################################################################################
+# execution.py
+# Runs the targets on inputs, and collects what they did: exit statuses, parse trees, and traces.
+# Forkserver targets stay resident in each process (see forkserver.py), afl-showmap targets are traced
+# a batch at a time, and the rest get a new process per input. Every target's runs are timed,
+# so that its timeout can be calibrated, and looked up in the result cache first, if there is one.
+#############################################################################################
+
+import base64
+import collections
+import functools
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import selectors
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+from multiprocessing.sharedctypes import Synchronized
+from pathlib import PosixPath
+from typing import Callable
+
+import numpy as np
+
+from config import (
+    ParseTree,
+    TargetConfig,
+    TIMEOUT_TIME,
+    TIMEOUT_CALIBRATION_RUNS,
+    TIMEOUT_MULTIPLIER,
+    MIN_TIMEOUT_TIME,
+    TARGET_CONFIGS,
+    DETECT_OUTPUT_DIFFERENTIALS,
+    DIFFERENTIATE_NONZERO_EXIT_STATUSES,
+    USE_FORKSERVER,
+    USE_OUTPUT_FEEDBACK,
+    PERSISTENT_ITERATIONS,
+    USE_RESULT_CACHE,
+    RESULT_CACHE_PATH,
+    RESULT_CACHE_MAX_BYTES,
+)
+
+from forkserver import Forkserver, ForkserverError, TIMEOUT_STATUS
+from fingerprint import fingerprint_t
+from feedback import output_shape_edges
+from result_cache import ResultCache, cached_run_t, target_digest
+
+
+# Everything we learn from running the targets on one input.
+@dataclass(frozen=True)
+class ExecutionResult:
+    # One set of edges per target (empty for untraced targets)
+    fingerprint: fingerprint_t
+    # One exit status per target
+    statuses: tuple[int, ...]
+    # One parse tree per target (None for targets that failed or weren't asked for output)
+    parse_trees: tuple[ParseTree | None, ...]
+    # Seconds spent running the targets on the input (next to nothing if the runs were cached)
+    exec_time: float = 0.0
+    # Seconds that each target took to run (None for runs that were cached)
+    run_times: tuple[float | None, ...] = ()
+    # The part of exec_time spent in afl-showmap
+    trace_time: float = 0.0
+
+
+def parse_tracer_outputs(tracer_outputs: list[np.ndarray]) -> list[frozenset[int]]:
+    """
+    Decodes a batch of binary afl-showmap outputs (raw coverage maps) into sets of edges.
+    The maps are decoded together, so the per-trace cost is just slicing out the result.
+    """
+    lengths: np.ndarray = np.fromiter(map(len, tracer_outputs), dtype=np.intp, count=len(tracer_outputs))
+    offsets: np.ndarray = np.cumsum(lengths) - lengths
+    hits: np.ndarray = np.flatnonzero(np.concatenate(tracer_outputs)) if len(tracer_outputs) != 0 else lengths
+    # Which trace each hit came from, and where each trace's hits start and end
+    trace_indices: np.ndarray = np.searchsorted(offsets, hits, side="right") - 1
+    edges: np.ndarray = hits - offsets[trace_indices]
+    bounds: list[int] = np.searchsorted(trace_indices, np.arange(len(tracer_outputs) + 1)).tolist()
+    return [frozenset(edges[start:end].tolist()) for start, end in zip(bounds, bounds[1:])]
+
+
+def parse_json_output(stdout: bytes) -> ParseTree:
+    """
+    Decodes a parse tree printed as a JSON object of base64-encoded fields.
+    """
+    return ParseTree(**{k: base64.b64decode(v) for k, v in json.loads(stdout).items()})
+
+
+# The fields of a parse tree, in order, and the length that comes before each of them in binary output
+_PARSE_TREE_FIELD_NAMES: tuple[str, ...] = tuple(field.name for field in fields(ParseTree))
+_FIELD_LENGTH: struct.Struct = struct.Struct("<I")
+
+
+def parse_binary_output(stdout: bytes) -> ParseTree:
+    """
+    Decodes a parse tree printed in the binary format. (See TargetConfig.binary_output)
+    Each field is sliced straight out of stdout, so the only copy is the one that makes it bytes.
+    """
+    view: memoryview = memoryview(stdout)
+    values: dict[str, bytes] = {}
+    offset: int = 0
+    for name in _PARSE_TREE_FIELD_NAMES:
+        if offset + _FIELD_LENGTH.size > len(view):
+            raise ValueError(f"Binary output is truncated: {stdout!r}")
+        (length,) = _FIELD_LENGTH.unpack_from(view, offset)
+        offset += _FIELD_LENGTH.size
+        if offset + length > len(view):
+            raise ValueError(f"Binary output is truncated: {stdout!r}")
+        values[name] = view[offset : offset + length].tobytes()
+        offset += length
+    if offset != len(view):
+        raise ValueError(f"Binary output has extra bytes: {stdout!r}")
+    return ParseTree(**values)
+
+
+# The output parser for each target
+OUTPUT_PARSERS: list[Callable[[bytes], ParseTree]] = [
+    parse_binary_output if tc.binary_output else parse_json_output for tc in TARGET_CONFIGS
+]
+
+# The environment variable that tells a target to print its parse tree in the binary format
+BINARY_OUTPUT_ENV_VAR: str = "DIFF_FUZZ_BINARY_OUTPUT"
+
+
+def target_env(tc: TargetConfig) -> dict[str, str]:
+    """
+    Returns the environment to run a target in: its configured one, plus BINARY_OUTPUT_ENV_VAR if it needs it.
+    """
+    return {**tc.env, BINARY_OUTPUT_ENV_VAR: "1"} if tc.binary_output else tc.env
+
+
+def make_command_line(
+    tc: TargetConfig,
+    input_dir: PosixPath | None,
+    output_dir: PosixPath | None,
+    timeout_ms: int = TIMEOUT_TIME,
+) -> list[str]:
+    """
+    Make the afl-showmap command line for this target config.
+    If input_dir and output_dir are None, then read from stdin and write to stdout.
+    """
+    command_line: list[str] = []
+    if tc.needs_tracing:
+        if tc.needs_python_afl:
+            command_line.append("py-afl-showmap")
+        else:
+            command_line.append("afl-showmap")
+            if tc.needs_qemu:  # Enable QEMU mode, if necessary
+                command_line.append("-Q")
+        command_line.append("-q")  # Don't care about traced program stdout
+        command_line.append("-e")  # Only care about edge coverage; ignore hit counts
+        command_line.append("-b")  # Write raw coverage maps, which are cheaper to decode than text
+        if input_dir is not None and output_dir is not None:
+            command_line += ["-i", str(input_dir.resolve()), "-o", str(output_dir.resolve())]
+        elif input_dir is None and output_dir is None:
+            command_line += ["-o", "/dev/stdout"]
+        else:
+            print("Either both or neither of input_dir, output_dir can be None.", file=sys.stderr)
+            sys.exit(1)
+
+        command_line += ["-t", str(timeout_ms)]
+        command_line.append("--")
+
+    command_line.append(str(tc.executable.resolve()))
+    command_line += tc.cli_args
+
+    return command_line
+
+
+def uses_forkserver(tc: TargetConfig) -> bool:
+    return USE_FORKSERVER and tc.needs_tracing and not tc.needs_qemu
+
+
+def uses_showmap(tc: TargetConfig) -> bool:
+    """
+    Whether this target has to be traced separately with afl-showmap,
+    because its forkserver runs can't give us its coverage.
+    """
+    return tc.needs_tracing and not uses_forkserver(tc)
+
+
+# The forkservers belonging to each process, keyed by pid and then by target name.
+# Pool workers each start their own, because forkservers can't be shared across processes.
+_forkservers: dict[int, dict[str, Forkserver]] = {}
+
+
+def close_forkservers() -> None:
+    """
+    Kills this process's forkservers, and their children.
+    """
+    for forkserver in _forkservers.pop(os.getpid(), {}).values():
+        forkserver.close()
+
+
+def get_forkserver(tc: TargetConfig) -> Forkserver:
+    if os.getpid() not in _forkservers:
+        # Either this is our first forkserver, or we were forked, and the forkservers here belong to our parent.
+        _forkservers.clear()
+        _forkservers[os.getpid()] = {}
+        # Otherwise they'd outlive us. (multiprocessing runs this on exit, in pool workers too)
+        multiprocessing.util.Finalize(None, close_forkservers, exitpriority=0)
+    forkservers: dict[str, Forkserver] = _forkservers[os.getpid()]
+    if tc.name not in forkservers:
+        forkservers[tc.name] = Forkserver(
+            [str(tc.executable.resolve())] + tc.cli_args,
+            target_env(tc),
+            TIMEOUT_TIME,
+            persistent_iterations=PERSISTENT_ITERATIONS if tc.persistent_mode else None,
+            shmem_fuzz=tc.persistent_mode and not tc.needs_python_afl,
+        )
+    return forkservers[tc.name]
+
+
+def start_forkserver_run(tc: TargetConfig, the_input: bytes) -> Forkserver:
+    forkserver: Forkserver = get_forkserver(tc)
+    try:
+        forkserver.start_run(the_input)
+    except ForkserverError:
+        forkserver.restart()
+        forkserver.start_run(the_input)
+    return forkserver
+
+
+def finish_forkserver_run(
+    forkserver: Forkserver, the_input: bytes, timeout: float
+) -> tuple[int, bytes, frozenset[int]]:
+    try:
+        return forkserver.finish_run(timeout)
+    except ForkserverError:
+        forkserver.restart()
+        return forkserver.run(the_input, timeout)
+
+
+@dataclass
+class WorkerState:
+    """
+    What init_worker sets up in a pool worker: where it keeps its temporary files,
+    and its connection to the result cache, if there is one.
+    Also what the worker has learned about how long each target's runs take.
+    """
+
+    work_dir: PosixPath = PosixPath("/tmp")
+    result_cache: ResultCache | None = None
+    # The durations of each target's runs so far, until there are enough to calibrate its timeout
+    calibration_runs: collections.defaultdict[int, list[float]] = field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+    # Each target's calibrated timeout, in seconds
+    calibrated_timeouts: dict[int, float] = field(default_factory=dict)
+
+
+# This process's WorkerState
+_worker: WorkerState = WorkerState()
+
+
+def target_timeout(target_index: int) -> float:
+    """
+    Returns how many seconds a run of a target gets before it's killed.
+    """
+    tc: TargetConfig = TARGET_CONFIGS[target_index]
+    if tc.timeout_ms is not None:
+        return tc.timeout_ms / 1000
+    return _worker.calibrated_timeouts.get(target_index, TIMEOUT_TIME / 1000)
+
+
+def record_run_duration(target_index: int, duration: float) -> None:
+    """
+    Counts a run that finished in time towards calibrating its target's timeout.
+    """
+    if target_index in _worker.calibrated_timeouts:
+        return
+    durations: list[float] = _worker.calibration_runs[target_index]
+    durations.append(duration)
+    if len(durations) == TIMEOUT_CALIBRATION_RUNS:
+        _worker.calibrated_timeouts[target_index] = min(
+            max(TIMEOUT_MULTIPLIER * max(durations), MIN_TIMEOUT_TIME / 1000), TIMEOUT_TIME / 1000
+        )
+
+
+def init_worker(
+    work_dir: PosixPath,
+    result_cache_path: PosixPath | None,
+    cache_hits: Synchronized,
+    cache_misses: Synchronized,
+) -> None:
+    """
+    Sets up a pool worker.
+    """
+    # Pools terminate their workers with SIGTERM. Exiting normally instead lets the worker close its forkservers.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    _worker.work_dir = work_dir
+    if result_cache_path is not None:
+        _worker.result_cache = ResultCache(
+            result_cache_path, RESULT_CACHE_MAX_BYTES, cache_hits, cache_misses
+        )
+
+
+@functools.cache
+def target_cache_digest(target_index: int) -> bytes:
+    """
+    Returns the digest that identifies a target in the result cache.
+    This covers everything about the target that changes its results, except for its environment.
+    """
+    tc: TargetConfig = TARGET_CONFIGS[target_index]
+    return target_digest(
+        tc.executable,
+        tc.name,
+        *tc.cli_args,
+        f"needs_tracing={tc.needs_tracing}",
+        f"needs_qemu={tc.needs_qemu}",
+        f"needs_python_afl={tc.needs_python_afl}",
+        f"forkserver={uses_forkserver(tc)}",
+        f"output={DETECT_OUTPUT_DIFFERENTIALS}",
+        f"binary_output={tc.binary_output}",
+    )
+
+
+def start_process_run(tc: TargetConfig, the_input: bytes) -> subprocess.Popen:
+    """
+    Starts a new process of a target that doesn't use a forkserver, and feeds it the_input.
+    """
+    proc: subprocess.Popen = subprocess.Popen(
+        [str(tc.executable.resolve())] + tc.cli_args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE if DETECT_OUTPUT_DIFFERENTIALS else subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=target_env(tc),
+        # So that a timed out target can be killed along with any processes it started
+        start_new_session=True,
+    )
+    assert proc.stdin is not None
+    proc.stdin.write(the_input)
+    proc.stdin.close()
+    return proc
+
+
+def finish_process_run(proc: subprocess.Popen) -> tuple[int, bytes | None]:
+    """
+    Returns the (exit_status, stdout) of a process run, first killing it if it's still going.
+    """
+    status: int
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        status = TIMEOUT_STATUS
+    else:
+        status = proc.returncode
+    return status, proc.stdout.read() if proc.stdout is not None else None
+
+
+# A started run: its target's index, the forkserver or process running it,
+# and when it started, by time.monotonic()
+started_run_t = tuple[int, Forkserver | subprocess.Popen, float]
+
+
+def wait_for_runs(
+    the_input: bytes, started_runs: dict[int, started_run_t]
+) -> dict[int, tuple[cached_run_t, float]]:
+    """
+    Waits for started_runs to finish (or time out), and returns each run, with how many seconds it took.
+    The runs are collected in the order they finish in, so that each run's time is its own,
+    rather than including the time spent waiting on the runs before it.
+    """
+    finished_runs: dict[int, tuple[cached_run_t, float]] = {}
+    # When each unfinished run times out, by time.monotonic()
+    deadlines: dict[int, float] = {n: start + target_timeout(i) for n, (i, _, start) in started_runs.items()}
+    # What we wait on for each run: a forkserver writes a run's status to its st_fd once it's done,
+    # and a pidfd becomes readable when its process exits.
+    wait_fds: dict[int, int] = {
+        n: runner.process.st_fd if isinstance(runner, Forkserver) else os.pidfd_open(runner.pid)
+        for n, (_, runner, _) in started_runs.items()
+    }
+    with selectors.DefaultSelector() as selector:
+        for n, fd in wait_fds.items():
+            selector.register(fd, selectors.EVENT_READ, n)
+        while len(deadlines) != 0:
+            ready: set[int] = {
+                key.data for key, _ in selector.select(max(min(deadlines.values()) - time.monotonic(), 0))
+            }
+            now: float = time.monotonic()
+            for n in ready | {n for n, deadline in deadlines.items() if deadline <= now}:
+                selector.unregister(wait_fds[n])
+                _, runner, start = started_runs[n]
+                if isinstance(runner, Forkserver):
+                    status, stdout, edges = finish_forkserver_run(
+                        runner, the_input, max(deadlines[n] - time.monotonic(), 0)
+                    )
+                    finished_runs[n] = (
+                        (status, stdout if DETECT_OUTPUT_DIFFERENTIALS else None, edges),
+                        runner.run_state.duration,
+                    )
+                else:
+                    os.close(wait_fds[n])
+                    finished_runs[n] = ((*finish_process_run(runner), frozenset()), now - start)
+                del deadlines[n]
+    return finished_runs
+
+
+def run_targets(the_input: bytes, target_indices: tuple[int, ...] | None = None) -> ExecutionResult:
+    """
+    This function needs a better name.
+    This runs the targets on an input, and returns the statuses, parse trees, and traces.
+    Only the forkserver targets are traced here; see run_batch for the others.
+    If target_indices is given, then only those targets are run, and the result only covers them.
+    Targets that already ran on this input are looked up in the result cache instead.
+    (Targets that use a forkserver fork once; the rest get a new process each)
+    """
+    if target_indices is None:
+        target_indices = tuple(range(len(TARGET_CONFIGS)))
+    start_time: float = time.perf_counter()
+
+    cache_keys: list[bytes] = []
+    cached_runs: dict[bytes, cached_run_t] = {}
+    result_cache: ResultCache | None = _worker.result_cache
+    if result_cache is not None:
+        cache_keys = [ResultCache.key(target_cache_digest(i), the_input) for i in target_indices]
+        cached_runs = result_cache.get(cache_keys)
+
+    # Start up any forkservers that aren't running yet before starting any runs,
+    # so that the runs that start first aren't charged for the time it takes.
+    for n, i in enumerate(target_indices):
+        if uses_forkserver(TARGET_CONFIGS[i]) and not (len(cache_keys) != 0 and cache_keys[n] in cached_runs):
+            get_forkserver(TARGET_CONFIGS[i])
+
+    started_runs: dict[int, started_run_t] = {}
+    for n, i in enumerate(target_indices):
+        tc: TargetConfig = TARGET_CONFIGS[i]
+        if len(cache_keys) != 0 and cache_keys[n] in cached_runs:
+            continue
+        if uses_forkserver(tc):
+            forkserver: Forkserver = start_forkserver_run(tc, the_input)
+            # The forkserver's own start time leaves out the time it took to start the forkserver up.
+            started_runs[n] = (i, forkserver, forkserver.run_state.start_time)
+        else:
+            started_runs[n] = (i, start_process_run(tc, the_input), time.monotonic())
+    finished_runs: dict[int, tuple[cached_run_t, float]] = wait_for_runs(the_input, started_runs)
+
+    runs: list[cached_run_t] = []
+    run_times: list[float | None] = []
+    new_runs: dict[bytes, cached_run_t] = {}
+    for n, i in enumerate(target_indices):
+        if n not in finished_runs:
+            runs.append(cached_runs[cache_keys[n]])
+            run_times.append(None)
+            continue
+        run, duration = finished_runs[n]
+        runs.append(run)
+        run_times.append(duration)
+        if run[0] != TIMEOUT_STATUS:
+            record_run_duration(i, duration)
+            # Timeouts depend on the machine's load, so they aren't cached.
+            if len(cache_keys) != 0:
+                new_runs[cache_keys[n]] = run
+
+    if result_cache is not None and len(new_runs) != 0:
+        result_cache.put(new_runs)
+
+    # Extract the exit statuses
+    statuses: tuple[int, ...] = tuple(status for status, _, _ in runs)
+    if not DIFFERENTIATE_NONZERO_EXIT_STATUSES:
+        # Timeouts still get their own status
+        statuses = tuple(map(lambda i: i if i == TIMEOUT_STATUS else int(bool(i)), statuses))
+
+    # Extract the parse trees
+    parse_trees: tuple[ParseTree | None, ...] = tuple(
+        OUTPUT_PARSERS[i](stdout) if stdout is not None and status == 0 else None
+        for i, (_, stdout, _), status in zip(target_indices, runs, statuses)
+    )
+
+    return ExecutionResult(
+        tuple(edges for _, _, edges in runs),
+        statuses,
+        parse_trees,
+        time.perf_counter() - start_time,
+        tuple(run_times),
+    )
+
+
+def trace_batch(work_dir: PosixPath, batch: list[bytes]) -> list[fingerprint_t]:
+    """
+    Runs the afl-showmap targets on the inputs in batch, and collects trace fingerprints.
+    Other targets get an empty trace.
+    (A call to this function makes one process for each afl-showmap target)
+    """
+    if not any(map(uses_showmap, TARGET_CONFIGS)):
+        return [tuple(frozenset() for _ in TARGET_CONFIGS) for _ in batch]
+
+    # Contains the data for this batch
+    batch_dir: PosixPath = work_dir.joinpath(f"batch-{str(uuid.uuid4())}")
+    os.mkdir(batch_dir)
+    # Contains the inputs in this batch
+    input_dir: PosixPath = batch_dir.joinpath("inputs")
+    os.mkdir(input_dir)
+
+    # Write each input in the batch to a file in tmpfs
+    for b in batch:
+        with open(input_dir.joinpath(str(hash(b))), "wb") as f:
+            f.write(b)
+
+    procs: list[subprocess.Popen | None] = []
+
+    # Run the batch through each configured target.
+    for i, tc in enumerate(TARGET_CONFIGS):
+        if uses_showmap(tc):
+            # Contains the traces for this target on this batch
+            trace_dir: PosixPath = batch_dir.joinpath(f"traces-{tc.name}")
+            command_line: list[str] = make_command_line(
+                tc, input_dir, trace_dir, int(target_timeout(i) * 1000)
+            )
+            proc: subprocess.Popen = subprocess.Popen(
+                command_line,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=target_env(tc),
+                cwd=str(work_dir.resolve()),  # because afl makes temp files
+            )
+            procs.append(proc)
+        else:
+            procs.append(None)
+
+    # Wait for the showmap processes to exit
+    for p in procs:
+        if p is not None:
+            p.wait()
+
+    # Extract the traces, one target at a time
+    traces_by_target: list[list[frozenset[int]]] = []
+    for tc in TARGET_CONFIGS:
+        if uses_showmap(tc):
+            trace_dir = batch_dir.joinpath(f"traces-{tc.name}")
+            traces_by_target.append(
+                parse_tracer_outputs(
+                    [np.fromfile(trace_dir.joinpath(str(hash(b))), dtype=np.uint8) for b in batch]
+                )
+            )
+        else:
+            traces_by_target.append([frozenset() for _ in batch])
+    fingerprints: list[fingerprint_t] = list(zip(*traces_by_target))
+
+    shutil.rmtree(batch_dir)
+    return fingerprints
+
+
+def run_batch(batch: list[bytes]) -> list[ExecutionResult]:
+    """
+    Runs the configured targets on the inputs in batch, and collects an ExecutionResult for each.
+    Forkserver targets are traced in the same run that gives us their statuses and parse trees,
+    so each input is run only once on them.
+    With USE_OUTPUT_FEEDBACK, untraced targets get pseudo-edges from their output instead. (See feedback.py)
+    """
+    start_time: float = time.perf_counter()
+    showmap_fingerprints: list[fingerprint_t] = trace_batch(_worker.work_dir, batch)
+    # The afl-showmap runs are charged evenly to the inputs in the batch.
+    showmap_time: float = (time.perf_counter() - start_time) / len(batch)
+    results: list[ExecutionResult] = []
+    for b, showmap_fingerprint in zip(batch, showmap_fingerprints):
+        result: ExecutionResult = run_targets(b)
+        fingerprint: fingerprint_t = tuple(
+            showmap_edges if uses_showmap(tc) else edges
+            for tc, edges, showmap_edges in zip(TARGET_CONFIGS, result.fingerprint, showmap_fingerprint)
+        )
+        if USE_OUTPUT_FEEDBACK:
+            fingerprint = tuple(
+                edges if tc.needs_tracing else output_shape_edges(status, parse_tree)
+                for tc, edges, status, parse_tree in zip(
+                    TARGET_CONFIGS, fingerprint, result.statuses, result.parse_trees
+                )
+            )
+        results.append(
+            ExecutionResult(
+                fingerprint,
+                result.statuses,
+                result.parse_trees,
+                showmap_time + result.exec_time,
+                result.run_times,
+                showmap_time,
+            )
+        )
+    return results
+
+
+def run_candidates(candidates: list[bytes], target_indices: tuple[int, ...]) -> list[ExecutionResult]:
+    """
+    Runs some of a minimization's candidate reductions on the targets at target_indices.
+    These aren't traced with afl-showmap, because minimization doesn't look at fingerprints.
+    """
+    return [run_targets(candidate, target_indices) for candidate in candidates]
+
+
+def make_worker_initargs(
+    work_dir: PosixPath, use_result_cache: bool = USE_RESULT_CACHE
+) -> tuple[PosixPath, PosixPath | None, Synchronized, Synchronized]:
+    """
+    Returns the arguments for init_worker, and makes the result cache if we're using one.
+    """
+    result_cache_path: PosixPath | None = None
+    cache_hits: Synchronized = multiprocessing.Value("Q", 0)
+    cache_misses: Synchronized = multiprocessing.Value("Q", 0)
+    if use_result_cache:
+        result_cache_path = (
+            RESULT_CACHE_PATH if RESULT_CACHE_PATH is not None else work_dir.joinpath("result_cache.sqlite")
+        )
+        # Make the database before the workers all try to at once
+        ResultCache(result_cache_path, RESULT_CACHE_MAX_BYTES, cache_hits, cache_misses).close()
+    return work_dir, result_cache_path, cache_hits, cache_misses
@@ -0,0 +1,63 @@
+#############################################################################################
+# feedback.py
+# Coverage-like feedback from what the targets print, rather than from their traces.
+# Each untraced target gets pseudo-edges for its exit status and for the shape of each field
+# of its parse tree (empty, or roughly how long), instead of the empty set of edges it'd otherwise have.
+# Across the targets, the status vector and the way each parse tree field splits the targets
+# into groups of byte-for-byte equal values are digested, so that a new pattern of disagreement
+# (or of near-disagreement that compare_parse_trees forgives) counts as novel.
+#############################################################################################
+
+import array
+import hashlib
+import struct
+from typing import Any
+
+from forkserver import TIMEOUT_STATUS
+
+# Each status's pseudo-edge is its low byte (like a shell's $?), and timeouts get the one after those.
+TIMEOUT_EDGE: int = 256
+# The pseudo-edge for having a parse tree at all
+PARSE_TREE_EDGE: int = TIMEOUT_EDGE + 1
+# Field shape pseudo-edges start here, with a run of MAX_LENGTH_CLASS + 1 for each field.
+FIELD_EDGES_START: int = 512
+MAX_LENGTH_CLASS: int = 15
+
+# Keeps output pattern digests from colliding with fingerprint digests, which live in the same set.
+_DIGEST_PERSON: bytes = b"diff_fuzz-output"
+
+
+def length_class(length: int) -> int:
+    """
+    Returns 0 for empty fields, and otherwise the number of bits in the length, up to MAX_LENGTH_CLASS.
+    """
+    return min(length.bit_length(), MAX_LENGTH_CLASS)
+
+
+def output_shape_edges(status: int, parse_tree: Any | None) -> frozenset[int]:
+    """
+    Returns the pseudo-edges for a target's status and parse tree (a ParseTree of bytes fields, or None).
+    """
+    edges: set[int] = {TIMEOUT_EDGE if status == TIMEOUT_STATUS else status & 0xFF}
+    if parse_tree is not None:
+        edges.add(PARSE_TREE_EDGE)
+        for field_index, value in enumerate(vars(parse_tree).values()):
+            edges.add(FIELD_EDGES_START + field_index * (MAX_LENGTH_CLASS + 1) + length_class(len(value)))
+    return frozenset(edges)
+
+
+def output_pattern_digest(statuses: tuple[int, ...], parse_trees: tuple[Any | None, ...]) -> bytes:
+    """
+    Returns a digest of the targets' statuses and, for each parse tree field, which targets have equal values.
+    (The values themselves are left out, so that only new ways of disagreeing are new patterns.)
+    """
+    h = hashlib.blake2b(digest_size=16, person=_DIGEST_PERSON)
+    h.update(struct.pack(f"{len(statuses)}q", *statuses))
+    num_fields: int = next((len(vars(t)) for t in parse_trees if t is not None), 0)
+    tree_values: list[tuple[bytes | None, ...]] = [
+        tuple(vars(t).values()) if t is not None else (None,) * num_fields for t in parse_trees
+    ]
+    for values in zip(*tree_values):
+        class_numbers: dict[bytes | None, int] = {}
+        h.update(array.array("I", [class_numbers.setdefault(value, len(class_numbers)) for value in values]))
+    return h.digest()
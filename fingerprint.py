@@ -0,0 +1,166 @@
+#############################################################################################
+# fingerprint.py
+# Compact storage for execution fingerprints.
+# A fingerprint is one set of edges per target, which can be tens of KB per input.
+# Instead of keeping those around forever, we keep a 128-bit digest of each one.
+#############################################################################################
+
+import array
+import hashlib
+import itertools
+import struct
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from forkserver import MAP_SIZE
+
+fingerprint_t = tuple[frozenset[int], ...]
+
+DIGEST_SIZE: int = 16
+
+# Marks an unused slot in a DigestSet's table.
+# A real digest collides with this with probability 2**-128, so we don't worry about it.
+EMPTY_DIGEST: bytes = bytes(DIGEST_SIZE)
+
+
+def fingerprint_digest(fingerprint: fingerprint_t) -> bytes:
+    """
+    Returns a digest of the fingerprint that is stable across processes and runs
+    (unlike hash(), which is salted per process).
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for edges in fingerprint:
+        # The length prefix keeps the per-target edge arrays from running into each other.
+        h.update(struct.pack("I", len(edges)))
+        h.update(array.array("I", sorted(edges)).tobytes())
+    return h.digest()
+
+
+class DigestSet:
+    """
+    A set of digests, stored in one open-addressing table with linear probing.
+    Each entry costs DIGEST_SIZE bytes of table space, instead of a whole Python object.
+    """
+
+    def __init__(self, capacity: int = 1 << 10) -> None:
+        assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be a power of 2"
+        self.capacity: int = capacity
+        self.size: int = 0
+        self.table: bytearray = bytearray(capacity * DIGEST_SIZE)
+
+    def find_slot(self, digest: bytes) -> tuple[int, bool]:
+        """
+        Returns the slot where digest is, or where it would go, and whether it's there.
+        """
+        mask: int = self.capacity - 1
+        slot: int = int.from_bytes(digest[:8], "little") & mask
+        while True:
+            entry: bytes = bytes(self.table[slot * DIGEST_SIZE : (slot + 1) * DIGEST_SIZE])
+            if entry == digest:
+                return slot, True
+            if entry == EMPTY_DIGEST:
+                return slot, False
+            slot = (slot + 1) & mask
+
+    def __contains__(self, digest: bytes) -> bool:
+        return self.find_slot(digest)[1]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, digest: bytes) -> None:
+        assert len(digest) == DIGEST_SIZE
+        slot, found = self.find_slot(digest)
+        if found:
+            return
+        self.table[slot * DIGEST_SIZE : (slot + 1) * DIGEST_SIZE] = digest
+        self.size += 1
+        # Keep the table at most half full, so that probe sequences stay short.
+        if 2 * self.size > self.capacity:
+            self.grow()
+
+    def update(self, digests: Iterable[bytes]) -> None:
+        for digest in digests:
+            self.add(digest)
+
+    def grow(self) -> None:
+        old_table: bytearray = self.table
+        self.capacity *= 2
+        self.size = 0
+        self.table = bytearray(self.capacity * DIGEST_SIZE)
+        for i in range(0, len(old_table), DIGEST_SIZE):
+            entry: bytes = bytes(old_table[i : i + DIGEST_SIZE])
+            if entry != EMPTY_DIGEST:
+                self.add(entry)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for i in range(0, len(self.table), DIGEST_SIZE):
+            entry: bytes = bytes(self.table[i : i + DIGEST_SIZE])
+            if entry != EMPTY_DIGEST:
+                yield entry
+
+
+def map_size_for(edge: int) -> int:
+    """
+    Returns the smallest power of two coverage map size that has room for edge.
+    """
+    return 1 << edge.bit_length()
+
+
+class VirginBitmaps:
+    """
+    One bitmap per target of the edges that no input has hit yet, as in afl-fuzz.
+    An input is novel if it hits any edge that no earlier input hit, on any target.
+    Each bitmap starts out map_size edges long, and grows if its target turns out to have a bigger map.
+    """
+
+    def __init__(self, num_targets: int, map_size: int = MAP_SIZE) -> None:
+        self.virgin: list[np.ndarray] = [np.ones(map_size, dtype=np.bool_) for _ in range(num_targets)]
+
+    def update(self, fingerprints: list[fingerprint_t]) -> np.ndarray:
+        """
+        Checks a batch of fingerprints for new edges, and marks all of their edges as seen.
+        Returns whether each fingerprint is novel. Within the batch, only the first
+        fingerprint to hit a new edge gets credit for it.
+        """
+        novel: np.ndarray = np.zeros(len(fingerprints), dtype=np.bool_)
+        for target_index, virgin in enumerate(self.virgin):
+            # Lay out this target's edges for the whole batch as (row, edge) pairs.
+            edge_sets: list[frozenset[int]] = [fingerprint[target_index] for fingerprint in fingerprints]
+            lengths: np.ndarray = np.fromiter(map(len, edge_sets), dtype=np.intp, count=len(edge_sets))
+            rows: np.ndarray = np.repeat(np.arange(len(edge_sets)), lengths)
+            edges: np.ndarray = np.fromiter(
+                itertools.chain.from_iterable(edge_sets), dtype=np.intp, count=int(lengths.sum())
+            )
+            if len(edges) != 0 and edges.max() >= len(virgin):
+                virgin = np.concatenate(
+                    [virgin, np.ones(map_size_for(int(edges.max())) - len(virgin), np.bool_)]
+                )
+                self.virgin[target_index] = virgin
+
+            is_new: np.ndarray = virgin[edges]
+            # The rows are in order, so the first occurrence of each new edge is its earliest hit.
+            _, first_hits = np.unique(edges[is_new], return_index=True)
+            novel[rows[is_new][first_hits]] = True
+            virgin[edges] = False
+        return novel
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the bitmaps' sizes, and then their bits.
+        """
+        return (
+            array.array("I", map(len, self.virgin)).tobytes()
+            + np.packbits(np.concatenate(self.virgin)).tobytes()
+        )
+
+    def load_bytes(self, packed: bytes) -> None:
+        """
+        Restores the bitmaps from the output of to_bytes.
+        """
+        sizes: list[int] = array.array("I", packed[: 4 * len(self.virgin)]).tolist()
+        bits: np.ndarray = np.unpackbits(
+            np.frombuffer(packed[4 * len(self.virgin) :], dtype=np.uint8), count=sum(sizes)
+        )
+        self.virgin = [bitmap.astype(np.bool_) for bitmap in np.split(bits, np.cumsum(sizes)[:-1])]
@@ -0,0 +1,355 @@
+#############################################################################################
+# forkserver.py
+# A minimal client for the AFL++ forkserver protocol.
+# Each Forkserver keeps one instrumented target resident, and runs inputs in it
+#   by asking the target to fork, instead of spawning a fresh process per input.
+# Coverage comes back through a SysV shared memory map, just like in afl-fuzz.
+#############################################################################################
+
+import ctypes
+import fcntl
+import os
+import select
+import signal
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+# These must match the values in AFL++'s config.h and python-afl.
+FORKSRV_FD: int = 198
+SHM_ENV_VAR: str = "__AFL_SHM_ID"
+SHM_FUZZ_ENV_VAR: str = "__AFL_SHM_FUZZ_ID"
+PERSIST_ENV_VAR: str = "__AFL_PERSISTENT"
+PYTHON_PERSIST_ENV_VAR: str = "PYTHON_AFL_PERSISTENT"
+# The default size of the coverage map. Targets that need a bigger one say so in the handshake.
+MAP_SIZE: int = 1 << 16
+MAX_FILE: int = 1 << 20
+
+# The status we give a run that was killed for going over its timeout.
+# No process can exit with this status. (Exit codes are 0-255, and deaths by signal are negative)
+TIMEOUT_STATUS: int = 1 << 16
+
+# Our harnesses read this to decide how many inputs to run before restarting.
+PERSISTENT_ITERATIONS_ENV_VAR: str = "DIFF_FUZZ_PERSISTENT_ITERATIONS"
+
+# Handshake option bits from AFL++'s types.h
+FS_OPT_ENABLED: int = 0x80000001
+FS_OPT_MAPSIZE: int = 0x40000000
+FS_OPT_SHDMEM_FUZZ: int = 0x01000000
+FS_OPT_AUTODICT: int = 0x10000000
+FS_NEW_VERSION_MIN: int = 1
+FS_NEW_VERSION_MAX: int = 1
+FS_NEW_OPT_MAPSIZE: int = 0x00000001
+FS_NEW_OPT_SHDMEM_FUZZ: int = 0x00000002
+FS_NEW_OPT_AUTODICT: int = 0x00000800
+
+IPC_PRIVATE: int = 0
+IPC_CREAT: int = 0o1000
+IPC_EXCL: int = 0o2000
+IPC_RMID: int = 0
+
+_libc: ctypes.CDLL = ctypes.CDLL(None, use_errno=True)
+_libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+_libc.shmget.restype = ctypes.c_int
+_libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+_libc.shmat.restype = ctypes.c_void_p
+_libc.shmdt.argtypes = [ctypes.c_void_p]
+_libc.shmdt.restype = ctypes.c_int
+_libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+_libc.shmctl.restype = ctypes.c_int
+
+
+class ForkserverError(Exception):
+    pass
+
+
+class SharedMemory:
+    """
+    A SysV shared memory segment, attached to this process.
+    The segment is marked for removal as soon as it's attached, so it can't outlive us.
+    (Linux allows new attachments to a segment that's marked for removal, which is what
+     lets the target attach to it by ID later.)
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self.shm_id: int = _libc.shmget(IPC_PRIVATE, size, IPC_CREAT | IPC_EXCL | 0o600)
+        if self.shm_id < 0:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        addr: int | None = _libc.shmat(self.shm_id, None, 0)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        self.addr: int = addr
+        _libc.shmctl(self.shm_id, IPC_RMID, None)
+        # A view of the segment, without copying it
+        self.array: np.ndarray = np.ctypeslib.as_array((ctypes.c_ubyte * size).from_address(self.addr))
+
+    def clear(self) -> None:
+        ctypes.memset(self.addr, 0, self.size)
+
+    def read(self) -> bytes:
+        return ctypes.string_at(self.addr, self.size)
+
+    def write(self, offset: int, data: bytes) -> None:
+        assert offset + len(data) <= self.size
+        ctypes.memmove(self.addr + offset, data, len(data))
+
+    def close(self) -> None:
+        _libc.shmdt(ctypes.c_void_p(self.addr))
+
+
+def edges_from_bitmap(bitmap: np.ndarray) -> frozenset[int]:
+    """
+    Converts a raw coverage map into the set of edges that were hit.
+    (This matches the output of `afl-showmap -e`)
+    """
+    return frozenset(np.flatnonzero(bitmap).tolist())
+
+
+def status_from_wait_status(wait_status: int) -> int:
+    """
+    Converts a waitpid status into a subprocess-style return code.
+    A persistent-mode target that stopped itself has finished its input successfully.
+    """
+    if os.WIFSTOPPED(wait_status):
+        return 0
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.waitstatus_to_exitcode(wait_status)
+
+
+@dataclass
+class ForkserverProcess:
+    """
+    A running forkserver: its pid, our ends of its control and status pipes, the files that are its stdin
+    and stdout, and whether it agreed to take testcases from shared memory. (A stopped one has no pid or fds)
+    """
+
+    pid: int | None = None
+    ctl_fd: int = -1
+    st_fd: int = -1
+    stdin_fd: int = -1
+    stdout_fd: int = -1
+    shmem_fuzz: bool = False
+
+
+@dataclass
+class RunState:
+    """
+    The current run's child, when it started, by time.monotonic(), how many seconds the last run took,
+    and whether the last run timed out.
+    (The times leave out starting the forkserver, so a run's time is only the target's own)
+    """
+
+    child_pid: int | None = None
+    start_time: float = 0.0
+    duration: float = 0.0
+    timed_out: bool = False
+
+
+class Forkserver:
+    """
+    One resident forkserver for one target.
+    Inputs are fed through a file that is the target's stdin (or through shared memory,
+    for targets that support it), and the target's stdout is collected through another file.
+
+    If persistent_iterations is set, the target is run in persistent mode,
+    where one child runs up to that many inputs before the forkserver forks a new one.
+    """
+
+    def __init__(
+        self,
+        command_line: list[str],
+        env: dict[str, str],
+        timeout_ms: int,
+        persistent_iterations: int | None = None,
+        shmem_fuzz: bool = False,
+    ) -> None:
+        self.command_line: list[str] = command_line
+        self.timeout: float = timeout_ms / 1000
+        self.trace_bits: SharedMemory = SharedMemory(MAP_SIZE)
+        # Testcases go here when the target agrees to take them from shared memory.
+        # The layout is a u32 length, followed by the testcase.
+        self.testcase_shm: SharedMemory | None = SharedMemory(4 + MAX_FILE) if shmem_fuzz else None
+        # The target's environment, apart from the coverage map's, which can be replaced (see start)
+        self.env: dict[str, str] = dict(env)
+        if persistent_iterations is not None:
+            self.env[PERSIST_ENV_VAR] = "1"
+            self.env[PYTHON_PERSIST_ENV_VAR] = "1"
+            self.env[PERSISTENT_ITERATIONS_ENV_VAR] = str(persistent_iterations)
+        if self.testcase_shm is not None:
+            self.env[SHM_FUZZ_ENV_VAR] = str(self.testcase_shm.shm_id)
+        self.process: ForkserverProcess = ForkserverProcess()
+        self.run_state: RunState = RunState()
+        self.start()
+
+    def start(self) -> None:
+        stdin_fd, stdin_path = tempfile.mkstemp(prefix="diff_fuzz-stdin-")
+        stdout_fd, stdout_path = tempfile.mkstemp(prefix="diff_fuzz-stdout-")
+        os.unlink(stdin_path)
+        os.unlink(stdout_path)
+
+        ctl_read, ctl_write = os.pipe()
+        st_read, st_write = os.pipe()
+        # The target's ends of the pipes are moved above the forkserver fds,
+        # so that putting one of them in place can't clobber the other.
+        target_ctl_fd: int = fcntl.fcntl(ctl_read, fcntl.F_DUPFD_CLOEXEC, FORKSRV_FD + 2)
+        target_st_fd: int = fcntl.fcntl(st_write, fcntl.F_DUPFD_CLOEXEC, FORKSRV_FD + 2)
+        os.close(ctl_read)
+        os.close(st_write)
+
+        env: dict[str, str] = dict(self.env)
+        env[SHM_ENV_VAR] = str(self.trace_bits.shm_id)
+        env["AFL_MAP_SIZE"] = str(self.trace_bits.size)
+
+        # posix_spawn sets up the target's fds without running any Python in the child,
+        # which (unlike subprocess's preexec_fn) is safe in a process with threads.
+        # Every other fd we own is non-inheritable, so nothing else leaks into the target.
+        # The forkserver leads its own process group, which its children join, so that stop() can kill
+        # a persistent-mode child that's stopped between inputs along with it.
+        pid: int = os.posix_spawnp(
+            self.command_line[0],
+            self.command_line,
+            env,
+            file_actions=[
+                (os.POSIX_SPAWN_DUP2, stdin_fd, 0),
+                (os.POSIX_SPAWN_DUP2, stdout_fd, 1),
+                (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+                (os.POSIX_SPAWN_DUP2, target_ctl_fd, FORKSRV_FD),
+                (os.POSIX_SPAWN_DUP2, target_st_fd, FORKSRV_FD + 1),
+            ],
+            setpgroup=0,
+        )
+        os.close(target_ctl_fd)
+        os.close(target_st_fd)
+        self.process = ForkserverProcess(pid, ctl_write, st_read, stdin_fd, stdout_fd)
+
+        map_size: int | None = self.handshake()
+        if map_size is not None and map_size > self.trace_bits.size:
+            # Like afl-fuzz, start over with a coverage map as big as the target needs.
+            self.stop()
+            self.trace_bits.close()
+            self.trace_bits = SharedMemory(map_size)
+            self.start()
+
+    def handshake(self) -> int | None:
+        """
+        Says hello to a newly started forkserver, and returns the size of the coverage map it needs, if it says.
+        """
+        map_size: int | None = None
+        hello: int = self.read_u32(self.timeout)
+        if 0x41464C00 + FS_NEW_VERSION_MIN <= hello <= 0x41464C00 + FS_NEW_VERSION_MAX:
+            # AFL++ >= 4.21 handshake
+            version: int = hello - 0x41464C00
+            self.write_u32(version ^ 0xFFFFFFFF)
+            options: int = self.read_u32(self.timeout)
+            # In this version, the target maps the testcase memory by itself.
+            self.process.shmem_fuzz = self.testcase_shm is not None and bool(options & FS_NEW_OPT_SHDMEM_FUZZ)
+            if options & FS_NEW_OPT_MAPSIZE:
+                map_size = self.read_u32(self.timeout)
+            if options & FS_NEW_OPT_AUTODICT:
+                self.read_exactly(self.read_u32(self.timeout), self.timeout)
+            if self.read_u32(self.timeout) != version:
+                raise ForkserverError(f"Forkserver handshake failed for {self.command_line[0]}")
+        elif hello & FS_OPT_ENABLED == FS_OPT_ENABLED:
+            # Older AFL++ handshake
+            if hello & FS_OPT_MAPSIZE == FS_OPT_MAPSIZE:
+                map_size = ((hello & 0x00FFFFFE) >> 1) + 1
+            if hello & (FS_OPT_SHDMEM_FUZZ | FS_OPT_AUTODICT):
+                # The target wants to know which of its offered options we accept.
+                # We take shared memory testcases if we can, and never take the dictionary.
+                self.process.shmem_fuzz = self.testcase_shm is not None and bool(hello & FS_OPT_SHDMEM_FUZZ)
+                self.write_u32(FS_OPT_ENABLED | (FS_OPT_SHDMEM_FUZZ if self.process.shmem_fuzz else 0))
+        # Otherwise, it's the classic AFL handshake (as used by python-afl), which needs nothing more.
+        return map_size
+
+    def read_exactly(self, n: int, timeout: float | None) -> bytes:
+        result: bytes = b""
+        while len(result) < n:
+            if timeout is not None and len(select.select([self.process.st_fd], [], [], timeout)[0]) == 0:
+                raise TimeoutError
+            chunk: bytes = os.read(self.process.st_fd, n - len(result))
+            if chunk == b"":
+                raise ForkserverError(f"Forkserver for {self.command_line[0]} died.")
+            result += chunk
+        return result
+
+    def read_u32(self, timeout: float | None) -> int:
+        return struct.unpack("I", self.read_exactly(4, timeout))[0]
+
+    def write_u32(self, value: int) -> None:
+        os.write(self.process.ctl_fd, struct.pack("I", value))
+
+    def start_run(self, the_input: bytes) -> None:
+        """
+        Starts running the target on the_input, without waiting for it to finish.
+        """
+        self.trace_bits.clear()
+
+        # The target shares these file descriptions, so resetting their offsets here resets them there.
+        if self.process.shmem_fuzz:
+            assert self.testcase_shm is not None
+            testcase: bytes = the_input[:MAX_FILE]
+            self.testcase_shm.write(0, struct.pack("I", len(testcase)) + testcase)
+        else:
+            os.ftruncate(self.process.stdin_fd, 0)
+            os.pwrite(self.process.stdin_fd, the_input, 0)
+            os.lseek(self.process.stdin_fd, 0, os.SEEK_SET)
+        os.ftruncate(self.process.stdout_fd, 0)
+        os.lseek(self.process.stdout_fd, 0, os.SEEK_SET)
+
+        self.run_state.start_time = time.monotonic()
+        self.write_u32(int(self.run_state.timed_out))
+        self.run_state.child_pid = self.read_u32(self.timeout)
+
+    def finish_run(self, timeout: float | None = None) -> tuple[int, bytes, frozenset[int]]:
+        """
+        Waits for the current run to finish, and returns its (exit_status, stdout, edges).
+        If the run takes more than timeout seconds (by default, the forkserver's timeout),
+        it's killed, and its exit status is TIMEOUT_STATUS.
+        """
+        run_state: RunState = self.run_state
+        assert run_state.child_pid is not None
+        run_state.timed_out = False
+        status: int
+        try:
+            status = status_from_wait_status(self.read_u32(timeout if timeout is not None else self.timeout))
+        except TimeoutError:
+            run_state.timed_out = True
+            os.kill(run_state.child_pid, signal.SIGKILL)
+            self.read_u32(None)
+            status = TIMEOUT_STATUS
+        run_state.duration = time.monotonic() - run_state.start_time
+        run_state.child_pid = None
+
+        stdout_fd: int = self.process.stdout_fd
+        stdout: bytes = os.pread(stdout_fd, os.fstat(stdout_fd).st_size, 0)
+        return status, stdout, edges_from_bitmap(self.trace_bits.array)
+
+    def run(self, the_input: bytes, timeout: float | None = None) -> tuple[int, bytes, frozenset[int]]:
+        self.start_run(the_input)
+        return self.finish_run(timeout)
+
+    def stop(self) -> None:
+        process: ForkserverProcess = self.process
+        for fd in (process.ctl_fd, process.st_fd, process.stdin_fd, process.stdout_fd):
+            if fd != -1:
+                os.close(fd)
+        if process.pid is not None:
+            os.killpg(process.pid, signal.SIGKILL)
+            os.waitpid(process.pid, 0)
+        self.process = ForkserverProcess()
+
+    def restart(self) -> None:
+        self.stop()
+        self.run_state.timed_out = False
+        self.start()
+
+    def close(self) -> None:
+        self.stop()
+        self.trace_bits.close()
+        if self.testcase_shm is not None:
+            self.testcase_shm.close()
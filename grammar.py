@@ -20,6 +20,7 @@ from re._parser import (  # type: ignore
     ANY,
 )
 from re._constants import _NamedIntConstant as RegexConstant  # type: ignore
+import functools
 import random
 from typing import Dict, FrozenSet, Any, Iterable, Set
 
@@ -210,52 +211,124 @@ def negate_charset(charset: Iterable[int]) -> FrozenSet[int]:
     return ALL_CHARSET - set(charset)
 
 
-def helper(parse_tree: SubPattern) -> bytes:
-    result: bytes = b""
-    if len(parse_tree) == 0:
-        return result
-    curr = parse_tree[0]
-    node_type: RegexConstant = curr[0]
-    node_value: Any = curr[1]
-    if node_type == LITERAL:
-        code_point: int = node_value
-        result = bytes([code_point])
-    elif node_type == NOT_LITERAL:
-        forbidden_code_point: int = node_value
-        result = helper([(IN, [(LITERAL, b) for b in negate_charset([forbidden_code_point])])])
-    elif node_type == MAX_REPEAT:
-        min_reps: int = node_value[0]
-        subpattern: SubPattern = node_value[2]
-        for _ in range(min_reps):
-            result += helper(subpattern)
-    elif node_type == SUBPATTERN:
-        result = helper(node_value[3])
-    elif node_type == IN:
-        # This needs to handle literal, range, and category
-        # It also needs to handle negations for all of those
-        need_to_negate: bool = False
-        charset: Set[int] = set()
-        for subpattern in node_value:
-            if subpattern[0] == NEGATE:
-                need_to_negate = not need_to_negate
-            elif subpattern[0] == LITERAL:
-                charset |= set([subpattern[1]])
-            elif subpattern[0] == RANGE:
-                charset |= set(range(subpattern[1][0], subpattern[1][1] + 1))
-            elif subpattern[0] == CATEGORY:
-                charset |= category_to_charset(subpattern[1])
+# A compiled pattern is a program: a tuple of instructions, run in order.
+# Each instruction is a tuple whose first element is one of these opcodes.
+# (EMIT, b)                      appends the bytes b
+# (CHOOSE_BYTE, table)           appends a random byte from the bytes table
+# (CHOOSE_PROGRAM, programs)     runs a random one of the programs
+# (REPEAT, min, max, program)    runs the program between min and max times
+EMIT: int = 0
+CHOOSE_BYTE: int = 1
+CHOOSE_PROGRAM: int = 2
+REPEAT: int = 3
+
+program_t = tuple[tuple[Any, ...], ...]
+
+
+def compile_charset(node_value: Any) -> bytes:
+    """
+    Turns the contents of an IN node into a table of the bytes it matches.
+    """
+    # This needs to handle literal, range, and category
+    # It also needs to handle negations for all of those
+    need_to_negate: bool = False
+    charset: Set[int] = set()
+    for subpattern in node_value:
+        if subpattern[0] == NEGATE:
+            need_to_negate = not need_to_negate
+        elif subpattern[0] == LITERAL:
+            charset |= set([subpattern[1]])
+        elif subpattern[0] == RANGE:
+            charset |= set(range(subpattern[1][0], subpattern[1][1] + 1))
+        elif subpattern[0] == CATEGORY:
+            charset |= category_to_charset(subpattern[1])
+        else:
+            raise NotImplementedError(f"I don't know how to generate examples of {subpattern[0]}")
+    return bytes(sorted(negate_charset(charset) if need_to_negate else charset))
+
+
+def compile_parse_tree(parse_tree: SubPattern, max_extra_repeats: int) -> program_t:
+    program: list[tuple[Any, ...]] = []
+    for node_type, node_value in parse_tree:
+        if node_type == LITERAL:
+            # Runs of literals become one EMIT
+            if len(program) != 0 and program[-1][0] == EMIT:
+                program[-1] = (EMIT, program[-1][1] + bytes([node_value]))
             else:
-                raise NotImplementedError(f"I don't know how to generate examples of {subpattern[0]}")
-        result = bytes([random.choice(list(negate_charset(charset) if need_to_negate else charset))])
-    elif node_type == BRANCH:
-        result = helper(random.choice(node_value[1]))
-    elif node_type == ANY:
-        result = helper([(IN, [(LITERAL, b) for b in ALL_CHARSET])])
-    else:
-        raise NotImplementedError(f"I don't know how to generate examples of {node_type}")
+                program.append((EMIT, bytes([node_value])))
+        elif node_type == NOT_LITERAL:
+            program.append((CHOOSE_BYTE, bytes(sorted(negate_charset([node_value])))))
+        elif node_type == MAX_REPEAT:
+            min_reps, max_reps, subpattern = node_value
+            max_reps = min(max_reps, min_reps + max_extra_repeats)
+            program.append((REPEAT, min_reps, max_reps, compile_parse_tree(subpattern, max_extra_repeats)))
+        elif node_type == SUBPATTERN:
+            program.extend(compile_parse_tree(node_value[3], max_extra_repeats))
+        elif node_type == IN:
+            program.append((CHOOSE_BYTE, compile_charset(node_value)))
+        elif node_type == BRANCH:
+            program.append(
+                (
+                    CHOOSE_PROGRAM,
+                    tuple(compile_parse_tree(branch, max_extra_repeats) for branch in node_value[1]),
+                )
+            )
+        elif node_type == ANY:
+            program.append((CHOOSE_BYTE, bytes(range(256))))
+        else:
+            raise NotImplementedError(f"I don't know how to generate examples of {node_type}")
+    return tuple(program)
+
+
+class CompiledPattern:
+    """
+    A regex, compiled into a program that generates random matching inputs.
+    Unbounded repeats (*, +, {n,}) run their minimum number of times, plus up to max_extra_repeats more.
+    """
+
+    def __init__(self, pattern: bytes | str, max_extra_repeats: int = 0) -> None:
+        self.program: program_t = compile_parse_tree(re_parse(pattern), max_extra_repeats)
+
+    def generate(self) -> bytes:
+        result: bytearray = bytearray()
+        # The programs still to run, each with the index of its next instruction
+        stack: list[tuple[program_t, int]] = [(self.program, 0)]
+        while len(stack) != 0:
+            program, i = stack.pop()
+            if i == len(program):
+                continue
+            stack.append((program, i + 1))
+            instruction: tuple[Any, ...] = program[i]
+            opcode: int = instruction[0]
+            if opcode == EMIT:
+                result += instruction[1]
+            elif opcode == CHOOSE_BYTE:
+                table: bytes = instruction[1]
+                result.append(table[random.randrange(len(table))])
+            elif opcode == CHOOSE_PROGRAM:
+                stack.append((random.choice(instruction[1]), 0))
+            else:
+                _, min_reps, max_reps, body = instruction
+                stack.extend([(body, 0)] * random.randint(min_reps, max_reps))
+        return bytes(result)
+
+    def generate_batch(self, count: int) -> list[bytes]:
+        return [self.generate() for _ in range(count)]
 
-    return result + helper(parse_tree[1:])
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern: bytes | str, max_extra_repeats: int = 0) -> CompiledPattern:
+    return CompiledPattern(pattern, max_extra_repeats)
 
 
 def generate_random_matching_input(pattern: bytes | str) -> bytes:
-    return helper(re_parse(pattern))
+    return compile_pattern(pattern).generate()
+
+
+def generate_random_matching_inputs(pattern: bytes | str, count: int) -> list[bytes]:
+    return compile_pattern(pattern).generate_batch(count)
+
+
+# Each rule is compiled once, up front.
+for _rule_pattern in grammar_dict.values():
+    compile_pattern(_rule_pattern)
@@ -0,0 +1,299 @@
+#############################################################################################
+# journal.py
+# A fuzzing run's state, from which the run can be resumed, kept in three files:
+#   an append-only log, to which findings (novel fingerprint digests, corpus entries, differentials, buckets)
+#   are written as they happen, a checkpoint of the queue, which replaces the last one every generation,
+#   and a snapshot, into which the log is compacted once it's as big as the snapshot.
+# So a generation only writes its own findings and the checkpoint. Compaction rewrites everything found
+# so far, but it happens less and less often, so its cost stays linear in the findings overall.
+# The snapshot and the checkpoint are each written to a temporary file that then replaces the old one.
+# Once the snapshot is replaced, the log is emptied.
+# Each record is a one-byte kind, a four-byte length, and a payload.
+# The log starts with the number of the snapshot that it continues, so that a run that dies between
+# replacing the snapshot and emptying the log doesn't replay the log's findings twice.
+# A truncated record at the end of the log (from a run that died mid-write) is ignored.
+#############################################################################################
+
+import os
+import struct
+from dataclasses import dataclass, field
+from pathlib import PosixPath
+from typing import BinaryIO, Iterable, Iterator
+
+# The digest of a fingerprint that was found to be novel
+SEEN_DIGEST: bytes = b"S"
+# The digest of a minimized differential's fingerprint
+MINIMIZED_DIGEST: bytes = b"M"
+# A minimized differential
+DIFFERENTIAL: bytes = b"D"
+# An input that joined the corpus, after its four-byte depth
+CORPUS_ENTRY: bytes = b"E"
+# A bucket of differentials, after its four-byte number. A bucket's latest record replaces its earlier ones.
+BUCKET: bytes = b"B"
+# Part of a checkpoint: an input waiting to be run
+QUEUED_INPUT: bytes = b"Q"
+# Part of a checkpoint: a differential waiting to be minimized
+UNMINIMIZED_DIFFERENTIAL: bytes = b"U"
+# Part of a checkpoint: the virgin bitmaps
+VIRGIN_BITS: bytes = b"V"
+# The end of a checkpoint, holding its generation number
+CHECKPOINT: bytes = b"C"
+# The number of a snapshot: at the end of the snapshot, and at the start of the log that continues it
+SNAPSHOT_NUMBER: bytes = b"N"
+
+# The log is only compacted into the snapshot once it's at least this many bytes.
+MIN_COMPACTION_BYTES: int = 1 << 20
+
+_HEADER: struct.Struct = struct.Struct("<cI")
+_CHECKPOINT_KINDS: tuple[bytes, ...] = (QUEUED_INPUT, UNMINIMIZED_DIFFERENTIAL, VIRGIN_BITS, CHECKPOINT)
+
+
+def snapshot_path(path: PosixPath) -> PosixPath:
+    """
+    Returns where the snapshot goes, for the journal whose log is at path.
+    """
+    return path.with_name(f"{path.name}.snapshot")
+
+
+def checkpoint_path(path: PosixPath) -> PosixPath:
+    """
+    Returns where the checkpoint goes, for the journal whose log is at path.
+    """
+    return path.with_name(f"{path.name}.checkpoint")
+
+
+def encode_record(kind: bytes, payload: bytes) -> bytes:
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def iter_records(data: bytes) -> Iterator[tuple[bytes, bytes, int]]:
+    """
+    Yields the (kind, payload, end offset) of each complete record in data.
+    """
+    offset: int = 0
+    while offset + _HEADER.size <= len(data):
+        kind, length = _HEADER.unpack_from(data, offset)
+        payload: bytes = data[offset + _HEADER.size : offset + _HEADER.size + length]
+        if len(payload) != length:
+            return
+        offset += _HEADER.size + length
+        yield kind, payload, offset
+
+
+def read_file(path: PosixPath) -> bytes:
+    if not path.exists():
+        return b""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def replace_file(path: PosixPath, chunks: Iterable[bytes]) -> None:
+    """
+    Replaces the file at path with chunks, such that a crash leaves either the old file or the new one.
+    """
+    temp_path: PosixPath = path.with_name(f"{path.name}.tmp")
+    with open(temp_path, "wb") as f:
+        f.writelines(chunks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def compacted_records(data: bytes) -> list[bytes]:
+    """
+    Returns the findings records in data, leaving out the ones that a later record replaces.
+    """
+    records: list[bytes] = []
+    # The index in records of each bucket's latest record
+    bucket_indices: dict[int, int] = {}
+    start: int = 0
+    for kind, payload, end in iter_records(data):
+        record: bytes = data[start:end]
+        start = end
+        if kind in _CHECKPOINT_KINDS or kind == SNAPSHOT_NUMBER:
+            continue
+        if kind == BUCKET:
+            (number,) = struct.unpack_from("<I", payload)
+            if number in bucket_indices:
+                records[bucket_indices[number]] = b""
+            bucket_indices[number] = len(records)
+        records.append(record)
+    return records
+
+
+@dataclass
+class Checkpoint:
+    """
+    What a journal's last complete checkpoint says: the generation, and the work that was waiting then.
+    """
+
+    generation: int = 0
+    queued_inputs: list[bytes] = field(default_factory=list)
+    unminimized_differentials: list[bytes] = field(default_factory=list)
+    virgin_bits: bytes | None = None
+
+
+@dataclass
+class JournalState:
+    """
+    Everything a journal says about its run.
+    """
+
+    # The length of the log's complete records. Anything after this is a partly written record,
+    # or the whole log, if it was already folded into the snapshot.
+    length: int = 0
+    seen_digests: list[bytes] = field(default_factory=list)
+    minimized_digests: list[bytes] = field(default_factory=list)
+    differentials: list[bytes] = field(default_factory=list)
+    # (depth, input) pairs
+    corpus_entries: list[tuple[int, bytes]] = field(default_factory=list)
+    # The latest record of each bucket, by bucket number
+    buckets: dict[int, bytes] = field(default_factory=dict)
+    checkpoint: Checkpoint = field(default_factory=Checkpoint)
+
+
+class Journal:
+    """
+    The writing end of a journal.
+    Records are buffered, and only forced to disk by flush() and checkpoint().
+    """
+
+    def __init__(self, path: PosixPath) -> None:
+        self.path: PosixPath = path
+        self.snapshot_path: PosixPath = snapshot_path(path)
+        self.checkpoint_path: PosixPath = checkpoint_path(path)
+        # The number of the current snapshot, and its size
+        self.snapshot_number: int = 0
+        self.snapshot_size: int = 0
+        for kind, payload, end in iter_records(read_file(self.snapshot_path)):
+            if kind == SNAPSHOT_NUMBER:
+                (self.snapshot_number,) = struct.unpack("<Q", payload)
+            self.snapshot_size = end
+
+        self.file: BinaryIO = open(path, "ab")
+        if self.file.tell() == 0:
+            self.record(SNAPSHOT_NUMBER, struct.pack("<Q", self.snapshot_number))
+
+    def record(self, kind: bytes, payload: bytes) -> None:
+        self.file.write(_HEADER.pack(kind, len(payload)))
+        self.file.write(payload)
+
+    def record_corpus_entry(self, depth: int, the_input: bytes) -> None:
+        self.record(CORPUS_ENTRY, struct.pack("<I", depth) + the_input)
+
+    def record_bucket(self, number: int, payload: bytes) -> None:
+        self.record(BUCKET, struct.pack("<I", number) + payload)
+
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def checkpoint(
+        self,
+        generation: int,
+        queued_inputs: Iterable[bytes],
+        unminimized_differentials: Iterable[bytes],
+        virgin_bits: bytes | None,
+    ) -> None:
+        """
+        Replaces the checkpoint, once the findings before it are on disk,
+        and compacts the log into the snapshot if the log has grown as big as the snapshot.
+        """
+        self.flush()
+        checkpoint_records: list[bytes] = [
+            encode_record(QUEUED_INPUT, queued_input) for queued_input in queued_inputs
+        ]
+        checkpoint_records += [
+            encode_record(UNMINIMIZED_DIFFERENTIAL, unminimized_differential)
+            for unminimized_differential in unminimized_differentials
+        ]
+        if virgin_bits is not None:
+            checkpoint_records.append(encode_record(VIRGIN_BITS, virgin_bits))
+        checkpoint_records.append(encode_record(CHECKPOINT, struct.pack("<Q", generation)))
+        replace_file(self.checkpoint_path, checkpoint_records)
+
+        if self.file.tell() >= max(MIN_COMPACTION_BYTES, self.snapshot_size):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Writes a new snapshot, with the old snapshot's findings and the log's, and empties the log.
+        """
+        self.flush()
+        records: list[bytes] = compacted_records(read_file(self.snapshot_path) + read_file(self.path))
+        records.append(encode_record(SNAPSHOT_NUMBER, struct.pack("<Q", self.snapshot_number + 1)))
+        replace_file(self.snapshot_path, records)
+        self.snapshot_number += 1
+        self.snapshot_size = sum(map(len, records))
+
+        os.ftruncate(self.file.fileno(), 0)
+        self.record(SNAPSHOT_NUMBER, struct.pack("<Q", self.snapshot_number))
+        self.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+def replay(data: bytes, state: JournalState) -> int:
+    """
+    Replays records into state, and returns the length of the complete ones.
+    """
+    # The checkpoint being read, which replaces the state's checkpoint once it's complete
+    checkpoint: Checkpoint = Checkpoint()
+
+    length: int = 0
+    for kind, payload, length in iter_records(data):
+        if kind == SEEN_DIGEST:
+            state.seen_digests.append(payload)
+        elif kind == MINIMIZED_DIGEST:
+            state.minimized_digests.append(payload)
+        elif kind == DIFFERENTIAL:
+            state.differentials.append(payload)
+        elif kind == CORPUS_ENTRY:
+            state.corpus_entries.append((*struct.unpack_from("<I", payload), payload[4:]))
+        elif kind == BUCKET:
+            state.buckets[struct.unpack_from("<I", payload)[0]] = payload[4:]
+        elif kind == QUEUED_INPUT:
+            checkpoint.queued_inputs.append(payload)
+        elif kind == UNMINIMIZED_DIFFERENTIAL:
+            checkpoint.unminimized_differentials.append(payload)
+        elif kind == VIRGIN_BITS:
+            checkpoint.virgin_bits = payload
+        elif kind == CHECKPOINT:
+            (checkpoint.generation,) = struct.unpack("<Q", payload)
+            state.checkpoint, checkpoint = checkpoint, Checkpoint()
+        elif kind != SNAPSHOT_NUMBER:
+            raise ValueError(f"Unknown journal record kind {kind!r}")
+    return length
+
+
+def read_journal(path: PosixPath) -> JournalState:
+    """
+    Replays a journal: its snapshot, then its log, unless the log was already compacted into the snapshot,
+    and then its checkpoint.
+    """
+    state: JournalState = JournalState()
+    snapshot: bytes = read_file(snapshot_path(path))
+    number: int = 0
+    for kind, payload, _ in iter_records(snapshot):
+        if kind == SNAPSHOT_NUMBER:
+            (number,) = struct.unpack("<Q", payload)
+    replay(snapshot, state)
+
+    log: bytes = read_file(path)
+    first_record: tuple[bytes, bytes, int] | None = next(iter_records(log), None)
+    # (A log from before snapshots were taken starts with something else, and continues no snapshot)
+    log_number: int = 0
+    if first_record is not None and first_record[0] == SNAPSHOT_NUMBER:
+        (log_number,) = struct.unpack("<Q", first_record[1])
+    if log_number == number:
+        state.length = replay(log, state)
+    replay(read_file(checkpoint_path(path)), state)
+    return state
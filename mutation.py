@@ -0,0 +1,156 @@
+#############################################################################################
+# mutation.py
+# A batch mutation engine in the style of AFL's havoc stage.
+# Every mutant gets a random stack of mutations, some of which splice in pieces of other inputs
+# or insert dictionary tokens. The random choices for a whole batch are drawn from numpy at once,
+# and each mutant is edited in place in a bytearray, so making a mutant costs a few cheap
+# buffer operations instead of one copy of the input per mutation.
+#############################################################################################
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+# The mutations. Each one uses some of the random values drawn for it (see Draws).
+FLIP_BIT: int = 0
+SET_BYTE: int = 1
+INSERT_BYTE: int = 2
+DELETE_BLOCK: int = 3
+DUPLICATE_BLOCK: int = 4
+OVERWRITE_BLOCK: int = 5
+INSERT_TOKEN: int = 6
+OVERWRITE_TOKEN: int = 7
+SPLICE: int = 8
+NUM_BUILTIN_MUTATIONS: int = 9
+
+NEEDS_NONEMPTY_INPUT: tuple[int, ...] = (FLIP_BIT, SET_BYTE, DELETE_BLOCK, DUPLICATE_BLOCK, OVERWRITE_BLOCK)
+
+# The longest block that the block mutations delete, duplicate, or copy.
+MAX_BLOCK_LEN: int = 32
+
+
+@dataclass
+class Draws:
+    """
+    The random values for a batch's mutations, one of each per mutation:
+    which mutation it is, three fractions for positions and lengths (drawn as fractions,
+    because the length of the input changes as we go), a byte, another parent to splice in, and a token.
+    """
+
+    mutations: list[int]
+    fractions: list[list[float]]
+    random_bytes: list[int]
+    others: list[int]
+    token_indices: list[int]
+
+
+class Havoc:
+    """
+    Makes batches of mutants.
+    tokens are byte strings worth inserting, and extra_mutators are any other mutations to mix in.
+    (The extra mutators take and return bytes, so they cost a copy each; they get picked
+     as often as each builtin mutation.)
+    Each mutant gets between 1 and 2**max_stack_pow2 mutations.
+    """
+
+    def __init__(
+        self,
+        tokens: list[bytes],
+        extra_mutators: list[Callable[[bytes], bytes]],
+        max_stack_pow2: int,
+        seed: int | None = None,
+    ) -> None:
+        self.tokens: list[bytes] = [token for token in tokens if len(token) != 0]
+        self.extra_mutators: list[Callable[[bytes], bytes]] = extra_mutators
+        self.max_stack_pow2: int = max_stack_pow2
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+    def mutate_batch(self, parents: list[bytes], num_children: int) -> list[bytes]:
+        """
+        Makes num_children mutants, going round-robin through the parents.
+        Splices take their other half from another of the parents.
+        """
+        assert len(parents) != 0
+        num_mutations: int = NUM_BUILTIN_MUTATIONS + len(self.extra_mutators)
+
+        # Draw everything random for the whole batch up front.
+        stack_sizes: np.ndarray = 1 << self.rng.integers(0, self.max_stack_pow2 + 1, size=num_children)
+        total: int = int(stack_sizes.sum())
+        draws: Draws = Draws(
+            self.rng.integers(num_mutations, size=total).tolist(),
+            self.rng.random((total, 3)).tolist(),
+            self.rng.integers(256, size=total).tolist(),
+            self.rng.integers(len(parents), size=total).tolist(),
+            self.rng.integers(max(len(self.tokens), 1), size=total).tolist(),
+        )
+        mutations: list[int] = draws.mutations
+
+        children: list[bytes] = []
+        # The random values for each child's stack start at this index
+        stack_start: int = 0
+        for child_index, stack_size in enumerate(stack_sizes.tolist()):
+            buf: bytearray = bytearray(parents[child_index % len(parents)])
+            stack: range | list[int] = range(stack_start, stack_start + stack_size)
+            if len(self.extra_mutators) != 0:
+                # The extra mutators go first, so that they see the parent (or another extra mutator's output)
+                # instead of something new. That lets them cache what they learn about their inputs.
+                stack = sorted(stack, key=lambda j: mutations[j] < NUM_BUILTIN_MUTATIONS)
+            for k in stack:
+                buf = self.apply_mutation(buf, k, draws, parents)
+            stack_start += stack_size
+
+            if len(buf) == 0:
+                buf.append(draws.random_bytes[stack_start - 1])
+            children.append(bytes(buf))
+        return children
+
+    def apply_mutation(self, buf: bytearray, k: int, draws: Draws, parents: list[bytes]) -> bytearray:
+        """
+        Applies the batch's kth mutation to buf, and returns the result.
+        That's buf itself, edited in place, unless the mutation is an extra mutator.
+        """
+        mutation: int = draws.mutations[k]
+        f0, f1, f2 = draws.fractions[k]
+        r: int = draws.random_bytes[k]
+        n: int = len(buf)
+        if n == 0 and mutation in NEEDS_NONEMPTY_INPUT:
+            mutation = INSERT_BYTE
+        if len(self.tokens) == 0 and mutation in (INSERT_TOKEN, OVERWRITE_TOKEN):
+            mutation = INSERT_BYTE
+
+        if mutation == FLIP_BIT:
+            buf[int(f0 * n)] ^= 1 << (r & 7)
+        elif mutation == SET_BYTE:
+            buf[int(f0 * n)] = r
+        elif mutation == INSERT_BYTE:
+            buf.insert(int(f0 * (n + 1)), r)
+        elif mutation == DELETE_BLOCK:
+            # Never delete the whole input
+            block_len: int = 1 + int(f1 * min(n - 1, MAX_BLOCK_LEN))
+            if block_len < n:
+                start: int = int(f0 * (n - block_len + 1))
+                del buf[start : start + block_len]
+        elif mutation == DUPLICATE_BLOCK:
+            block_len = 1 + int(f1 * min(n, MAX_BLOCK_LEN))
+            start = int(f0 * (n - block_len + 1))
+            buf[int(f2 * (n + 1)) : int(f2 * (n + 1))] = buf[start : start + block_len]
+        elif mutation == OVERWRITE_BLOCK:
+            block_len = 1 + int(f1 * min(n, MAX_BLOCK_LEN))
+            start = int(f0 * (n - block_len + 1))
+            dest: int = int(f2 * (n - block_len + 1))
+            buf[dest : dest + block_len] = buf[start : start + block_len]
+        elif mutation == INSERT_TOKEN:
+            position: int = int(f0 * (n + 1))
+            buf[position:position] = self.tokens[draws.token_indices[k]]
+        elif mutation == OVERWRITE_TOKEN:
+            token: bytes = self.tokens[draws.token_indices[k]]
+            position = int(f0 * (n + 1))
+            buf[position : position + len(token)] = token
+        elif mutation == SPLICE:
+            # Keep the front of this input, and take the back of another one.
+            other: bytes = parents[draws.others[k]]
+            buf[int(f0 * (n + 1)) :] = other[int(f1 * (len(other) + 1)) :]
+        else:
+            buf = bytearray(self.extra_mutators[mutation - NUM_BUILTIN_MUTATIONS](bytes(buf)))
+        return buf
@@ -0,0 +1,135 @@
+#############################################################################################
+# result_cache.py
+# A cache of what each target did on each input, shared by all of the pool workers.
+# It's a SQLite database on disk, so it can outlive the run if you want it to.
+# Entries are keyed by a digest of the target (including its executable's contents),
+# so rebuilding a target invalidates its old entries instead of serving them.
+#############################################################################################
+
+import array
+import hashlib
+import sqlite3
+import time
+from multiprocessing.sharedctypes import Synchronized
+from pathlib import PosixPath
+
+DIGEST_SIZE: int = 16
+
+# A hit only refreshes an entry's last use time if it's at least this many milliseconds stale,
+# so that most hits don't have to write to the database.
+LAST_USED_RESOLUTION: int = 60_000
+
+# The cache is checked against its size cap after every this many insertions (per process).
+EVICTION_INTERVAL: int = 1000
+
+# When the cache goes over its size cap, the least recently used entries are evicted
+# until it's down to this fraction of the cap.
+EVICTION_TARGET: float = 0.9
+
+# What one target did on one input: its exit status, its stdout (if we kept it), and the edges it hit.
+cached_run_t = tuple[int, bytes | None, frozenset[int]]
+
+
+def target_digest(executable: PosixPath, *parts: str) -> bytes:
+    """
+    Returns a digest identifying a target, for use with ResultCache.key.
+    parts should include anything else that changes what the target does on an input.
+    (Only the executable itself is hashed, so a python target's libraries aren't covered.)
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(executable, "rb") as f:
+        h.update(f.read())
+    for part in parts:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part.encode("utf-8"))
+    return h.digest()
+
+
+class ResultCache:
+    """
+    A size-capped, least recently used cache of target runs.
+    Each process opens its own ResultCache on the same path; hit and miss counts are shared.
+    """
+
+    def __init__(self, path: PosixPath, max_bytes: int, hits: Synchronized, misses: Synchronized) -> None:
+        self.max_bytes: int = max_bytes
+        self.hits: Synchronized = hits
+        self.misses: Synchronized = misses
+        self.insertions: int = 0
+        # Autocommit mode, since the writes are all single statements
+        self.connection: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        # Workers read while others write, and losing the cache in a crash isn't a big deal.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            + "key BLOB PRIMARY KEY, status INTEGER NOT NULL, stdout BLOB, edges BLOB NOT NULL,"
+            + "size INTEGER NOT NULL, last_used INTEGER NOT NULL"
+            + ") WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_by_last_used ON results (last_used)")
+
+    @staticmethod
+    def key(target: bytes, the_input: bytes) -> bytes:
+        """
+        Returns the cache key for running the target with digest `target` on the_input.
+        """
+        return hashlib.blake2b(the_input, digest_size=DIGEST_SIZE, key=target).digest()
+
+    def get(self, keys: list[bytes]) -> dict[bytes, cached_run_t]:
+        """
+        Looks up several keys at once, and returns the entries that were found.
+        """
+        now: int = time.time_ns() // 1_000_000
+        rows: list[tuple[bytes, int, bytes | None, bytes, int]] = self.connection.execute(
+            "SELECT key, status, stdout, edges, last_used FROM results WHERE key IN ("
+            + ", ".join("?" * len(keys))
+            + ")",
+            keys,
+        ).fetchall()
+        stale_keys: list[tuple[int, bytes]] = [
+            (now, key) for key, *_, last_used in rows if now - last_used >= LAST_USED_RESOLUTION
+        ]
+        if len(stale_keys) != 0:
+            self.connection.executemany("UPDATE results SET last_used = ? WHERE key = ?", stale_keys)
+
+        with self.hits.get_lock():
+            self.hits.value += len(rows)
+        with self.misses.get_lock():
+            self.misses.value += len(keys) - len(rows)
+
+        return {
+            key: (status, stdout, frozenset(array.array("I", edges)))
+            for key, status, stdout, edges, _ in rows
+        }
+
+    def put(self, entries: dict[bytes, cached_run_t]) -> None:
+        now: int = time.time_ns() // 1_000_000
+        rows: list[tuple[bytes, int, bytes | None, bytes, int, int]] = []
+        for key, (status, stdout, edges) in entries.items():
+            packed_edges: bytes = array.array("I", edges).tobytes()
+            size: int = DIGEST_SIZE + len(packed_edges) + (len(stdout) if stdout is not None else 0)
+            rows.append((key, status, stdout, packed_edges, size, now))
+        self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        self.insertions += len(rows)
+        if self.insertions >= EVICTION_INTERVAL:
+            self.insertions = 0
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Evicts the least recently used entries, if the cache is over its size cap.
+        """
+        count, total_size = self.connection.execute("SELECT COUNT(*), TOTAL(size) FROM results").fetchone()
+        if total_size <= self.max_bytes:
+            return
+        # Entries are about the same size, so evict by count.
+        num_to_evict: int = int(count * (1 - EVICTION_TARGET * self.max_bytes / total_size)) + 1
+        self.connection.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+            (num_to_evict,),
+        )
+
+    def close(self) -> None:
+        self.connection.close()
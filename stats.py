@@ -0,0 +1,346 @@
+#############################################################################################
+# stats.py
+# Telemetry for a fuzzing run: throughput overall and per target, where the time goes by stage,
+# how long each target takes per run, and how the run is doing (corpus, coverage, cache, findings).
+# The campaign (see campaign.py) feeds it, and every so often writes it out as an AFL-style
+# fuzzer_stats file, and (optionally) as Prometheus text, served on localhost.
+#############################################################################################
+
+import http.server
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import numpy as np
+
+# The upper bounds of the latency histogram buckets, in seconds. (There's another bucket for the rest)
+LATENCY_BUCKETS: list[float] = [
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+]
+
+# The stages that time is charged to:
+#   trace     running the afl-showmap targets
+#   run       running the targets for their statuses and parse trees (and forkserver traces)
+#   minimize  running the targets on candidate reductions of differentials
+#   mutate    scheduling the corpus and making the next generation
+# The first three are summed over the workers, so they can add up to more than the run's wall time.
+STAGES: tuple[str, ...] = ("trace", "run", "minimize", "mutate")
+
+
+class Histogram:
+    """
+    Counts observations in the LATENCY_BUCKETS buckets.
+    """
+
+    def __init__(self) -> None:
+        self.bounds: np.ndarray = np.array(LATENCY_BUCKETS)
+        # One count per bucket, and one for everything above the last bound
+        self.counts: np.ndarray = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.uint64)
+        self.total: float = 0.0
+
+    def observe(self, values: Iterable[float]) -> None:
+        values_array: np.ndarray = np.fromiter(values, dtype=np.float64)
+        np.add.at(self.counts, np.searchsorted(self.bounds, values_array), 1)
+        self.total += float(values_array.sum())
+
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket that the q-quantile falls in (or inf, past the last bucket).
+        """
+        if self.count() == 0:
+            return 0.0
+        index: int = int(np.searchsorted(np.cumsum(self.counts), q * self.count()))
+        return float(self.bounds[index]) if index < len(self.bounds) else float("inf")
+
+
+@dataclass
+class TargetStats:
+    """
+    The numbers that go in fuzzer_stats for one target.
+    """
+
+    name: str
+    # Executions, including cached ones
+    execs: int = 0
+    # Seconds spent in runs that weren't cached
+    seconds: float = 0.0
+    latencies: Histogram = field(default_factory=Histogram)
+    # The number of edges hit by the corpus
+    edges_found: int = 0
+
+
+@dataclass
+class Progress:
+    """
+    How far along the run is.
+    """
+
+    generation: int = 0
+    corpus_size: int = 0
+    pending_inputs: int = 0
+    cache_hits: int = 0
+    cache_lookups: int = 0
+
+
+@dataclass
+class FindingCounts:
+    """
+    How much the run has found.
+    """
+
+    differentials: int = 0
+    # Differentials found before minimization, and the number of buckets they fell into
+    bucketed_differentials: int = 0
+    differential_buckets: int = 0
+    unminimized_differentials: int = 0
+    hangs: int = 0
+
+
+class FuzzerStats:
+    """
+    The numbers that go in fuzzer_stats.
+    The counters and histograms are fed by the record_* methods;
+    the gauges (progress, findings, and the targets' edges_found) are set directly, before each write.
+    """
+
+    def __init__(self, target_names: list[str]) -> None:
+        self.targets: list[TargetStats] = [TargetStats(name) for name in target_names]
+        self.start_time: float = time.time()
+        self.execs: int = 0
+        self.stage_seconds: dict[str, float] = {stage: 0.0 for stage in STAGES}
+        # The execution count and time as of the last write, for the recent execs/sec
+        self.last_write: tuple[int, float] = (0, self.start_time)
+        self.progress: Progress = Progress()
+        self.findings: FindingCounts = FindingCounts()
+
+    def record_runs(
+        self, run_times: Iterable[tuple[float | None, ...]], target_indices: tuple[int, ...]
+    ) -> None:
+        """
+        Records one run of the targets at target_indices per item of run_times,
+        which holds how long each of those targets took (or None, if its run was cached).
+        """
+        runs: list[tuple[float | None, ...]] = list(run_times)
+        self.execs += len(runs) * len(target_indices)
+        for n, i in enumerate(target_indices):
+            target: TargetStats = self.targets[i]
+            target.execs += len(runs)
+            latencies: list[float] = [t for times in runs if (t := times[n]) is not None]
+            target.latencies.observe(latencies)
+            target.seconds += sum(latencies)
+
+    def record_stage_time(self, stage: str, seconds: float) -> None:
+        self.stage_seconds[stage] += seconds
+
+    def record_edges_found(self, edges_found: Iterable[int]) -> None:
+        for target, target_edges_found in zip(self.targets, edges_found):
+            target.edges_found = target_edges_found
+
+    def execs_per_sec(self, now: float) -> float:
+        return self.execs / max(now - self.start_time, 1e-9)
+
+    def to_fuzzer_stats(self, now: float) -> str:
+        """
+        Renders the stats in the format of afl-fuzz's fuzzer_stats file.
+        """
+        progress: Progress = self.progress
+        findings: FindingCounts = self.findings
+        last_write_execs, last_write_time = self.last_write
+        fields: list[tuple[str, object]] = [
+            ("start_time", int(self.start_time)),
+            ("last_update", int(now)),
+            ("run_time", int(now - self.start_time)),
+            ("fuzzer_pid", os.getpid()),
+            ("cycles_done", progress.generation),
+            ("execs_done", self.execs),
+            ("execs_per_sec", f"{self.execs_per_sec(now):.2f}"),
+            (
+                "execs_ps_recent",
+                f"{(self.execs - last_write_execs) / max(now - last_write_time, 1e-9):.2f}",
+            ),
+            ("corpus_count", progress.corpus_size),
+            ("pending_total", progress.pending_inputs),
+            ("edges_found", sum(target.edges_found for target in self.targets)),
+            ("cache_hits", progress.cache_hits),
+            ("cache_lookups", progress.cache_lookups),
+            (
+                "cache_hit_rate",
+                (
+                    f"{100 * progress.cache_hits / progress.cache_lookups:.2f}%"
+                    if progress.cache_lookups != 0
+                    else "0.00%"
+                ),
+            ),
+            ("saved_differentials", findings.differentials),
+            ("bucketed_differentials", findings.bucketed_differentials),
+            ("differential_buckets", findings.differential_buckets),
+            ("pending_differentials", findings.unminimized_differentials),
+            ("saved_hangs", findings.hangs),
+        ]
+        for stage in STAGES:
+            fields.append((f"stage_{stage}_sec", f"{self.stage_seconds[stage]:.2f}"))
+        for target in self.targets:
+            name: str = target.name
+            fields += [
+                (f"target_{name}_execs", target.execs),
+                (
+                    f"target_{name}_execs_per_sec",
+                    f"{target.execs / max(now - self.start_time, 1e-9):.2f}",
+                ),
+                (f"target_{name}_run_sec", f"{target.seconds:.2f}"),
+                (f"target_{name}_p50_us", f"{target.latencies.quantile(0.5) * 1e6:.0f}"),
+                (f"target_{name}_p99_us", f"{target.latencies.quantile(0.99) * 1e6:.0f}"),
+                (f"target_{name}_edges_found", target.edges_found),
+            ]
+        return "".join(f"{key:<24}: {value}\n" for key, value in fields)
+
+    def to_prometheus(self, now: float) -> str:
+        """
+        Renders the stats in the Prometheus text exposition format.
+        """
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, object]]) -> None:
+            lines.append(f"# HELP diff_fuzz_{name} {help_text}")
+            lines.append(f"# TYPE diff_fuzz_{name} {kind}")
+            lines.extend(f"diff_fuzz_{name}{labels} {value}" for labels, value in samples)
+
+        metric("uptime_seconds", "gauge", "Seconds since the run started.", [("", now - self.start_time)])
+        metric("generation", "gauge", "The current generation.", [("", self.progress.generation)])
+        metric("execs_total", "counter", "Target executions.", [("", self.execs)])
+        metric(
+            "target_execs_total",
+            "counter",
+            "Executions per target, including cached ones.",
+            [(f'{{target="{target.name}"}}', target.execs) for target in self.targets],
+        )
+        metric(
+            "target_run_seconds_total",
+            "counter",
+            "Seconds per target spent in runs that weren't cached.",
+            [(f'{{target="{target.name}"}}', target.seconds) for target in self.targets],
+        )
+        metric(
+            "stage_seconds_total",
+            "counter",
+            "Seconds spent in each stage, summed over the workers.",
+            [(f'{{stage="{stage}"}}', self.stage_seconds[stage]) for stage in STAGES],
+        )
+
+        lines.append("# HELP diff_fuzz_target_latency_seconds How long each run of a target took.")
+        lines.append("# TYPE diff_fuzz_target_latency_seconds histogram")
+        for target in self.targets:
+            name = target.name
+            histogram: Histogram = target.latencies
+            cumulative_counts: list[int] = np.cumsum(histogram.counts).tolist()
+            for bound, cumulative_count in zip(LATENCY_BUCKETS, cumulative_counts):
+                lines.append(
+                    f'diff_fuzz_target_latency_seconds_bucket{{target="{name}",le="{bound}"}} {cumulative_count}'
+                )
+            lines.append(
+                f'diff_fuzz_target_latency_seconds_bucket{{target="{name}",le="+Inf"}} {cumulative_counts[-1]}'
+            )
+            lines.append(f'diff_fuzz_target_latency_seconds_sum{{target="{name}"}} {histogram.total}')
+            lines.append(f'diff_fuzz_target_latency_seconds_count{{target="{name}"}} {cumulative_counts[-1]}')
+
+        metric("corpus_size", "gauge", "Entries in the corpus.", [("", self.progress.corpus_size)])
+        metric("pending_inputs", "gauge", "Inputs waiting to be run.", [("", self.progress.pending_inputs)])
+        metric(
+            "edges_found",
+            "gauge",
+            "Edges hit by the corpus, per target.",
+            [(f'{{target="{target.name}"}}', target.edges_found) for target in self.targets],
+        )
+        metric("cache_hits_total", "counter", "Result cache hits.", [("", self.progress.cache_hits)])
+        metric("cache_lookups_total", "counter", "Result cache lookups.", [("", self.progress.cache_lookups)])
+        metric(
+            "differentials", "gauge", "Minimized differentials found.", [("", self.findings.differentials)]
+        )
+        metric(
+            "bucketed_differentials",
+            "gauge",
+            "Differentials found before minimization.",
+            [("", self.findings.bucketed_differentials)],
+        )
+        metric(
+            "differential_buckets",
+            "gauge",
+            "Buckets that the differentials fell into.",
+            [("", self.findings.differential_buckets)],
+        )
+        metric(
+            "pending_differentials",
+            "gauge",
+            "Differentials waiting to be minimized, or being minimized.",
+            [("", self.findings.unminimized_differentials)],
+        )
+        metric("hangs", "gauge", "Inputs quarantined for timing out.", [("", self.findings.hangs)])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str | os.PathLike, server: "StatsServer | None" = None) -> None:
+        """
+        Writes fuzzer_stats to path (atomically, so that readers never see half of it),
+        and updates what server serves.
+        """
+        now: float = time.time()
+        temp_path: str = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_fuzzer_stats(now))
+        os.replace(temp_path, path)
+        if server is not None:
+            server.text = self.to_prometheus(now)
+        self.last_write = (self.execs, now)
+
+
+class StatsServer:
+    """
+    Serves the most recently written stats as Prometheus text on localhost:port, from a daemon thread.
+    """
+
+    def __init__(self, port: int) -> None:
+        self.text: str = ""
+        server: StatsServer = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body: bytes = server.text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_: object) -> None:
+                pass
+
+        self.http_server: http.server.ThreadingHTTPServer = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", port), Handler
+        )
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+
+    def __enter__(self) -> "StatsServer":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.http_server.shutdown()
+        self.http_server.server_close()
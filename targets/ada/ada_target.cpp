@@ -1,4 +1,8 @@
+#include <algorithm>
+#include <cstdint>
+#include <cstdlib>
 #include <iostream>
+#include <unistd.h>
 #include <boost/beast.hpp>
 
 #include "ada/singleheader/ada.h"
@@ -6,13 +10,57 @@
 using boost::beast::detail::base64::encode;
 using boost::beast::detail::base64::encoded_size;
 
-int main() {
-    std::string input;
-    std::string line;
-    while (std::getline(std::cin, line)) {
-        input += line;
+// Without afl-clang-fast++, read one input from stdin, all the way to EOF, and run it once.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+static size_t fuzz_len;
+static unsigned char fuzz_buf[1024000];
+static int fuzz_input_read;
+static int read_fuzz_input(void) {
+    if (fuzz_input_read) {
+        return 0;
+    }
+    fuzz_input_read = 1;
+    // A pipe can hand over its input in pieces.
+    ssize_t n;
+    while (fuzz_len < sizeof(fuzz_buf) && (n = read(0, fuzz_buf + fuzz_len, sizeof(fuzz_buf) - fuzz_len)) > 0) {
+        fuzz_len += (size_t)n;
     }
+    return 1;
+}
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_INIT() void sync(void);
+#define __AFL_LOOP(x) ((void)(x), read_fuzz_input())
+#endif
+
+__AFL_FUZZ_INIT();
+
+// Whether to print the parse tree in the binary output format instead of as JSON.
+// The fuzzer sets DIFF_FUZZ_BINARY_OUTPUT for targets whose config has binary_output set.
+static bool binary_output;
+
+// The number of inputs to run in one process before restarting it.
+// The fuzzer sets this when it runs us in persistent mode.
+static unsigned int persistent_iterations() {
+    char const *const iterations_str = std::getenv("DIFF_FUZZ_PERSISTENT_ITERATIONS");
+    unsigned long const iterations = iterations_str != nullptr ? std::strtoul(iterations_str, nullptr, 10) : 1;
+    return iterations > 0 ? iterations : 1;
+}
+
+// Writes a field in the binary output format: its length as 4 little-endian bytes, then its bytes.
+static void write_field(std::string const &field) {
+    std::uint32_t const len = field.length();
+    char const len_bytes[4] = {
+        static_cast<char>(len & 0xff),
+        static_cast<char>((len >> 8) & 0xff),
+        static_cast<char>((len >> 16) & 0xff),
+        static_cast<char>(len >> 24),
+    };
+    std::cout.write(len_bytes, sizeof(len_bytes));
+    std::cout.write(field.data(), field.length());
+}
 
+static int parse_url(std::string const &input) {
     auto const &parsed_url = ada::parse<ada::url_aggregator>(input);
     if (!parsed_url) {
         return 1;
@@ -35,6 +83,17 @@ int main() {
         fragment = fragment.substr(1);
     }
 
+    if (binary_output) {
+        write_field(scheme);
+        write_field(userinfo);
+        write_field(host);
+        write_field(port);
+        write_field(path);
+        write_field(query);
+        write_field(fragment);
+        return 0;
+    }
+
     char *const scheme_b64 = new char[encoded_size(scheme.length()) + 1];
     char *const userinfo_b64 = new char[encoded_size(userinfo.length()) + 1];
     char *const host_b64 = new char[encoded_size(host.length()) + 1];
@@ -67,4 +126,23 @@ int main() {
     delete[] path_b64;
     delete[] query_b64;
     delete[] fragment_b64;
+    return 0;
+}
+
+int main() {
+    unsigned char const *const testcase_buf = __AFL_FUZZ_TESTCASE_BUF;
+    unsigned int const iterations = persistent_iterations();
+    binary_output = std::getenv("DIFF_FUZZ_BINARY_OUTPUT") != nullptr;
+    while (__AFL_LOOP(iterations)) {
+        // Newlines are dropped, as they were when we read the input line by line.
+        std::string input(reinterpret_cast<char const *>(testcase_buf), __AFL_FUZZ_TESTCASE_LEN);
+        input.erase(std::remove(input.begin(), input.end(), '\n'), input.end());
+
+        int const rc = parse_url(input);
+        std::cout.flush();
+        // Failures end the process, so that the fuzzer sees their exit status.
+        if (rc != 0) {
+            return rc;
+        }
+    }
 }
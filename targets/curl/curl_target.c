@@ -1,5 +1,7 @@
+#include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
+#include <unistd.h>
 
 #include "curl/include/curl/curl.h"
 #include "curl/lib/curl_base64.h"
@@ -7,10 +9,54 @@
 #define MAX_URL_LEN (32768)
 static size_t unused;
 static char url_string[MAX_URL_LEN];
+// Whether to print the parse tree in the binary output format instead of as JSON.
+// The fuzzer sets DIFF_FUZZ_BINARY_OUTPUT for targets whose config has binary_output set.
+static int binary_output;
 
-int main(void) {
-    fread(url_string, 1, MAX_URL_LEN, stdin);
+// Without afl-clang-fast, read one input from stdin, all the way to EOF, and run it once.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+static size_t fuzz_len;
+static unsigned char fuzz_buf[MAX_URL_LEN];
+static int fuzz_input_read;
+static int read_fuzz_input(void) {
+    if (fuzz_input_read) {
+        return 0;
+    }
+    fuzz_input_read = 1;
+    // A pipe can hand over its input in pieces.
+    ssize_t n;
+    while (fuzz_len < sizeof(fuzz_buf) && (n = read(0, fuzz_buf + fuzz_len, sizeof(fuzz_buf) - fuzz_len)) > 0) {
+        fuzz_len += (size_t)n;
+    }
+    return 1;
+}
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_INIT() void sync(void);
+#define __AFL_LOOP(x) ((void)(x), read_fuzz_input())
+#endif
+
+__AFL_FUZZ_INIT();
+
+// The number of inputs to run in one process before restarting it.
+// The fuzzer sets this when it runs us in persistent mode.
+static unsigned int persistent_iterations(void) {
+    char const *const iterations_str = getenv("DIFF_FUZZ_PERSISTENT_ITERATIONS");
+    unsigned long const iterations = iterations_str != NULL ? strtoul(iterations_str, NULL, 10) : 1;
+    return iterations > 0 ? iterations : 1;
+}
+
+// Writes a field in the binary output format: its length as 4 little-endian bytes, then its bytes.
+static void write_field(char const *const field) {
+    uint32_t const len = field != NULL ? strlen(field) : 0;
+    unsigned char const len_bytes[4] = {len & 0xff, (len >> 8) & 0xff, (len >> 16) & 0xff, len >> 24};
+    fwrite(len_bytes, 1, sizeof(len_bytes), stdout);
+    if (len > 0) {
+        fwrite(field, 1, len, stdout);
+    }
+}
 
+static int parse_url(void) {
     CURLU *const parsed_url = curl_url();
     CURLUcode const rc = curl_url_set(parsed_url, CURLUPART_URL, url_string, CURLU_NON_SUPPORT_SCHEME);
     if (rc != CURLUE_OK) {
@@ -26,15 +72,6 @@ int main(void) {
     char *query = NULL;
     char *fragment = NULL;
 
-    char *b64_scheme = NULL;
-    char *b64_userinfo = NULL;
-    char *b64_password = NULL;
-    char *b64_host = NULL;
-    char *b64_port = NULL;
-    char *b64_path = NULL;
-    char *b64_query = NULL;
-    char *b64_fragment = NULL;
-
     curl_url_get(parsed_url, CURLUPART_SCHEME, &scheme, 0);
     curl_url_get(parsed_url, CURLUPART_USER, &user, 0);
     curl_url_get(parsed_url, CURLUPART_PASSWORD, &password, 0);
@@ -45,9 +82,7 @@ int main(void) {
     curl_url_get(parsed_url, CURLUPART_FRAGMENT, &fragment, 0);
     // Leaving off OPTIONS and ZONEID for now.
 
-    if (scheme != NULL) {
-        Curl_base64_encode(scheme, 0, &b64_scheme, &unused);
-    }
+    // From here on, user holds the whole userinfo.
     if (user != NULL && password != NULL) {
         user = realloc(user, strlen(user) + 1 + strlen(password) + 1);
         if (user == NULL) {
@@ -55,9 +90,6 @@ int main(void) {
         }
         strcat(user, ":");
         strcat(user, password);
-        Curl_base64_encode(user, 0, &b64_userinfo, &unused);
-    } else if (user != NULL && password == NULL) {
-        Curl_base64_encode(user, 0, &b64_userinfo, &unused);
     } else if (user == NULL && password != NULL) {
         user = malloc(2);
         if (user == NULL) {
@@ -70,41 +102,64 @@ int main(void) {
             return 2;
         }
         strcat(user, password);
-        Curl_base64_encode(user, 0, &b64_userinfo, &unused);
-    }
-    if (host != NULL) {
-        Curl_base64_encode(host, 0, &b64_host, &unused);
-    }
-    if (port != NULL) {
-        Curl_base64_encode(port, 0, &b64_port, &unused);
-    }
-    if (path != NULL) {
-        Curl_base64_encode(path, 0, &b64_path, &unused);
-    }
-    if (query != NULL) {
-        Curl_base64_encode(query, 0, &b64_query, &unused);
-    }
-    if (fragment != NULL) {
-        Curl_base64_encode(fragment, 0, &b64_fragment, &unused);
     }
 
-    printf("{\"scheme\":\"%s\",\"userinfo\":\"%s\",\"host\":\"%s\",\"port\":\"%s\",\"path\":\"%s\",\"query\":\"%s\",\"fragment\":\"%s\"}\n",
-           b64_scheme != NULL ? b64_scheme : "",
-           b64_userinfo != NULL ? b64_userinfo : "",
-           b64_host != NULL ? b64_host : "",
-           b64_port != NULL ? b64_port : "",
-           b64_path != NULL ? b64_path : "",
-           b64_query != NULL ? b64_query : "",
-           b64_fragment != NULL ? b64_fragment : "");
-
-    free(b64_scheme);
-    free(b64_userinfo);
-    free(b64_password);
-    free(b64_host);
-    free(b64_port);
-    free(b64_path);
-    free(b64_query);
-    free(b64_fragment);
+    if (binary_output) {
+        write_field(scheme);
+        write_field(user);
+        write_field(host);
+        write_field(port);
+        write_field(path);
+        write_field(query);
+        write_field(fragment);
+    } else {
+        char *b64_scheme = NULL;
+        char *b64_userinfo = NULL;
+        char *b64_host = NULL;
+        char *b64_port = NULL;
+        char *b64_path = NULL;
+        char *b64_query = NULL;
+        char *b64_fragment = NULL;
+
+        if (scheme != NULL) {
+            Curl_base64_encode(scheme, 0, &b64_scheme, &unused);
+        }
+        if (user != NULL) {
+            Curl_base64_encode(user, 0, &b64_userinfo, &unused);
+        }
+        if (host != NULL) {
+            Curl_base64_encode(host, 0, &b64_host, &unused);
+        }
+        if (port != NULL) {
+            Curl_base64_encode(port, 0, &b64_port, &unused);
+        }
+        if (path != NULL) {
+            Curl_base64_encode(path, 0, &b64_path, &unused);
+        }
+        if (query != NULL) {
+            Curl_base64_encode(query, 0, &b64_query, &unused);
+        }
+        if (fragment != NULL) {
+            Curl_base64_encode(fragment, 0, &b64_fragment, &unused);
+        }
+
+        printf("{\"scheme\":\"%s\",\"userinfo\":\"%s\",\"host\":\"%s\",\"port\":\"%s\",\"path\":\"%s\",\"query\":\"%s\",\"fragment\":\"%s\"}\n",
+               b64_scheme != NULL ? b64_scheme : "",
+               b64_userinfo != NULL ? b64_userinfo : "",
+               b64_host != NULL ? b64_host : "",
+               b64_port != NULL ? b64_port : "",
+               b64_path != NULL ? b64_path : "",
+               b64_query != NULL ? b64_query : "",
+               b64_fragment != NULL ? b64_fragment : "");
+
+        free(b64_scheme);
+        free(b64_userinfo);
+        free(b64_host);
+        free(b64_port);
+        free(b64_path);
+        free(b64_query);
+        free(b64_fragment);
+    }
 
     free(scheme);
     free(user);
@@ -116,4 +171,26 @@ int main(void) {
     free(fragment);
 
     curl_url_cleanup(parsed_url);
+    return 0;
+}
+
+int main(void) {
+    unsigned char const *const testcase_buf = __AFL_FUZZ_TESTCASE_BUF;
+    unsigned int const iterations = persistent_iterations();
+    binary_output = getenv("DIFF_FUZZ_BINARY_OUTPUT") != NULL;
+    while (__AFL_LOOP(iterations)) {
+        size_t len = __AFL_FUZZ_TESTCASE_LEN;
+        if (len > MAX_URL_LEN - 1) {
+            len = MAX_URL_LEN - 1;
+        }
+        memcpy(url_string, testcase_buf, len);
+        url_string[len] = '\0';
+
+        int const rc = parse_url();
+        fflush(stdout);
+        // Failures end the process, so that the fuzzer sees their exit status.
+        if (rc != 0) {
+            return rc;
+        }
+    }
 }
@@ -1,13 +1,59 @@
 #include <stdint.h>
 #include <string.h>
+#include <unistd.h>
 #include <wget/wget.h>
 
 #define MAX_URL_LEN (32768)
 #define MAX_PORT_LEN (256)
 static char url_string[MAX_URL_LEN];
+// Whether to print the parse tree in the binary output format instead of as JSON.
+// The fuzzer sets DIFF_FUZZ_BINARY_OUTPUT for targets whose config has binary_output set.
+static int binary_output;
 
-int main(void) {
-    fread(url_string, 1, MAX_URL_LEN, stdin);
+// Without afl-clang-fast, read one input from stdin, all the way to EOF, and run it once.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+static size_t fuzz_len;
+static unsigned char fuzz_buf[MAX_URL_LEN];
+static int fuzz_input_read;
+static int read_fuzz_input(void) {
+    if (fuzz_input_read) {
+        return 0;
+    }
+    fuzz_input_read = 1;
+    // A pipe can hand over its input in pieces.
+    ssize_t n;
+    while (fuzz_len < sizeof(fuzz_buf) && (n = read(0, fuzz_buf + fuzz_len, sizeof(fuzz_buf) - fuzz_len)) > 0) {
+        fuzz_len += (size_t)n;
+    }
+    return 1;
+}
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_INIT() void sync(void);
+#define __AFL_LOOP(x) ((void)(x), read_fuzz_input())
+#endif
+
+__AFL_FUZZ_INIT();
+
+// The number of inputs to run in one process before restarting it.
+// The fuzzer sets this when it runs us in persistent mode.
+static unsigned int persistent_iterations(void) {
+    char const *const iterations_str = getenv("DIFF_FUZZ_PERSISTENT_ITERATIONS");
+    unsigned long const iterations = iterations_str != NULL ? strtoul(iterations_str, NULL, 10) : 1;
+    return iterations > 0 ? iterations : 1;
+}
+
+// Writes a field in the binary output format: its length as 4 little-endian bytes, then its bytes.
+static void write_field(char const *const field) {
+    uint32_t const len = field != NULL ? strlen(field) : 0;
+    unsigned char const len_bytes[4] = {len & 0xff, (len >> 8) & 0xff, (len >> 16) & 0xff, len >> 24};
+    fwrite(len_bytes, 1, sizeof(len_bytes), stdout);
+    if (len > 0) {
+        fwrite(field, 1, len, stdout);
+    }
+}
+
+static int parse_url(void) {
     wget_iri *const parsed_url = wget_iri_parse(url_string, "utf-8");
     if (parsed_url == NULL) {
         return 1;
@@ -51,11 +97,25 @@ int main(void) {
         strcat(userinfo_str, password_str);
     }
 
+    char port_str[MAX_PORT_LEN];
+    snprintf(port_str, sizeof(port_str), "%d", parsed_url->port);
+
+    if (binary_output) {
+        write_field(scheme_str);
+        write_field(userinfo_str);
+        write_field(parsed_url->host);
+        write_field(port_str);
+        write_field(parsed_url->path);
+        write_field(parsed_url->query);
+        write_field(parsed_url->fragment);
+        free(parsed_url);
+        free(userinfo_str);
+        return 0;
+    }
+
     char *const scheme_b64 = wget_base64_encode_alloc(scheme_str, scheme_str != NULL ? strlen(scheme_str) : 0);
     char *const host_b64 = wget_base64_encode_alloc(parsed_url->host, parsed_url->host != NULL ? strlen(parsed_url->host) : 0);
     char *const userinfo_b64 = wget_base64_encode_alloc(userinfo_str, userinfo_str != NULL ? strlen(userinfo_str) : 0);
-    char port_str[MAX_PORT_LEN];
-    snprintf(port_str, sizeof(port_str), "%d", parsed_url->port);
     char *const port_b64 = wget_base64_encode_alloc(port_str, strlen(port_str));
     char *const path_b64 = wget_base64_encode_alloc(parsed_url->path, parsed_url->path != NULL ? strlen(parsed_url->path) : 0);
     char *const query_b64 = wget_base64_encode_alloc(parsed_url->query, parsed_url->query != NULL ? strlen(parsed_url->query) : 0);
@@ -72,4 +132,26 @@ int main(void) {
     free(path_b64);
     free(query_b64);
     free(fragment_b64);
+    return 0;
+}
+
+int main(void) {
+    unsigned char const *const testcase_buf = __AFL_FUZZ_TESTCASE_BUF;
+    unsigned int const iterations = persistent_iterations();
+    binary_output = getenv("DIFF_FUZZ_BINARY_OUTPUT") != NULL;
+    while (__AFL_LOOP(iterations)) {
+        size_t len = __AFL_FUZZ_TESTCASE_LEN;
+        if (len > MAX_URL_LEN - 1) {
+            len = MAX_URL_LEN - 1;
+        }
+        memcpy(url_string, testcase_buf, len);
+        url_string[len] = '\0';
+
+        int const rc = parse_url();
+        fflush(stdout);
+        // Failures end the process, so that the fuzzer sees their exit status.
+        if (rc != 0) {
+            return rc;
+        }
+    }
 }
@@ -0,0 +1,103 @@
+#############################################################################################
+# conftest.py
+# diff_fuzz (like the modules it imports) reads its config when it's imported, so the tests share
+# one config, written into a temporary directory before diff_fuzz is first imported.
+# Its targets are the benchmark stubs (built from source), so no real targets or AFL++ are needed,
+# plus the urllib harness in both output formats, where python-afl is installed.
+#############################################################################################
+
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+from pathlib import PosixPath
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+REPO_DIR: PosixPath = PosixPath(__file__).resolve().parent.parent
+BENCHMARKS_DIR: PosixPath = REPO_DIR.joinpath("benchmarks")
+
+# So that the tests can import the fuzzer's modules from wherever pytest is run
+sys.path.insert(0, str(REPO_DIR))
+
+# How long the slow stub sleeps per input
+SLOW_LATENCY_US: int = 30_000
+
+
+def target(name: str, executable: PosixPath, env: dict[str, str], **options: Any) -> str:
+    return (
+        f"    TargetConfig(name={name!r}, executable=PosixPath({str(executable)!r}), "
+        + "".join(f"{k}={v!r}, " for k, v in options.items())
+        + f"env={{**environ, **{env!r}}}),\n"
+    )
+
+
+def write_config(work_dir: PosixPath) -> None:
+    """
+    Writes a config.py for the tests into work_dir: the default config, with the stubs as targets.
+    """
+    stub: PosixPath = work_dir.joinpath("stub_target")
+    subprocess.run(
+        [os.environ.get("CC", "cc"), "-O2", str(BENCHMARKS_DIR.joinpath("stub_target.c")), "-o", str(stub)],
+        check=True,
+    )
+    python_stub: PosixPath = BENCHMARKS_DIR.joinpath("stub_target.py")
+
+    # The slow target comes first, so that the others finish while it's still running.
+    targets: str = target("slow", stub, {"STUB_LATENCY_US": str(SLOW_LATENCY_US)}, needs_tracing=False)
+    targets += target("fast", stub, {}, needs_tracing=False)
+    targets += target("fast_2", stub, {}, needs_tracing=False)
+    if importlib.util.find_spec("afl") is not None:
+        targets += target("fast_forkserver", python_stub, {}, needs_python_afl=True, persistent_mode=True)
+        # The real urllib harness needs python-afl, so it only gets tested where that's installed.
+        urllib_harness: PosixPath = REPO_DIR.joinpath("targets", "urllib", "urllib_target")
+        targets += target("urllib", urllib_harness, {}, needs_python_afl=True, persistent_mode=True)
+        targets += target(
+            "urllib_binary",
+            urllib_harness,
+            {},
+            needs_python_afl=True,
+            persistent_mode=True,
+            binary_output=True,
+        )
+    else:
+        targets += target("fast_forkserver", python_stub, {}, needs_tracing=False)
+
+    os.mkdir(work_dir.joinpath("seeds"))
+    with open(work_dir.joinpath("seeds", "seed"), "wb") as f:
+        f.write(b"http://example.com/")
+    os.mkdir(work_dir.joinpath("results"))
+    with open(REPO_DIR.joinpath("config.defpy"), encoding="utf-8") as f:
+        config: str = f.read()
+    config += f"""
+
+# Test settings
+SEED_DIR = PosixPath({str(work_dir.joinpath("seeds"))!r})
+RESULTS_DIR = PosixPath({str(work_dir.joinpath("results"))!r})
+USE_RESULT_CACHE = False
+TARGET_CONFIGS = [
+{targets}]
+"""
+    with open(work_dir.joinpath("config.py"), "w", encoding="utf-8") as f:
+        f.write(config)
+
+
+@pytest.fixture(scope="session")
+def diff_fuzz(tmp_path_factory: pytest.TempPathFactory) -> ModuleType:
+    work_dir: PosixPath = PosixPath(tmp_path_factory.mktemp("diff_fuzz"))
+    write_config(work_dir)
+    sys.path.insert(0, str(work_dir))
+    return importlib.import_module("diff_fuzz")
+
+
+@pytest.fixture(scope="session")
+def execution(diff_fuzz: ModuleType, tmp_path_factory: pytest.TempPathFactory) -> ModuleType:
+    """
+    The execution module, set up as a pool worker would be. (It reads the config too, so it comes after diff_fuzz)
+    """
+    module: ModuleType = sys.modules["execution"]
+    module.init_worker(PosixPath(tmp_path_factory.mktemp("worker")), None, None, None)
+    return module
@@ -0,0 +1,149 @@
+import multiprocessing
+import multiprocessing.pool
+import random
+import sys
+from pathlib import PosixPath
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+from journal import Journal, read_journal
+
+
+def test_resumed_buckets_keep_their_numbers_counts_and_samples(
+    diff_fuzz: ModuleType, tmp_path: PosixPath
+) -> None:
+    campaign: ModuleType = sys.modules["campaign"]
+    num_targets: int = len(campaign.TARGET_CONFIGS)
+
+    def rejected_by(target_index: int) -> Any:
+        return campaign.ExecutionResult(
+            (frozenset(),) * num_targets,
+            tuple(1 if i == target_index else 0 for i in range(num_targets)),
+            (None,) * num_targets,
+        )
+
+    journal_path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(journal_path) as journal:
+        findings = campaign.Findings(tmp_path, journal)
+        findings.bucket(b"rejected by 1", rejected_by(1))
+        for length in range(campaign.MAX_MINIMIZATIONS_PER_BUCKET + 3, 0, -1):
+            findings.bucket(b"a" * length, rejected_by(0))
+
+    with Journal(journal_path) as journal:
+        resumed = campaign.Findings(tmp_path, journal)
+        resumed.resume(read_journal(journal_path))
+        assert resumed.buckets == findings.buckets
+        assert resumed.buckets[campaign.differential_bucket(rejected_by(0))].sample == b"a"
+
+        # New buckets are numbered after the resumed ones, and full buckets stay full.
+        resumed.bucket(b"rejected by 2", rejected_by(2))
+        resumed.bucket(b"aa", rejected_by(0))
+        assert resumed.buckets[campaign.differential_bucket(rejected_by(2))].number == 2
+        assert [differential for differential, _ in resumed.unminimized] == [b"rejected by 2"]
+
+
+class OneChildHavoc:
+    """
+    Stands in for Havoc, giving every parent the same child.
+    """
+
+    def mutate_batch(self, inputs: list[bytes], _: int) -> list[bytes]:
+        return [b"child"] * len(inputs)
+
+
+def test_a_generation_of_children_that_are_still_running_waits_for_them(
+    diff_fuzz: ModuleType, tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Every child of the next generation can already be in flight, in which case it's made again once some runs
+    finish, rather than counted as a generation with nothing in it.
+    """
+    campaign: ModuleType = sys.modules["campaign"]
+    num_targets: int = len(campaign.TARGET_CONFIGS)
+    batches: list[list[bytes]] = []
+
+    def run_batch(batch: list[bytes]) -> list[Any]:
+        batches.append(batch)
+        return [
+            campaign.ExecutionResult(
+                (frozenset([len(batches)]),) * num_targets,
+                (0,) * num_targets,
+                (None,) * num_targets,
+                run_times=(0.001,) * num_targets,
+            )
+            for _ in batch
+        ]
+
+    monkeypatch.setattr(campaign, "run_batch", run_batch)
+    seed: PosixPath = tmp_path.joinpath("seed")
+    seed.write_bytes(b"seed")
+    with Journal(tmp_path.joinpath("journal")) as journal, multiprocessing.pool.ThreadPool(1) as pool:
+        # More workers than runs in flight, so that each generation is made while its last child is still running
+        runner = campaign.TaskRunner(pool, 2)
+        explorer = campaign.Explorer(journal, None, OneChildHavoc(), [seed])
+        cache_counters: tuple[Any, Any] = (multiprocessing.Value("Q", 0), multiprocessing.Value("Q", 0))
+        reporter = campaign.Reporter(tmp_path, None, cache_counters)
+        fuzzing_campaign = campaign.Campaign(
+            runner, campaign.Findings(tmp_path, journal), explorer, reporter, None
+        )
+        fuzzing_campaign.run(5)
+
+    assert fuzzing_campaign.generation == 4
+    assert batches == [[b"seed"]] + [[b"child"]] * 4
+
+
+def test_batched_minimization_matches_serial_minimization(
+    diff_fuzz: ModuleType, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Spreading each batch of candidate reductions across the workers shouldn't change what a differential
+    minimizes to, even with several minimizations interleaved.
+    """
+    campaign: ModuleType = sys.modules["campaign"]
+    differentials: ModuleType = sys.modules["differentials"]
+    execution: ModuleType = sys.modules["execution"]
+    num_targets: int = len(campaign.TARGET_CONFIGS)
+
+    def run_targets(the_input: bytes, target_indices: tuple[int, ...] | None = None) -> Any:
+        # Target 0 rejects any input with an x in it, and target 2 rejects any input without a y.
+        statuses: tuple[int, ...] = tuple(
+            int((i == 0 and b"x" in the_input) or (i == 2 and b"y" not in the_input))
+            for i in (range(num_targets) if target_indices is None else target_indices)
+        )
+        return campaign.ExecutionResult(
+            (frozenset(),) * len(statuses),
+            statuses,
+            (None,) * len(statuses),
+            run_times=(0.0,) * len(statuses),
+        )
+
+    # run_candidates, which the workers run, looks run_targets up in execution.
+    monkeypatch.setattr(execution, "run_targets", run_targets)
+    monkeypatch.setattr(differentials, "run_targets", run_targets)
+    monkeypatch.setattr(campaign, "run_batch", lambda batch: [run_targets(the_input) for the_input in batch])
+
+    rng: random.Random = random.Random(0)
+    bug_inducing_inputs: list[bytes] = [
+        bytes(rng.choices(b"abcxy", k=rng.randrange(20, 300))) + b"x" for _ in range(5)
+    ]
+    serially_minimized: list[bytes] = list(map(differentials.minimize_differential, bug_inducing_inputs))
+
+    batch_minimized: list[bytes] = []
+    with multiprocessing.pool.ThreadPool(3) as pool:
+        runner = campaign.TaskRunner(pool, 3)
+        minimizer = campaign.Minimizer(runner)
+        for bug_inducing_input in bug_inducing_inputs:
+            minimizer.start(bug_inducing_input, run_targets(bug_inducing_input))
+        minimizer.submit_pending()
+        while not runner.idle():
+            kind, context, task_result = runner.next_completion(30)
+            if kind == "reduce":
+                minimizer.record_reduction(context, task_result)
+            else:
+                batch_minimized.append(context)
+            minimizer.submit_pending()
+
+    assert sorted(batch_minimized) == sorted(serially_minimized)
+    assert len(set(serially_minimized)) > 1
@@ -0,0 +1,45 @@
+import numpy as np
+
+from corpus import Corpus, UNFAVORED_FACTOR
+from forkserver import MAP_SIZE
+
+
+def test_smallest_entry_per_edge_is_favored() -> None:
+    corpus: Corpus = Corpus(2, seed=0)
+    corpus.add(b"long input", (frozenset({1, 2}), frozenset({3})), "ok", 0.001, 0)
+    corpus.add(b"short", (frozenset({1, 2}), frozenset({3})), "ok", 0.001, 0)
+    corpus.add(b"longest input", (frozenset({1}), frozenset({4})), "ok", 0.001, 0)
+    assert corpus.favored().tolist() == [False, True, True]
+    assert corpus.edges_found() == [2, 2]
+
+
+def test_unfavored_entries_are_culled() -> None:
+    corpus: Corpus = Corpus(1, seed=0)
+    corpus.add(b"aaaa", (frozenset({1}),), "ok", 0.001, 0)
+    corpus.add(b"a", (frozenset({1}),), "ok", 0.001, 0)
+    energies: np.ndarray = corpus.energies()
+    assert np.isclose(energies.sum(), 1)
+    assert np.isclose(energies[0] / energies[1], UNFAVORED_FACTOR)
+
+
+def test_rare_patterns_get_more_energy() -> None:
+    corpus: Corpus = Corpus(1, seed=0)
+    for _ in range(3):
+        corpus.add(b"a", (frozenset(),), "common", 0.001, 0)
+    corpus.add(b"b", (frozenset(),), "rare", 0.001, 0)
+    energies: np.ndarray = corpus.energies()
+    # (The first entry is the favored one of the common pattern)
+    assert energies[3] > energies[0]
+    assert len(corpus.schedule(100)) == 100
+
+
+def test_maps_grow_for_targets_with_more_edges() -> None:
+    corpus: Corpus = Corpus(2, seed=0)
+    corpus.add(b"a", (frozenset({1}), frozenset({2})), "ok", 0.001, 0)
+    corpus.add(b"bb", (frozenset({MAP_SIZE + 5}), frozenset({2})), "ok", 0.001, 0)
+    corpus.add(b"ccc", (frozenset({1}), frozenset({3 * MAP_SIZE})), "ok", 0.001, 0)
+    assert corpus.map_sizes == [2 * MAP_SIZE, 4 * MAP_SIZE]
+    assert corpus.edges_found() == [2, 2]
+    assert corpus.favored().tolist() == [True, True, True]
+    # The first entry's edges in the second target were renumbered along with the map, so they're still common.
+    assert corpus.energies()[0] < corpus.energies()[2]
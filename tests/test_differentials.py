@@ -0,0 +1,103 @@
+import itertools
+import random
+import sys
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+
+def test_minimization_falls_back_to_all_targets_when_the_disagreeing_ones_miss_something(
+    diff_fuzz: ModuleType,
+) -> None:
+    """
+    Minimizing on just the disagreeing targets can lose a byte that an agreeing target needed,
+    in which case the final check on every target fails, and minimization starts over with all of them.
+    """
+    differentials: ModuleType = sys.modules["differentials"]
+    num_targets: int = len(differentials.TARGET_CONFIGS)
+    all_targets: tuple[int, ...] = tuple(range(num_targets))
+
+    def run(the_input: bytes) -> Any:
+        # Target 0 rejects any input with an x in it, and target 2 rejects any input without a y.
+        statuses: tuple[int, ...] = tuple(
+            int((i == 0 and b"x" in the_input) or (i == 2 and b"y" not in the_input)) for i in all_targets
+        )
+        return differentials.ExecutionResult((frozenset(),) * num_targets, statuses, (None,) * num_targets)
+
+    bug_inducing_input: bytes = b"abcxdefyghi"
+    orig_result = run(bug_inducing_input)
+    assert differentials.disagreeing_targets(orig_result) == (0, 1)
+
+    steps = differentials.minimization_steps(bug_inducing_input, orig_result)
+    batches: list[tuple[list[bytes], tuple[int, ...]]] = []
+    minimized: bytes = bug_inducing_input
+    try:
+        candidates, target_indices = next(steps)
+        while True:
+            batches.append((candidates, target_indices))
+            candidates, target_indices = steps.send(
+                [differentials.restrict_result(run(candidate), target_indices) for candidate in candidates]
+            )
+    except StopIteration as e:
+        minimized: bytes = e.value
+
+    batch_targets: list[tuple[int, ...]] = [target_indices for _, target_indices in batches]
+    # First only the disagreeing targets, then the check of their minimized input, then every target.
+    first_check: int = batch_targets.index(all_targets)
+    assert set(batch_targets[:first_check]) == {(0, 1)}
+    assert batches[first_check][0] == [b"x"]
+    assert set(batch_targets[first_check:]) == {all_targets}
+    assert minimized == b"xy"
+
+
+def test_canonical_keys_agree_with_pairwise_comparison(
+    diff_fuzz: ModuleType, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Comparing canonical keys is only an optimization, so it should give the same verdicts as running
+    compare_parse_trees on every pair of targets.
+    """
+    differentials: ModuleType = sys.modules["differentials"]
+    num_targets: int = len(differentials.TARGET_CONFIGS)
+    rng: random.Random = random.Random(0)
+    # Values that compare_parse_trees considers equal in some fields but not others
+    field_values: list[bytes] = [b"", b"/", b"a", b"A", b"b"]
+
+    def random_parse_tree() -> Any:
+        if rng.random() < 0.1:
+            return None
+        return differentials.ParseTree(*(rng.choice(field_values) for _ in range(7)))
+
+    results: list[Any] = []
+    for _ in range(300):
+        # A few distinct trees per result, so that targets often agree
+        trees: list[Any] = [random_parse_tree() for _ in range(2)]
+        results.append(
+            differentials.ExecutionResult(
+                (frozenset(),) * num_targets,
+                tuple(int(rng.random() < 0.05) for _ in range(num_targets)),
+                tuple(rng.choice(trees) for _ in range(num_targets)),
+            )
+        )
+
+    def verdicts(use_canonical_parse_trees: bool) -> tuple[list[Any], ...]:
+        monkeypatch.setattr(differentials, "USE_CANONICAL_PARSE_TREES", use_canonical_parse_trees)
+        return (
+            [differentials.parse_trees_disagree(result) for result in results],
+            [differentials.disagreeing_targets(result) for result in results],
+            # (Minimization only ever asks this of differentials)
+            [
+                differentials.preserves_differential(result, other)
+                for result, other in itertools.product(results[:80], repeat=2)
+                if differentials.is_differential(result)
+            ],
+        )
+
+    for t1, t2 in itertools.product([result.parse_trees[0] for result in results], repeat=2):
+        assert all(differentials.compare_parse_trees(t1, t2)) == (
+            differentials.canonical_keys(t1) == differentials.canonical_keys(t2)
+        )
+    canonical_verdicts: tuple[list[Any], ...] = verdicts(True)
+    assert sum(canonical_verdicts[2]) != 0
+    assert canonical_verdicts == verdicts(False)
@@ -0,0 +1,57 @@
+import random
+import sys
+from pathlib import PosixPath
+from types import ModuleType
+from typing import Any, Hashable
+
+import pytest
+
+from corpus import load_inputs, save_input
+
+
+def fake_result(the_input: bytes) -> Any:
+    """
+    Stands in for running the targets: the first target's edges are the input's bytes, the second's are its
+    pairs of adjacent bytes, and the third fails on inputs with a z in them, and times out on ones with a !.
+    """
+    campaign: ModuleType = sys.modules["campaign"]
+    num_targets: int = len(campaign.TARGET_CONFIGS)
+    edges: list[frozenset[int]] = [frozenset(the_input), frozenset(zip(the_input, the_input[1:]))]
+    status: int = campaign.TIMEOUT_STATUS if b"!" in the_input else int(b"z" in the_input)
+    return campaign.ExecutionResult(
+        tuple(edges + [frozenset()] * (num_targets - 2)),
+        (0, 0, status) + (0,) * (num_targets - 3),
+        (None,) * num_targets,
+        exec_time=0.001 * len(the_input),
+    )
+
+
+def fake_run_batch(batch: list[bytes]) -> list[Any]:
+    return list(map(fake_result, batch))
+
+
+def features(the_input: bytes) -> set[Hashable]:
+    result: Any = fake_result(the_input)
+    return {(i, edge) for i, edges in enumerate(result.fingerprint) for edge in edges} | {
+        sys.modules["campaign"].behavior_pattern(result)
+    }
+
+
+def test_distilled_corpus_keeps_every_feature(
+    diff_fuzz: ModuleType, tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The pool's workers are forked, so they run the fake too.
+    monkeypatch.setattr(diff_fuzz, "run_batch", fake_run_batch)
+    rng: random.Random = random.Random(0)
+    input_dir: PosixPath = tmp_path.joinpath("inputs")
+    input_dir.mkdir()
+    for _ in range(300):
+        save_input(input_dir, bytes(rng.choices(b"abcdz!", k=rng.randrange(1, 8))))
+    output_dir: PosixPath = tmp_path.joinpath("distilled")
+    diff_fuzz.distill_main(input_dir, output_dir, tmp_path)
+
+    inputs: list[bytes] = [the_input for the_input in load_inputs(input_dir) if b"!" not in the_input]
+    kept: list[bytes] = load_inputs(output_dir)
+    assert set(kept) <= set(inputs)
+    assert len(kept) < len(inputs)
+    assert set().union(*map(features, kept)) == set().union(*map(features, inputs))
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+from pathlib import PosixPath
+from typing import Any
+
+from distributed import (
+    MAX_TASK_ATTEMPTS,
+    Codec,
+    RemoteError,
+    RemotePool,
+    WorkerPool,
+    parse_address,
+    run_worker,
+)
+
+CODEC: Codec = Codec([])
+HELLO: list[str] = ["test targets"]
+
+
+def setup() -> None:
+    pass
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def worker_pid(_: int) -> int:
+    return os.getpid()
+
+
+def fail_first_time(flag: str) -> str:
+    """
+    Fails the first time it's run with a given flag file, and succeeds after that.
+    """
+    if not os.path.exists(flag):
+        with open(flag, "w", encoding="utf-8"):
+            pass
+        raise RuntimeError("first try")
+    return "second try"
+
+
+def always_fail(_: int) -> None:
+    raise RuntimeError("every try")
+
+
+def run_tasks(pool: RemotePool, func: Any, args: list[Any]) -> list[tuple[str, Any]]:
+    """
+    Runs func on each of args through the pool, and returns what came back for each,
+    as ("result", result) or ("error", exc).
+    """
+    completions: queue.SimpleQueue[tuple[int, str, Any]] = queue.SimpleQueue()
+    for n, arg in enumerate(args):
+        pool.apply_async(
+            func,
+            (arg,),
+            callback=lambda result, n=n: completions.put((n, "result", result)),
+            error_callback=lambda exc, n=n: completions.put((n, "error", exc)),
+        )
+    outcomes: dict[int, tuple[str, Any]] = {}
+    for _ in args:
+        n, kind, value = completions.get(timeout=30)
+        outcomes[n] = (kind, value)
+    return [outcomes[n] for n in range(len(args))]
+
+
+def test_tasks_run_on_every_worker_and_failures_are_retried(tmp_path: PosixPath) -> None:
+    with RemotePool(("127.0.0.1", 0), CODEC, HELLO) as pool:
+        address: tuple[str, int] = pool.listener.getsockname()[:2]
+        workers: list[threading.Thread] = [
+            threading.Thread(
+                target=run_worker,
+                args=(
+                    address,
+                    [square, worker_pid, fail_first_time, always_fail],
+                    CODEC,
+                    HELLO,
+                    WorkerPool(1, setup, ()),
+                ),
+                daemon=True,
+            )
+            for _ in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        while pool.num_slots() != 2:
+            threading.Event().wait(0.01)
+
+        assert run_tasks(pool, square, list(range(20))) == [("result", x * x) for x in range(20)]
+        # Each worker has one slot, so tasks that are in flight at once are split between them.
+        assert len({value for _, value in run_tasks(pool, worker_pid, list(range(20)))}) == 2
+        # A task that fails is retried, rather than failing the run.
+        assert run_tasks(pool, fail_first_time, [str(tmp_path.joinpath("flag"))]) == [
+            ("result", "second try")
+        ]
+        # A task that keeps failing is given up on, after MAX_TASK_ATTEMPTS tries.
+        [(kind, exc)] = run_tasks(pool, always_fail, [0])
+        assert kind == "error"
+        assert isinstance(exc, RemoteError)
+        assert "every try" in str(exc)
+        assert MAX_TASK_ATTEMPTS > 1
+
+    for worker in workers:
+        worker.join(timeout=30)
+        assert not worker.is_alive()
+
+
+def test_a_coordinator_given_only_a_port_listens_on_localhost() -> None:
+    assert parse_address("7700") == ("127.0.0.1", 7700)
+    assert parse_address("0.0.0.0:7700") == ("0.0.0.0", 7700)
+    assert parse_address("coordinator-host:7700") == ("coordinator-host", 7700)
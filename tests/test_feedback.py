@@ -0,0 +1,30 @@
+import dataclasses
+import sys
+from types import ModuleType
+
+from feedback import output_shape_edges
+from forkserver import TIMEOUT_STATUS
+
+
+def test_output_shape_edges_only_change_with_the_shape(diff_fuzz: ModuleType) -> None:
+    parse_tree_class: type = sys.modules["config"].ParseTree
+    tree = parse_tree_class(b"http", b"", b"example.com", b"80", b"/a/b", b"q=1", b"")
+    edges: frozenset[int] = output_shape_edges(0, tree)
+
+    # Identical outputs, and outputs with the same shape, get the same edges.
+    assert output_shape_edges(0, parse_tree_class(*dataclasses.astuple(tree))) == edges
+    assert output_shape_edges(0, dataclasses.replace(tree, host=b"example.org", query=b"q=2")) == edges
+
+    changed_shapes: list[frozenset[int]] = [
+        output_shape_edges(1, tree),
+        output_shape_edges(TIMEOUT_STATUS, tree),
+        output_shape_edges(0, None),
+        # A field going from empty to not
+        output_shape_edges(0, dataclasses.replace(tree, userinfo=b"u")),
+        # A field going from one length class to another
+        output_shape_edges(0, dataclasses.replace(tree, host=b"example.com" * 2)),
+        # Another field changing length class
+        output_shape_edges(0, dataclasses.replace(tree, query=b"q=1" * 8)),
+    ]
+    assert edges not in changed_shapes
+    assert len(set(changed_shapes)) == len(changed_shapes)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from fingerprint import DigestSet, VirginBitmaps, fingerprint_digest
+from forkserver import MAP_SIZE
+
+
+def test_digest_set() -> None:
+    digests: DigestSet = DigestSet(capacity=2)
+    for n in range(100):
+        digests.add(fingerprint_digest((frozenset({n}),)))
+    assert len(digests) == 100
+    assert fingerprint_digest((frozenset({5}),)) in digests
+    assert fingerprint_digest((frozenset({100}),)) not in digests
+
+
+def test_virgin_bitmaps_credit_the_first_hit() -> None:
+    virgin: VirginBitmaps = VirginBitmaps(2)
+    novel: np.ndarray = virgin.update(
+        [(frozenset({1}), frozenset()), (frozenset({1}), frozenset()), (frozenset({1}), frozenset({7}))]
+    )
+    assert novel.tolist() == [True, False, True]
+    assert virgin.update([(frozenset({1}), frozenset({7}))]).tolist() == [False]
+
+
+def test_virgin_bitmaps_grow_for_bigger_maps() -> None:
+    virgin: VirginBitmaps = VirginBitmaps(2)
+    assert virgin.update([(frozenset(), frozenset({MAP_SIZE + 1}))]).tolist() == [True]
+    assert [len(bitmap) for bitmap in virgin.virgin] == [MAP_SIZE, 2 * MAP_SIZE]
+
+    restored: VirginBitmaps = VirginBitmaps(2)
+    restored.load_bytes(virgin.to_bytes())
+    assert restored.update([(frozenset(), frozenset({MAP_SIZE + 1}))]).tolist() == [False]
+    assert restored.update([(frozenset({3}), frozenset())]).tolist() == [True]
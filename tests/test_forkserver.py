@@ -0,0 +1,51 @@
+import os
+import time
+from types import ModuleType
+
+import pytest
+
+
+def process_states() -> dict[int, tuple[str, int]]:
+    """
+    Returns the state and parent pid of each process that hasn't exited yet, by pid.
+    """
+    states: dict[int, tuple[str, int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                stat: str = f.read()
+        except OSError:
+            continue
+        # The fields after the command name, which can contain anything, including spaces and parentheses
+        state, ppid = stat[stat.rindex(")") + 2 :].split()[:2]
+        if state != "Z":
+            states[int(entry)] = (state, int(ppid))
+    return states
+
+
+def test_closing_forkservers_kills_stopped_persistent_children(execution: ModuleType) -> None:
+    """
+    A persistent-mode child sits stopped between inputs, so it has to be killed along with its forkserver.
+    """
+    tc = next(
+        (tc for tc in execution.TARGET_CONFIGS if tc.persistent_mode and execution.uses_forkserver(tc)), None
+    )
+    if tc is None:
+        pytest.skip("python-afl isn't installed")
+    forkserver = execution.get_forkserver(tc)
+    forkserver.run(b"http://example.com/")
+    forkserver_pid: int = forkserver.process.pid
+    # The child, stopped until the next input
+    children: list[int] = [pid for pid, (_, ppid) in process_states().items() if ppid == forkserver_pid]
+    assert len(children) == 1
+    assert process_states()[children[0]][0] in ("T", "t")
+
+    execution.close_forkservers()
+    # The killed child belongs to init now, which reaps it when it gets around to it.
+    deadline: float = time.monotonic() + 5
+    while children[0] in process_states() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert children[0] not in process_states()
+    assert forkserver_pid not in process_states()
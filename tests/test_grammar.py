@@ -0,0 +1,21 @@
+import random
+import re
+
+from grammar import CompiledPattern, grammar_dict, grammar_re
+
+PATTERNS: list[bytes] = [
+    grammar_re.pattern,
+    *grammar_dict.values(),
+    rb"a(?:b|cd|)e{2,4}[x-z0-9]*\d+",
+    rb"(?:[^a-y]|.){3}x?[\-\]]",
+    rb"(?P<outer>(?:ab|(?P<inner>c{0,2}))+)",
+]
+
+
+def test_generated_inputs_match_their_patterns() -> None:
+    random.seed(0)
+    for pattern in PATTERNS:
+        for max_extra_repeats in (0, 3):
+            compiled: CompiledPattern = CompiledPattern(pattern, max_extra_repeats)
+            for generated in compiled.generate_batch(200):
+                assert re.fullmatch(pattern, generated, re.DOTALL) is not None, (pattern, generated)
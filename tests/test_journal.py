@@ -0,0 +1,104 @@
+import os
+import struct
+from pathlib import PosixPath
+
+import pytest
+
+import journal as journal_module
+from journal import (
+    CORPUS_ENTRY,
+    SEEN_DIGEST,
+    Journal,
+    JournalState,
+    checkpoint_path,
+    read_journal,
+    snapshot_path,
+)
+
+
+def test_checkpoints_replace_each_other(tmp_path: PosixPath) -> None:
+    path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(path) as journal:
+        for generation in range(1, 20):
+            journal.record(SEEN_DIGEST, bytes([generation]) * 16)
+            journal.checkpoint(generation, [b"queued" * 1000], [], None)
+        journal.record_corpus_entry(3, b"entry")
+
+    state: JournalState = read_journal(path)
+    assert state.checkpoint.generation == 19
+    assert state.seen_digests == [bytes([generation]) * 16 for generation in range(1, 20)]
+    assert state.corpus_entries == [(3, b"entry")]
+    assert state.checkpoint.queued_inputs == [b"queued" * 1000]
+    # Only the last checkpoint is kept, and the findings are never rewritten along with it.
+    assert os.path.getsize(checkpoint_path(path)) < 2 * len(b"queued" * 1000)
+    assert not snapshot_path(path).exists()
+
+
+def test_the_log_is_only_compacted_once_it_catches_up_with_the_snapshot(
+    tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(journal_module, "MIN_COMPACTION_BYTES", 0)
+    path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(path) as journal:
+        for n in range(100):
+            journal.record(SEEN_DIGEST, n.to_bytes(16, "little"))
+        journal.checkpoint(1, [], [], None)
+        snapshot: bytes = snapshot_path(path).read_bytes()
+        for generation in range(2, 10):
+            journal.record(SEEN_DIGEST, generation.to_bytes(16, "big"))
+            journal.checkpoint(generation, [], [], None)
+        assert snapshot_path(path).read_bytes() == snapshot
+
+    state: JournalState = read_journal(path)
+    assert state.checkpoint.generation == 9
+    assert state.seen_digests == [n.to_bytes(16, "little") for n in range(100)] + [
+        generation.to_bytes(16, "big") for generation in range(2, 10)
+    ]
+
+
+def test_compaction_keeps_only_the_latest_record_of_each_bucket(
+    tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(journal_module, "MIN_COMPACTION_BYTES", 0)
+    path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(path) as journal:
+        for count in range(1, 100):
+            journal.record_bucket(0, str(count).encode())
+        journal.record_bucket(1, b"other")
+        journal.checkpoint(1, [], [], None)
+
+    assert os.path.getsize(snapshot_path(path)) < 100
+    assert read_journal(path).buckets == {0: b"99", 1: b"other"}
+
+
+def test_a_log_that_was_compacted_into_the_snapshot_is_not_replayed(
+    tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(journal_module, "MIN_COMPACTION_BYTES", 0)
+    path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(path) as journal:
+        journal.record(SEEN_DIGEST, b"a" * 16)
+        journal.flush()
+        log: bytes = path.read_bytes()
+        journal.checkpoint(1, [], [], None)
+    # As if the run died after replacing the snapshot, but before emptying the log
+    path.write_bytes(log)
+
+    state: JournalState = read_journal(path)
+    assert state.seen_digests == [b"a" * 16]
+    assert state.length == 0
+
+
+def test_a_partly_written_record_is_ignored(tmp_path: PosixPath) -> None:
+    path: PosixPath = tmp_path.joinpath("journal")
+    with Journal(path) as journal:
+        journal.checkpoint(1, [b"queued"], [], None)
+        journal.record(SEEN_DIGEST, b"a" * 16)
+    complete_length: int = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(CORPUS_ENTRY + struct.pack("<I", 100) + b"cut short")
+
+    state: JournalState = read_journal(path)
+    assert state.seen_digests == [b"a" * 16]
+    assert state.checkpoint.queued_inputs == [b"queued"]
+    assert state.length == complete_length
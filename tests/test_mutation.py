@@ -0,0 +1,20 @@
+from mutation import MAX_BLOCK_LEN, Havoc
+
+
+def test_mutants_are_nonempty_and_grow_by_at_most_a_block_per_mutation() -> None:
+    """
+    Empty and one-byte parents included, every mutant should have something in it, and no mutation should
+    add more than a block, a token, or a spliced-in parent.
+    """
+    tokens: list[bytes] = [b"", b"://", b"%2F" * 20]
+    parents: list[bytes] = [b"", b"a", b"http://example.com/", b"\xff" * 100]
+    max_stack_pow2: int = 3
+    havoc: Havoc = Havoc(tokens, [], max_stack_pow2, 0)
+    max_growth: int = max(MAX_BLOCK_LEN, *map(len, tokens), *map(len, parents))
+
+    for _ in range(20):
+        children: list[bytes] = havoc.mutate_batch(parents, 1000)
+        assert len(children) == 1000
+        for child_index, child in enumerate(children):
+            parent: bytes = parents[child_index % len(parents)]
+            assert 1 <= len(child) <= len(parent) + (1 << max_stack_pow2) * max_growth
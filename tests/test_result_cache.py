@@ -0,0 +1,83 @@
+import dataclasses
+import multiprocessing
+import time
+from pathlib import PosixPath
+from types import ModuleType
+
+import pytest
+
+from result_cache import LAST_USED_RESOLUTION, ResultCache, target_digest
+
+
+def make_cache(path: PosixPath, max_bytes: int) -> ResultCache:
+    return ResultCache(path, max_bytes, multiprocessing.Value("Q", 0), multiprocessing.Value("Q", 0))
+
+
+def test_changing_output_format_invalidates_cached_runs(execution: ModuleType, tmp_path: PosixPath) -> None:
+    """
+    A target's JSON output shouldn't be served from the cache once the target switches to the binary format.
+    """
+    names: list[str] = [tc.name for tc in execution.TARGET_CONFIGS]
+    fast: int = names.index("fast")
+    tc = execution.TARGET_CONFIGS[fast]
+    hits = multiprocessing.Value("Q", 0)
+    misses = multiprocessing.Value("Q", 0)
+    execution._worker.result_cache = ResultCache(tmp_path.joinpath("cache.sqlite"), 1 << 20, hits, misses)
+    try:
+        json_result = execution.run_targets(b"http://example.com/", (fast,))
+        execution.TARGET_CONFIGS[fast] = dataclasses.replace(tc, binary_output=True)
+        execution.OUTPUT_PARSERS[fast] = execution.parse_binary_output
+        execution.target_cache_digest.cache_clear()
+        binary_result = execution.run_targets(b"http://example.com/", (fast,))
+    finally:
+        execution._worker.result_cache.close()
+        execution._worker.result_cache = None
+        execution.TARGET_CONFIGS[fast] = tc
+        execution.OUTPUT_PARSERS[fast] = execution.parse_json_output
+        execution.target_cache_digest.cache_clear()
+
+    assert (hits.value, misses.value) == (0, 2)
+    assert json_result.parse_trees[0] is not None
+    assert binary_result.parse_trees == json_result.parse_trees
+
+
+def test_the_least_recently_used_entries_are_evicted(
+    tmp_path: PosixPath, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now_ms: list[int] = [0]
+    monkeypatch.setattr(time, "time_ns", lambda: now_ms[0] * 1_000_000)
+    stdout: bytes = b"o" * 100
+    # Room for all but one of the entries
+    cache: ResultCache = make_cache(tmp_path.joinpath("cache.sqlite"), 10 * (16 + len(stdout)) - 1)
+    keys: list[bytes] = [ResultCache.key(b"target", bytes([n])) for n in range(10)]
+    try:
+        for key in keys:
+            now_ms[0] += LAST_USED_RESOLUTION
+            cache.put({key: (0, stdout, frozenset())})
+        # A hit makes the oldest entry the most recently used.
+        now_ms[0] += LAST_USED_RESOLUTION
+        assert keys[0] in cache.get([keys[0]])
+
+        cache.evict()
+        assert set(cache.get(keys)) == {keys[0]} | set(keys[3:])
+    finally:
+        cache.close()
+
+
+def test_rebuilding_a_target_invalidates_its_entries(tmp_path: PosixPath) -> None:
+    executable: PosixPath = tmp_path.joinpath("target")
+    executable.write_bytes(b"version 1")
+    old_key: bytes = ResultCache.key(target_digest(executable, "arg"), b"input")
+    cache: ResultCache = make_cache(tmp_path.joinpath("cache.sqlite"), 1 << 20)
+    try:
+        cache.put({old_key: (0, b"old output", frozenset([1, 2]))})
+        assert cache.get([old_key]) == {old_key: (0, b"old output", frozenset([1, 2]))}
+
+        # Whether it's the rest of the target's configuration that changes, or the executable
+        assert cache.get([ResultCache.key(target_digest(executable, "other arg"), b"input")]) == {}
+        executable.write_bytes(b"version 2")
+        new_key: bytes = ResultCache.key(target_digest(executable, "arg"), b"input")
+        assert new_key != old_key
+        assert cache.get([new_key]) == {}
+    finally:
+        cache.close()
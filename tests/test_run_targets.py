@@ -0,0 +1,86 @@
+import dataclasses
+import os
+import time
+from types import ModuleType
+
+from stats import FuzzerStats
+
+
+def test_fast_targets_are_not_charged_for_a_slow_one(execution: ModuleType) -> None:
+    """
+    Each run's time should be its own target's, even when an earlier target in the run is slow.
+    """
+    names: list[str] = [tc.name for tc in execution.TARGET_CONFIGS]
+    stats: FuzzerStats = FuzzerStats(names)
+    all_targets: tuple[int, ...] = tuple(range(len(names)))
+    execution.run_targets(b"http://example.com/")
+    for _ in range(execution.TIMEOUT_CALIBRATION_RUNS):
+        result = execution.run_targets(b"http://example.com/")
+        stats.record_runs([result.run_times], all_targets)
+
+    slow: int = names.index("slow")
+    slow_latency: float = int(execution.TARGET_CONFIGS[slow].env["STUB_LATENCY_US"]) / 1e6
+    assert stats.targets[slow].latencies.quantile(0.5) >= slow_latency
+    for i, name in enumerate(names):
+        if i != slow:
+            assert stats.targets[i].latencies.quantile(0.99) < slow_latency, name
+            # The fast targets' timeouts are calibrated down to the floor, rather than to the slow target's time.
+            assert execution.target_timeout(i) == execution.MIN_TIMEOUT_TIME / 1000, name
+
+
+def processes_with_env(entry: bytes) -> list[int]:
+    """
+    Returns the pids of the processes that have entry in their environment.
+    """
+    pids: list[int] = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/environ", "rb") as f:
+                if entry in f.read().split(b"\0"):
+                    pids.append(int(pid))
+        except OSError:
+            continue
+    return pids
+
+
+def test_hanging_targets_are_killed_and_reported_as_timeouts(execution: ModuleType) -> None:
+    """
+    A target that doesn't finish within its timeout should be killed, rather than waited for.
+    """
+    names: list[str] = [tc.name for tc in execution.TARGET_CONFIGS]
+    hanging: tuple[int, ...] = (names.index("slow"), names.index("fast_forkserver"))
+    original_configs = [execution.TARGET_CONFIGS[i] for i in hanging]
+    # Long enough that the test would time out if the targets were waited for
+    latency_us: str = str(60_000_000)
+    for i, tc in zip(hanging, original_configs):
+        execution.TARGET_CONFIGS[i] = dataclasses.replace(
+            tc,
+            # A new name, so that the forkserver target gets a new forkserver, with the new environment
+            name=f"hanging_{tc.name}",
+            env={**tc.env, "STUB_LATENCY_US": latency_us},
+            timeout_ms=200,
+        )
+    try:
+        start: float = time.monotonic()
+        result = execution.run_targets(b"http://example.com/", hanging)
+        elapsed: float = time.monotonic() - start
+        # Neither the processes nor the forkserver's child are left running. (The forkserver itself is.)
+        forkserver_pids: set[int] = {
+            forkserver.process.pid for forkserver in execution._forkservers.get(os.getpid(), {}).values()
+        }
+        still_running: list[int] = [
+            pid
+            for pid in processes_with_env(f"STUB_LATENCY_US={latency_us}".encode())
+            if pid not in forkserver_pids
+        ]
+    finally:
+        for i, tc in zip(hanging, original_configs):
+            forkserver = execution._forkservers.get(os.getpid(), {}).pop(f"hanging_{tc.name}", None)
+            if forkserver is not None:
+                forkserver.close()
+            execution.TARGET_CONFIGS[i] = tc
+
+    assert result.statuses == (execution.TIMEOUT_STATUS,) * len(hanging)
+    assert result.parse_trees == (None,) * len(hanging)
+    assert elapsed < 10
+    assert still_running == []